@@ -1,25 +1,83 @@
 from pymongo import MongoClient
 from pymongo.database import Database
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+import asyncio
 import os
 from dotenv import load_dotenv
 
+from .db_monitoring import PoolStatsListener, CommandStatsListener
+
 load_dotenv()
 
+def get_client_options() -> Dict[str, Any]:
+    """Opsi connection pool dan kompresi MongoClient dari environment"""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+    }
+    
+    wait_queue_timeout = os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS")
+    if wait_queue_timeout:
+        options["waitQueueTimeoutMS"] = int(wait_queue_timeout)
+    
+    # Contoh: "zstd,snappy,zlib" - compressor yang modulnya tidak terpasang dilewati driver
+    compressors = os.getenv("MONGODB_COMPRESSORS", "").strip()
+    if compressors:
+        options["compressors"] = compressors
+        zlib_level = os.getenv("MONGODB_ZLIB_COMPRESSION_LEVEL")
+        if zlib_level:
+            options["zlibCompressionLevel"] = int(zlib_level)
+    
+    return options
+
 class DatabaseManager:
     _instance = None
     _client = None
     _database = None
+    _async_client = None
+    _async_database = None
+    _pool_listener = None
+    _async_pool_listener = None
+    _command_listener = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(DatabaseManager, cls).__new__(cls)
         return cls._instance
     
+    def _get_command_listeners(self) -> list:
+        """CommandListener bersama untuk client sync dan async (nonaktif jika MONGODB_COMMAND_MONITORING=false)"""
+        if os.getenv("MONGODB_COMMAND_MONITORING", "true").lower() != "true":
+            return []
+        
+        if self._command_listener is None:
+            self._command_listener = CommandStatsListener(
+                slow_query_ms=float(os.getenv("MONGODB_SLOW_QUERY_MS", "100")),
+                explain_slow_queries=os.getenv("MONGODB_SLOW_QUERY_EXPLAIN", "false").lower() == "true",
+                explain_runner=self._explain_command
+            )
+        return [self._command_listener]
+    
+    def _explain_command(self, database_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+        """Jalankan explain (queryPlanner) untuk slow query lewat client sync"""
+        if self._client is None:
+            self.connect()
+        return self._client[database_name].command("explain", command, verbosity="queryPlanner")
+    
     def connect(self):
         """Membuat koneksi ke MongoDB"""
         if self._client is None:
             mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-            self._client = MongoClient(mongodb_url)
+            self._pool_listener = PoolStatsListener("sync")
+            self._client = MongoClient(
+                mongodb_url,
+                event_listeners=[self._pool_listener, *self._get_command_listeners()],
+                **get_client_options()
+            )
             
             database_name = os.getenv("DATABASE_NAME", "lunance_db")
             self._database = self._client[database_name]
@@ -32,12 +90,80 @@ class DatabaseManager:
                 print(f"❌ Gagal terhubung ke MongoDB: {e}")
                 raise
     
+    def connect_async(self):
+        """Membuat koneksi async (Motor) ke MongoDB untuk dipakai di event loop"""
+        if self._async_client is None:
+            mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+            self._async_pool_listener = PoolStatsListener("async")
+            self._async_client = AsyncIOMotorClient(
+                mongodb_url,
+                event_listeners=[self._async_pool_listener, *self._get_command_listeners()],
+                **get_client_options()
+            )
+            
+            database_name = os.getenv("DATABASE_NAME", "lunance_db")
+            self._async_database = self._async_client[database_name]
+            print(f"✅ Motor client siap untuk database: {database_name}")
+    
+    def warm_pool(self):
+        """Membuka minPoolSize koneksi di client sync sebelum request pertama"""
+        min_pool_size = get_client_options()["minPoolSize"]
+        if min_pool_size <= 0:
+            return
+        
+        client = self._client
+        if client is None:
+            self.connect()
+            client = self._client
+        
+        # Ping paralel memaksa driver membuka koneksi baru, bukan memakai ulang satu koneksi
+        with ThreadPoolExecutor(max_workers=min_pool_size) as executor:
+            list(executor.map(lambda _: client.admin.command('ping'), range(min_pool_size)))
+        print(f"🔥 Pool MongoDB (sync) dipanaskan: {min_pool_size} koneksi")
+    
+    async def warm_async_pool(self):
+        """Membuka minPoolSize koneksi di client Motor sebelum request pertama"""
+        min_pool_size = get_client_options()["minPoolSize"]
+        if min_pool_size <= 0:
+            return
+        
+        if self._async_client is None:
+            self.connect_async()
+        
+        await asyncio.gather(*[
+            self._async_client.admin.command('ping') for _ in range(min_pool_size)
+        ])
+        print(f"🔥 Pool MongoDB (async) dipanaskan: {min_pool_size} koneksi")
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Statistik connection pool untuk client sync dan async"""
+        return {
+            "options": get_client_options(),
+            "sync": self._pool_listener.get_stats() if self._pool_listener else {},
+            "async": self._async_pool_listener.get_stats() if self._async_pool_listener else {},
+        }
+    
+    def get_command_stats(self) -> Dict[str, Any]:
+        """Statistik latency command per collection, operasi dan method pemanggil"""
+        if self._command_listener is None:
+            return {}
+        return {
+            "slow_query_ms": self._command_listener.slow_query_ms,
+            "collections": self._command_listener.get_stats(),
+        }
+    
     def get_database(self) -> Database:
         """Mendapatkan instance database"""
         if self._database is None:
             self.connect()
         return self._database
     
+    def get_async_database(self) -> AsyncIOMotorDatabase:
+        """Mendapatkan instance database async (Motor)"""
+        if self._async_database is None:
+            self.connect_async()
+        return self._async_database
+    
     def close(self):
         """Menutup koneksi database"""
         if self._client:
@@ -45,6 +171,12 @@ class DatabaseManager:
             self._client = None
             self._database = None
             print("🔐 Koneksi MongoDB ditutup")
+        
+        if self._async_client:
+            self._async_client.close()
+            self._async_client = None
+            self._async_database = None
+            print("🔐 Koneksi Motor ditutup")
 
 # Instance global untuk database
 db_manager = DatabaseManager()
@@ -53,66 +185,19 @@ def get_database():
     """Helper function untuk mendapatkan database instance"""
     return db_manager.get_database()
 
-def create_indexes():
-    """Membuat indexes untuk performa yang lebih baik"""
-    db = get_database()
-    
-    print("🔧 Membuat database indexes...")
-    
-    # Index untuk users collection
-    try:
-        db.users.create_index("email", unique=True)
-        db.users.create_index("username", unique=True)
-        db.users.create_index("created_at")
-        print("✅ Users indexes berhasil dibuat")
-    except Exception as e:
-        print(f"⚠️ Warning creating users indexes: {e}")
-    
-    # Index untuk conversations collection
-    try:
-        db.conversations.create_index([("user_id", 1), ("created_at", -1)])
-        db.conversations.create_index([("user_id", 1), ("status", 1)])
-        db.conversations.create_index([("user_id", 1), ("updated_at", -1)])
-        print("✅ Conversations indexes berhasil dibuat")
-    except Exception as e:
-        print(f"⚠️ Warning creating conversations indexes: {e}")
-    
-    # Index untuk messages collection
-    try:
-        db.messages.create_index([("conversation_id", 1), ("timestamp", 1)])
-        db.messages.create_index([("sender_id", 1), ("timestamp", -1)])
-        db.messages.create_index([("message_type", 1)])
-        db.messages.create_index([("conversation_id", 1), ("sender_type", 1)])
-        print("✅ Messages indexes berhasil dibuat")
-    except Exception as e:
-        print(f"⚠️ Warning creating messages indexes: {e}")
-    
-    # Index untuk transactions collection (Financial Management)
-    try:
-        db.transactions.create_index([("user_id", 1), ("date", -1)])
-        db.transactions.create_index([("user_id", 1), ("type", 1), ("date", -1)])
-        db.transactions.create_index([("user_id", 1), ("category", 1)])
-        db.transactions.create_index([("user_id", 1), ("status", 1)])
-        db.transactions.create_index([("user_id", 1), ("source", 1)])
-        db.transactions.create_index([("conversation_id", 1)])
-        db.transactions.create_index([("created_at", -1)])
-        # Compound index untuk filtering
-        db.transactions.create_index([("user_id", 1), ("type", 1), ("status", 1), ("date", -1)])
-        print("✅ Transactions indexes berhasil dibuat")
-    except Exception as e:
-        print(f"⚠️ Warning creating transactions indexes: {e}")
+def get_async_database():
+    """Helper function untuk mendapatkan database instance async (Motor)"""
+    return db_manager.get_async_database()
+
+def create_indexes(force: bool = False):
+    """Menerapkan migrasi index; dilewati jika deklarasi index tidak berubah"""
+    from .index_migrations import WAIT_SECONDS, run_index_migrations
     
-    # Index untuk savings_goals collection
     try:
-        db.savings_goals.create_index([("user_id", 1), ("status", 1)])
-        db.savings_goals.create_index([("user_id", 1), ("created_at", -1)])
-        db.savings_goals.create_index([("user_id", 1), ("target_date", 1)])
-        db.savings_goals.create_index([("status", 1), ("target_date", 1)])
-        print("✅ Savings Goals indexes berhasil dibuat")
+        return run_index_migrations(get_database(), force=force, wait_seconds=WAIT_SECONDS)
     except Exception as e:
-        print(f"⚠️ Warning creating savings_goals indexes: {e}")
-    
-    print("✅ Semua database indexes berhasil dibuat")
+        print(f"⚠️ Warning running index migrations: {e}")
+        return {"skipped": False, "error": str(e)}
 
 def create_initial_data():
     """Membuat data awal jika diperlukan"""
@@ -0,0 +1,315 @@
+# app/config/db_monitoring.py - Telemetry listeners untuk driver MongoDB
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
+
+from pymongo import monitoring
+
+slow_query_logger = logging.getLogger("lunance.slow_query")
+
+# Nama method service yang sedang memanggil database (Motor menyalin context ke thread executor)
+current_db_caller: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_db_caller", default=None)
+
+def instrument_db_calls(cls):
+    """Class decorator: tandai setiap async method agar command MongoDB tercatat dengan nama pemanggilnya"""
+    for attr_name, attr in list(vars(cls).items()):
+        if attr_name.startswith("__") or not inspect.iscoroutinefunction(attr):
+            continue
+        setattr(cls, attr_name, _with_db_caller(attr, f"{cls.__name__}.{attr_name}"))
+    return cls
+
+def _with_db_caller(func: Callable, caller: str) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        # Pertahankan pemanggil terluar jika method service saling memanggil
+        token = current_db_caller.set(current_db_caller.get() or caller)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            current_db_caller.reset(token)
+    return wrapper
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Mengumpulkan statistik connection pool (checked out, waiting, created, wait time)
+
+    Listener dipanggil dari thread driver, jadi semua counter dilindungi lock.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._pools: Dict[str, Dict[str, Any]] = {}
+
+    def _pool(self, address) -> Dict[str, Any]:
+        key = f"{address[0]}:{address[1]}" if address else "unknown"
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = {
+                "checked_out": 0,
+                "waiting": 0,
+                "open": 0,
+                "created": 0,
+                "closed": 0,
+                "checkout_failed": 0,
+                "cleared": 0,
+                "total_checkouts": 0,
+                "total_wait_ms": 0.0,
+                "max_wait_ms": 0.0,
+            }
+            self._pools[key] = pool
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["created"] += 1
+            pool["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["closed"] += 1
+            pool["open"] = max(0, pool["open"] - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._pool(event.address)["waiting"] += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["waiting"] = max(0, pool["waiting"] - 1)
+            pool["checkout_failed"] += 1
+
+    def connection_checked_out(self, event):
+        # event.duration tersedia sejak pymongo 4.7 (waktu tunggu checkout)
+        wait_ms = getattr(event, "duration", 0.0) * 1000
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["waiting"] = max(0, pool["waiting"] - 1)
+            pool["checked_out"] += 1
+            pool["total_checkouts"] += 1
+            pool["total_wait_ms"] += wait_ms
+            pool["max_wait_ms"] = max(pool["max_wait_ms"], wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checked_out"] = max(0, pool["checked_out"] - 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Snapshot statistik per server"""
+        with self._lock:
+            stats = {}
+            for address, pool in self._pools.items():
+                snapshot = dict(pool)
+                checkouts = snapshot["total_checkouts"]
+                snapshot["avg_wait_ms"] = round(snapshot["total_wait_ms"] / checkouts, 3) if checkouts else 0.0
+                snapshot["total_wait_ms"] = round(snapshot["total_wait_ms"], 3)
+                snapshot["max_wait_ms"] = round(snapshot["max_wait_ms"], 3)
+                stats[address] = snapshot
+            return stats
+
+# Command yang direkam beserta nama collection-nya
+TRACKED_COMMANDS = {
+    "find": "find",
+    "insert": "insert",
+    "update": "update",
+    "delete": "delete",
+    "findAndModify": "find_and_modify",
+    "count": "count",
+    "aggregate": "aggregate",
+    "distinct": "distinct",
+    "getMore": "get_more",
+}
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+
+# Batas atas bucket histogram latency (ms)
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+def query_shape(value: Any) -> Any:
+    """Ganti nilai filter dengan placeholder tipe agar bentuk query bisa dikelompokkan tanpa data user"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return []
+        # $in / $or dengan banyak elemen diringkas menjadi satu bentuk + jumlah elemen
+        shapes = [query_shape(item) for item in value]
+        if all(shape == shapes[0] for shape in shapes):
+            return [shapes[0], f"x{len(shapes)}"] if len(shapes) > 1 else shapes
+        return shapes
+    return f"<{type(value).__name__}>"
+
+def _command_filter(command_name: str, command: Dict[str, Any]) -> Any:
+    if command_name in ("find", "count", "distinct"):
+        return command.get("filter", command.get("query"))
+    if command_name == "findAndModify":
+        return command.get("query")
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        return pipeline[0].get("$match") if pipeline and "$match" in pipeline[0] else pipeline[:1]
+    if command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or []
+        return statements[0].get("q") if statements else None
+    return None
+
+def _documents_returned(command_name: str, reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    if command_name == "distinct":
+        return len(reply.get("values") or [])
+    return int(reply.get("n", 0) or 0)
+
+class CommandStatsListener(monitoring.CommandListener):
+    """Histogram latency per collection/operasi/pemanggil dan slow-query log"""
+
+    def __init__(
+        self,
+        slow_query_ms: float = 100.0,
+        explain_slow_queries: bool = False,
+        explain_runner: Optional[Callable[[str, Dict[str, Any]], Any]] = None
+    ):
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow_queries = explain_slow_queries and explain_runner is not None
+        self._explain_runner = explain_runner
+        self._explain_executor = ThreadPoolExecutor(max_workers=1) if self.explain_slow_queries else None
+        self._lock = threading.Lock()
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._stats: Dict[tuple, Dict[str, Any]] = {}
+
+    def started(self, event):
+        operation = TRACKED_COMMANDS.get(event.command_name)
+        if operation is None:
+            return
+
+        command = event.command
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        pending = {
+            "collection": str(collection),
+            "operation": operation,
+            "caller": current_db_caller.get() or "unknown",
+            "filter": _command_filter(event.command_name, command),
+            "database": event.database_name,
+        }
+        if self.explain_slow_queries and event.command_name in EXPLAINABLE_COMMANDS:
+            pending["command"] = {
+                key: value for key, value in command.items()
+                if key not in ("lsid", "$db", "$clusterTime", "txnNumber", "$readPreference")
+            }
+
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = pending
+
+    def succeeded(self, event):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        self._record(pending, event.duration_micros / 1000, _documents_returned(event.command_name, event.reply), failed=False)
+
+    def failed(self, event):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        self._record(pending, event.duration_micros / 1000, 0, failed=True)
+
+    def _record(self, pending: Dict[str, Any], duration_ms: float, documents: int, failed: bool):
+        key = (pending["collection"], pending["operation"], pending["caller"])
+        bucket = next((i for i, upper in enumerate(LATENCY_BUCKETS_MS) if duration_ms <= upper), len(LATENCY_BUCKETS_MS))
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = {
+                    "count": 0,
+                    "failed": 0,
+                    "documents_returned": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "slow": 0,
+                    "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+                self._stats[key] = stats
+            stats["count"] += 1
+            stats["failed"] += int(failed)
+            stats["documents_returned"] += documents
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["histogram"][bucket] += 1
+            is_slow = duration_ms >= self.slow_query_ms
+            if is_slow:
+                stats["slow"] += 1
+
+        if is_slow:
+            self._log_slow_query(pending, duration_ms, documents)
+
+    def _log_slow_query(self, pending: Dict[str, Any], duration_ms: float, documents: int):
+        slow_query_logger.warning(
+            f"SLOW {pending['collection']}.{pending['operation']} {duration_ms:.1f}ms "
+            f"| docs: {documents} | caller: {pending['caller']} "
+            f"| filter: {query_shape(pending['filter'])}"
+        )
+
+        command = pending.get("command")
+        if command and self._explain_executor:
+            self._explain_executor.submit(self._log_explain, pending, command)
+
+    def _log_explain(self, pending: Dict[str, Any], command: Dict[str, Any]):
+        try:
+            explain = self._explain_runner(pending["database"], command)
+            winning_plan = explain.get("queryPlanner", {}).get("winningPlan")
+            slow_query_logger.warning(
+                f"EXPLAIN {pending['collection']}.{pending['operation']} "
+                f"| caller: {pending['caller']} | winningPlan: {winning_plan}"
+            )
+        except Exception as e:
+            slow_query_logger.warning(f"EXPLAIN failed for {pending['collection']}.{pending['operation']}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Snapshot statistik per collection -> operasi -> pemanggil"""
+        labels = [f"<={upper}ms" for upper in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        result: Dict[str, Any] = {}
+        with self._lock:
+            for (collection, operation, caller), stats in self._stats.items():
+                count = stats["count"]
+                result.setdefault(collection, {}).setdefault(operation, {})[caller] = {
+                    "count": count,
+                    "failed": stats["failed"],
+                    "slow": stats["slow"],
+                    "documents_returned": stats["documents_returned"],
+                    "avg_ms": round(stats["total_ms"] / count, 3) if count else 0.0,
+                    "max_ms": round(stats["max_ms"], 3),
+                    "histogram": dict(zip(labels, stats["histogram"])),
+                }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
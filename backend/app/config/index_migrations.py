@@ -0,0 +1,339 @@
+# app/config/index_migrations.py - Versioned index migrations
+"""
+Index MongoDB dideklarasikan di INDEX_SPECS. Saat startup hanya fingerprint
+dari deklarasi ini yang dibandingkan dengan catatan di collection
+`schema_migrations`; pass index lengkap hanya berjalan jika deklarasi berubah.
+
+Startup hanya membuat index yang kurang, membangun ulang index yang
+definisinya berubah dan menghapus index di RETIRED_INDEXES. Index lain yang
+tidak dideklarasikan (mis. dibuat operator) hanya dilaporkan; index itu
+dihapus hanya lewat --apply.
+
+Review perubahan index sebelum deploy:
+    python -m app.config.index_migrations --plan
+Terapkan secara manual (termasuk drop index yang tidak dideklarasikan):
+    python -m app.config.index_migrations --apply
+"""
+import argparse
+import hashlib
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+INDEX_MIGRATION_ID = "indexes"
+# Lease agar hanya satu worker yang menjalankan migrasi saat beberapa worker boot bersamaan
+INDEX_MIGRATION_LOCK_ID = "indexes_lock"
+LOCK_LEASE_SECONDS = int(os.getenv("INDEX_MIGRATION_LEASE_SECONDS", "600"))
+# Worker yang tidak memegang lease menunggu migrasi worker lain selesai paling lama selama ini
+WAIT_SECONDS = float(os.getenv("INDEX_MIGRATION_WAIT_SECONDS", "300"))
+
+# Opsi index yang ikut dibandingkan antara deklarasi dan index yang sudah ada
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+def index(keys: List[Tuple[str, int]], **options) -> Dict[str, Any]:
+    """Deklarasi satu index; nama default mengikuti konvensi pymongo (field_1_field_-1)"""
+    name = options.pop("name", None) or "_".join(f"{field}_{direction}" for field, direction in keys)
+    return {"name": name, "keys": list(keys), "options": options}
+
+# Deklarasi index per collection. Ubah di sini, lalu review dengan --plan.
+INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        index([("email", 1)], unique=True),
+        index([("username", 1)], unique=True),
+        index([("created_at", 1)]),
+    ],
+    "conversations": [
+        index([("user_id", 1), ("created_at", -1)]),
+        # Delta sync: perubahan per user sejak token (updated_at, _id)
+        index([("user_id", 1), ("updated_at", 1), ("_id", 1)]),
+        # Keyset pagination daftar percakapan per sort_by (PaginationRequest)
+        index([("user_id", 1), ("status", 1), ("updated_at", -1), ("_id", -1)]),
+        index([("user_id", 1), ("status", 1), ("created_at", -1), ("_id", -1)]),
+        index([("user_id", 1), ("status", 1), ("title", 1), ("_id", 1)]),
+        # Kandidat sweeper percakapan kosong: global (message_count, updated_at) dan per user
+        index([("message_count", 1), ("user_id", 1), ("updated_at", 1)]),
+    ],
+    "messages": [
+        # Keyset pagination pesan: (conversation_id, timestamp, _id), dipakai dua arah
+        index([("conversation_id", 1), ("timestamp", 1), ("_id", 1)]),
+        index([("sender_id", 1), ("timestamp", -1)]),
+        index([("message_type", 1)]),
+        index([("conversation_id", 1), ("sender_type", 1)]),
+    ],
+    # Inverted index full-text search (ChatSearchService); terms adalah array -> index multikey
+    "search_index": [
+        index([("user_id", 1), ("terms", 1), ("timestamp", -1)]),
+    ],
+    "transactions": [
+        index([("user_id", 1), ("date", -1)]),
+        index([("user_id", 1), ("type", 1), ("date", -1)]),
+        index([("user_id", 1), ("category", 1)]),
+        index([("user_id", 1), ("status", 1)]),
+        index([("user_id", 1), ("source", 1)]),
+        index([("conversation_id", 1)]),
+        index([("created_at", -1)]),
+        # Compound index untuk filtering
+        index([("user_id", 1), ("type", 1), ("status", 1), ("date", -1)]),
+    ],
+    "savings_goals": [
+        index([("user_id", 1), ("status", 1)]),
+        index([("user_id", 1), ("created_at", -1)]),
+        index([("user_id", 1), ("target_date", 1)]),
+        index([("status", 1), ("target_date", 1)]),
+    ],
+    # Resume token change stream per worker; token worker yang sudah tidak ada dihapus
+    "change_stream_tokens": [
+        index([("updated_at", 1)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+    # Status job export PDF (PdfExportManager); dihapus MongoDB saat expires_at lewat
+    "export_jobs": [
+        index([("expires_at", 1)], expireAfterSeconds=0),
+    ],
+}
+
+# Index yang pernah dibuat aplikasi lalu diganti; aman dihapus otomatis saat startup
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    # Digantikan (user_id, updated_at, _id) dan index keyset per status
+    "conversations": ["user_id_1_updated_at_-1", "user_id_1_status_1"],
+    # Digantikan (conversation_id, timestamp, _id)
+    "messages": ["conversation_id_1_timestamp_1"],
+}
+
+def get_index_fingerprint() -> str:
+    """Hash stabil dari INDEX_SPECS; berubah setiap kali deklarasi index berubah"""
+    canonical = json.dumps(INDEX_SPECS, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+def _normalize_existing(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Ubah output list_indexes ke bentuk yang sama dengan deklarasi"""
+    return {
+        "name": info["name"],
+        "keys": [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in info["key"].items()],
+        "options": {option: info[option] for option in COMPARED_OPTIONS if option in info},
+    }
+
+def _same_index(desired: Dict[str, Any], existing: Dict[str, Any]) -> bool:
+    if desired["keys"] != existing["keys"]:
+        return False
+    desired_options = {k: v for k, v in desired["options"].items() if k in COMPARED_OPTIONS}
+    # unique=False sama dengan opsi yang tidak diset
+    if desired_options.get("unique") is False:
+        desired_options.pop("unique")
+    return desired_options == existing["options"]
+
+def plan_index_changes(db: Database, drop_undeclared: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """Bandingkan index yang dideklarasikan dengan index yang ada di database
+
+    Index yang tidak dideklarasikan masuk `drop` hanya jika ada di
+    RETIRED_INDEXES atau drop_undeclared=True; selain itu masuk `unmanaged`.
+    """
+    plan = {}
+    existing_collections = set(db.list_collection_names())
+
+    for collection_name, specs in INDEX_SPECS.items():
+        existing = {}
+        if collection_name in existing_collections:
+            for info in db[collection_name].list_indexes():
+                if info["name"] != "_id_":
+                    existing[info["name"]] = _normalize_existing(info)
+
+        desired = {spec["name"]: spec for spec in specs}
+        retired = set(RETIRED_INDEXES.get(collection_name, ()))
+        create, drop, unmanaged = [], [], []
+
+        for name, spec in desired.items():
+            current = existing.get(name)
+            if current is None:
+                create.append(name)
+            elif not _same_index(spec, current):
+                # Definisi berubah dengan nama yang sama: drop lalu build ulang
+                drop.append(name)
+                create.append(name)
+
+        for name in existing:
+            if name in desired:
+                continue
+            if drop_undeclared or name in retired:
+                drop.append(name)
+            else:
+                unmanaged.append(name)
+
+        if create or drop or unmanaged:
+            plan[collection_name] = {"create": create, "drop": drop, "unmanaged": unmanaged}
+
+    return plan
+
+def apply_index_changes(db: Database, plan: Dict[str, Dict[str, List[str]]]) -> Tuple[List[str], List[str]]:
+    """Jalankan plan: drop index lama, build index baru. Return (berhasil, gagal)"""
+    applied, failed = [], []
+
+    for collection_name, changes in plan.items():
+        collection = db[collection_name]
+        specs = {spec["name"]: spec for spec in INDEX_SPECS[collection_name]}
+
+        for name in changes["drop"]:
+            try:
+                collection.drop_index(name)
+                applied.append(f"drop {collection_name}.{name}")
+            except OperationFailure as e:
+                failed.append(f"drop {collection_name}.{name}")
+                print(f"⚠️ Warning dropping index {collection_name}.{name}: {e}")
+
+        for name in changes["create"]:
+            spec = specs[name]
+            try:
+                # background diabaikan oleh MongoDB >= 4.2 (build selalu non-blocking), tetap diset untuk server lama
+                collection.create_index(spec["keys"], name=name, background=True, **spec["options"])
+                applied.append(f"create {collection_name}.{name}")
+            except OperationFailure as e:
+                failed.append(f"create {collection_name}.{name}")
+                print(f"❌ Error creating index {collection_name}.{name}: {e}")
+
+        for name in changes.get("unmanaged", ()):
+            print(f"ℹ️ Index {collection_name}.{name} tidak dideklarasikan; dibiarkan (hapus lewat --apply)")
+
+    return applied, failed
+
+def _acquire_lock(db: Database, owner: str) -> bool:
+    """Ambil lease migrasi; False jika worker lain sedang memegangnya"""
+    now = datetime.utcnow()
+    try:
+        lock = db[MIGRATIONS_COLLECTION].find_one_and_update(
+            {"_id": INDEX_MIGRATION_LOCK_ID, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=LOCK_LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Dokumen lock ada dan lease belum habis
+        return False
+    return lock is not None and lock.get("owner") == owner
+
+def _release_lock(db: Database, owner: str):
+    try:
+        db[MIGRATIONS_COLLECTION].delete_one({"_id": INDEX_MIGRATION_LOCK_ID, "owner": owner})
+    except PyMongoError as e:
+        print(f"⚠️ Warning releasing index migration lock: {e}")
+
+def _wait_for_migration(db: Database, fingerprint: str, timeout: float) -> bool:
+    """Tunggu worker pemegang lease; True jika fingerprint tercatat sebelum timeout"""
+    migrations = db[MIGRATIONS_COLLECTION]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(1)
+        record = migrations.find_one({"_id": INDEX_MIGRATION_ID})
+        if record and record.get("fingerprint") == fingerprint:
+            return True
+        lock = migrations.find_one({"_id": INDEX_MIGRATION_LOCK_ID})
+        if lock is None or lock.get("expires_at", datetime.min) < datetime.utcnow():
+            # Pemegang lease selesai tanpa mencatat fingerprint (ada langkah gagal) atau mati
+            return False
+    return False
+
+def run_index_migrations(db: Database, force: bool = False, drop_undeclared: bool = False,
+                         owner: Optional[str] = None, wait_seconds: float = 0) -> Dict[str, Any]:
+    """Terapkan index hanya jika fingerprint deklarasi berbeda dengan yang tercatat
+
+    Migrasi berjalan di bawah lease di `schema_migrations`; worker lain yang
+    boot bersamaan menunggu paling lama `wait_seconds` sampai migrasi itu
+    tercatat. Fingerprint hanya dicatat jika semua langkah berhasil, sehingga
+    langkah yang gagal dicoba lagi pada startup berikutnya.
+    """
+    fingerprint = get_index_fingerprint()
+    migrations = db[MIGRATIONS_COLLECTION]
+
+    record = migrations.find_one({"_id": INDEX_MIGRATION_ID})
+    if record and record.get("fingerprint") == fingerprint and not force:
+        print(f"✅ Database indexes up to date (versi {record.get('version')}, {fingerprint})")
+        return {"skipped": True, "version": record.get("version"), "fingerprint": fingerprint}
+
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if not _acquire_lock(db, owner):
+        print("⏳ Migrasi index sedang dijalankan worker lain")
+        if wait_seconds > 0 and _wait_for_migration(db, fingerprint, wait_seconds):
+            print(f"✅ Migrasi index worker lain selesai ({fingerprint})")
+            return {"skipped": True, "fingerprint": fingerprint}
+        return {"skipped": True, "locked": True, "fingerprint": fingerprint}
+
+    try:
+        # Worker pemegang lease sebelumnya mungkin baru saja selesai
+        record = migrations.find_one({"_id": INDEX_MIGRATION_ID})
+        if record and record.get("fingerprint") == fingerprint and not force:
+            print(f"✅ Database indexes up to date (versi {record.get('version')}, {fingerprint})")
+            return {"skipped": True, "version": record.get("version"), "fingerprint": fingerprint}
+
+        print(f"🔧 Menjalankan migrasi index ({fingerprint})...")
+        plan = plan_index_changes(db, drop_undeclared=drop_undeclared)
+        applied, failed = apply_index_changes(db, plan)
+        if failed:
+            print(f"❌ Migrasi index belum lengkap ({len(failed)} langkah gagal); fingerprint tidak dicatat")
+            return {"skipped": False, "fingerprint": fingerprint, "changes": applied, "failed": failed}
+        return _record_migration(migrations, record, fingerprint, applied)
+    finally:
+        _release_lock(db, owner)
+
+def _record_migration(migrations, record: Optional[Dict[str, Any]], fingerprint: str, applied: List[str]) -> Dict[str, Any]:
+    """Catat versi dan fingerprint yang berhasil diterapkan"""
+    version = (record.get("version", 0) if record else 0) + 1
+    now = datetime.utcnow()
+    migrations.update_one(
+        {"_id": INDEX_MIGRATION_ID},
+        {
+            "$set": {
+                "version": version,
+                "fingerprint": fingerprint,
+                "applied_at": now,
+            },
+            "$push": {
+                "history": {
+                    "$each": [{
+                        "version": version,
+                        "fingerprint": fingerprint,
+                        "applied_at": now,
+                        "changes": applied,
+                    }],
+                    "$slice": -50,
+                }
+            },
+        },
+        upsert=True
+    )
+
+    print(f"✅ Migrasi index versi {version} selesai: {len(applied)} perubahan")
+    return {"skipped": False, "version": version, "fingerprint": fingerprint, "changes": applied}
+
+def main():
+    from .database import get_database
+
+    parser = argparse.ArgumentParser(description="Lunance index migrations")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--plan", action="store_true", help="Tampilkan perubahan yang akan diterapkan --apply")
+    group.add_argument("--apply", action="store_true", help="Terapkan perubahan index, termasuk drop index yang tidak dideklarasikan")
+    args = parser.parse_args()
+
+    db = get_database()
+    if args.plan:
+        print(f"Fingerprint deklarasi: {get_index_fingerprint()}")
+        plan = plan_index_changes(db, drop_undeclared=True)
+        if not plan:
+            print("Tidak ada perubahan index")
+        for collection_name, changes in plan.items():
+            for name in changes["drop"]:
+                print(f"  - drop   {collection_name}.{name}")
+            for name in changes["create"]:
+                print(f"  + create {collection_name}.{name}")
+    else:
+        run_index_migrations(db, force=True, drop_undeclared=True)
+
+if __name__ == "__main__":
+    main()
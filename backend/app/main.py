@@ -3,6 +3,7 @@ from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import os
+import asyncio
 import socket
 import sys
 import json
@@ -35,6 +36,11 @@ def setup_logging():
         ]
     )
     
+    # Slow query MongoDB dipisah ke file sendiri
+    slow_query_handler = logging.FileHandler("logs/slow_queries.log", encoding="utf-8")
+    slow_query_handler.setFormatter(logging.Formatter(log_format, date_format))
+    logging.getLogger("lunance.slow_query").addHandler(slow_query_handler)
+    
     return logging.getLogger()
 
 logger = setup_logging()
@@ -192,12 +198,37 @@ async def startup_event():
     try:
         from .config.database import db_manager, create_indexes
         db_manager.connect()
-        create_indexes()
+        db_manager.connect_async()
+        # Migrasi index (pymongo sync) di thread terpisah, paralel dengan warm-up pool
+        migration = asyncio.get_running_loop().run_in_executor(None, create_indexes)
+        db_manager.warm_pool()
+        await db_manager.warm_async_pool()
+        # Query keyset dan sync butuh index-nya: request baru dilayani setelah migrasi selesai
+        migration_result = await migration
+        if migration_result.get("error") or migration_result.get("failed"):
+            logger.error(f"❌ Index migration incomplete: {migration_result.get('error') or migration_result.get('failed')}")
+        elif migration_result.get("locked"):
+            logger.warning("⚠️ Index migration still held by another worker; indexes may be incomplete")
         logger.info("✅ Database connection established")
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         sys.exit(1)
     
+    if "chat" in routers_loaded:
+        from .routers.chat import conversation_sweeper, change_stream
+        conversation_sweeper.start()
+        if change_stream.enabled_by_env():
+            change_stream.start()
+        
+        from .services.websocket_manager import websocket_manager
+        from .services.ws_backplane import create_backplane_from_env
+        backplane = create_backplane_from_env()
+        if backplane is not None:
+            try:
+                await websocket_manager.start_backplane(backplane)
+            except Exception as e:
+                logger.error(f"WebSocket backplane failed, events stay local to this worker: {e}")
+    
     local_ip = get_local_ip()
     port = os.getenv("PORT", "8000")
     
@@ -217,6 +248,19 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Event shutdown"""
+    try:
+        from .routers.chat import chat_service, conversation_sweeper, pdf_exports, change_stream
+        from .services.websocket_manager import websocket_manager
+        await change_stream.stop()
+        await websocket_manager.graceful_shutdown()
+        await websocket_manager.stop_backplane()
+        await conversation_sweeper.stop()
+        await pdf_exports.stop()
+        # Commit pesan dan update turunan yang masih di antrian sebelum koneksi ditutup
+        await chat_service.write_queue.stop()
+    except Exception as e:
+        logger.error(f"Error stopping chat background tasks: {e}")
+    
     try:
         from .config.database import db_manager
         db_manager.close()
@@ -290,6 +334,9 @@ async def health_check():
         db.command("ping")
         health_data["database"] = "connected"
         
+        from .config.database import db_manager
+        health_data["database_pool"] = db_manager.get_pool_stats()
+        
         from .services.auth_service import AuthService
         auth_service = AuthService()
         health_data["auth_service"] = "active"
@@ -319,6 +366,54 @@ async def health_check():
             }
         )
 
+@app.get("/health/database")
+async def database_metrics():
+    """Metrik connection pool dan latency command MongoDB"""
+    from .config.database import db_manager
+    from .utils.timezone_utils import IndonesiaDatetime
+    
+    data = {
+        "pool": db_manager.get_pool_stats(),
+        "commands": db_manager.get_command_stats()
+    }
+    try:
+        from .routers.chat import chat_service, pdf_exports, change_stream
+        data["conversation_cache"] = chat_service.conversation_cache.get_stats()
+        data["message_buffer"] = chat_service.message_buffer.get_stats()
+        data["write_behind"] = {**chat_service.write_queue.get_stats(), "enabled": chat_service.write_behind}
+        data["pdf_exports"] = pdf_exports.get_stats()
+        data["change_stream"] = change_stream.get_stats()
+    except Exception as e:
+        logger.error(f"Error reading chat service stats: {e}")
+    
+    return {
+        "success": True,
+        "message": "Metrik database",
+        "data": data,
+        "timestamp": IndonesiaDatetime.now().isoformat()
+    }
+
+@app.get("/health/websocket")
+async def websocket_metrics():
+    """Metrik koneksi WebSocket worker ini: socket, antrean keluar dan backplane"""
+    from .services.websocket_manager import websocket_manager
+    from .utils.timezone_utils import IndonesiaDatetime
+    
+    data = {
+        "connections": websocket_manager.get_connection_count(),
+        "connected_users": len(websocket_manager.connections),
+        "send_queues": websocket_manager.get_queue_stats()
+    }
+    if websocket_manager.backplane is not None:
+        data["backplane"] = websocket_manager.backplane.get_stats()
+    
+    return {
+        "success": True,
+        "message": "Metrik WebSocket",
+        "data": data,
+        "timestamp": IndonesiaDatetime.now().isoformat()
+    }
+
 @app.get("/api/v1/info")
 async def api_info():
     """Informasi tentang API"""
@@ -144,6 +144,7 @@ class WSMessageType(str, Enum):
     TYPING_STOP = "typing_stop"
     USER_JOINED = "user_joined"
     USER_LEFT = "user_left"
+    CONVERSATION_UPDATED = "conversation_updated"
     ERROR = "error"
     SUCCESS = "success"
 
@@ -1,132 +1,109 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from typing import List, Dict, Any, Optional
-import json
 import asyncio
 from datetime import datetime
 
 from ..services.auth_dependency import get_current_user
 from ..services.chat_service import ChatService
+from ..services.conversation_sweeper import ConversationSweeper
+from ..services.pdf_export_service import PdfExportManager
+from ..services.change_stream_consumer import ChangeStreamConsumer
+from ..services.websocket_manager import websocket_manager
 from ..models.user import User
-from ..models.chat import WSMessage, WSMessageType
+from ..models.chat import ConversationStatus, WSMessage, WSMessageType
 from ..utils.timezone_utils import IndonesiaDatetime
 from ..schemas.chat_schemas import (
     ChatMessageRequest,
     ChatMessageResponse,
     ConversationResponse,
-    CreateConversationRequest
+    CreateConversationRequest,
+    PaginationRequest,
+    BulkDeleteConversationsRequest,
+    ArchiveConversationRequest,
+    ExportConversationRequest
 )
+from ..utils.conversation_export import EXPORT_MEDIA_TYPES, stream_export
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-    
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        
-        await self.send_personal_message({
-            "type": WSMessageType.SUCCESS,
-            "data": {"message": "Connected to simple chat"},
-            "timestamp": IndonesiaDatetime.now().isoformat(),
-            "timezone": "WIB"
-        }, user_id)
-    
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-    
-    async def send_personal_message(self, message: dict, user_id: str):
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_text(json.dumps(message))
-            except:
-                self.disconnect(user_id)
-    
-    async def broadcast_to_user(self, message: dict, user_id: str):
-        await self.send_personal_message(message, user_id)
-
-manager = ConnectionManager()
 chat_service = ChatService()
+conversation_sweeper = ConversationSweeper(chat_service)
+pdf_exports = PdfExportManager(chat_service)
+# Hook per socket: buffer pesan ChatService memakai refcount per user
+websocket_manager.add_listener(
+    on_connect=chat_service.on_user_connected,
+    on_disconnect=chat_service.on_user_disconnected
+)
+# Pesan/percakapan yang ditulis di mana pun dikirim ke socket pemilik di worker ini
+change_stream = ChangeStreamConsumer(
+    lambda message, user_id: websocket_manager.send_to_user(user_id, message),
+    websocket_manager.is_connected,
+    on_message=chat_service.on_message_stored
+)
+
+def _chat_message_frame(message, conversation_id: str, sender_type: str) -> Dict[str, Any]:
+    data = {
+        "id": message.id,
+        "conversation_id": conversation_id,
+        "sender_type": sender_type,
+        "content": message.content,
+        "timestamp": IndonesiaDatetime.from_utc(message.timestamp),
+        "status": "delivered",
+        "timezone": "WIB"
+    }
+    if sender_type == "system":
+        data["message_type"] = message.message_type
+    return {
+        "type": WSMessageType.CHAT_MESSAGE,
+        "data": {"message": data},
+        "timestamp": IndonesiaDatetime.now()
+    }
 
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    """WebSocket endpoint untuk simple chat (no AI)"""
-    await manager.connect(websocket, user_id)
+    """WebSocket endpoint untuk simple chat (no AI); satu user boleh terhubung dari beberapa device"""
+    connection = await websocket_manager.connect(websocket, user_id)
     
     try:
         while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            # Teks JSON atau frame MessagePack (subprotocol lunance.msgpack.v1)
+            message_data = await websocket_manager.receive(connection)
             
             message_type = message_data.get("type")
             content = message_data.get("data", {})
             
-            if message_type == WSMessageType.CHAT_MESSAGE:
-                conversation_id = content.get("conversation_id")
-                user_message = content.get("message")
-                
-                if not conversation_id or not user_message:
-                    await manager.send_personal_message({
-                        "type": WSMessageType.ERROR,
-                        "data": {"message": "Missing conversation_id or message"},
-                        "timestamp": IndonesiaDatetime.now().isoformat()
-                    }, user_id)
-                    continue
-                
-                # Process message (no AI)
-                result = await chat_service.send_message(user_id, conversation_id, user_message)
-                
-                user_timestamp_wib = IndonesiaDatetime.from_utc(result["user_message"].timestamp)
-                system_timestamp_wib = IndonesiaDatetime.from_utc(result["system_response"].timestamp)
-                
-                # Send user message back
-                await manager.send_personal_message({
-                    "type": WSMessageType.CHAT_MESSAGE,
-                    "data": {
-                        "message": {
-                            "id": result["user_message"].id,
-                            "conversation_id": conversation_id,
-                            "sender_type": "user",
-                            "content": result["user_message"].content,
-                            "timestamp": user_timestamp_wib.isoformat(),
-                            "status": "delivered",
-                            "timezone": "WIB"
-                        }
-                    },
-                    "timestamp": IndonesiaDatetime.now().isoformat()
-                }, user_id)
-                
-                # Send system response
-                await manager.send_personal_message({
-                    "type": WSMessageType.CHAT_MESSAGE,
-                    "data": {
-                        "message": {
-                            "id": result["system_response"].id,
-                            "conversation_id": conversation_id,
-                            "sender_type": "system",
-                            "content": result["system_response"].content,
-                            "timestamp": system_timestamp_wib.isoformat(),
-                            "status": "delivered",
-                            "timezone": "WIB",
-                            "message_type": result["system_response"].message_type,
-                        }
-                    },
-                    "timestamp": IndonesiaDatetime.now().isoformat()
-                }, user_id)
+            if message_type != WSMessageType.CHAT_MESSAGE:
+                # ping dan status mengetik per device
+                await websocket_manager.handle_message_received(connection, message_data)
+                continue
+            
+            connection.last_activity = datetime.utcnow()
+            conversation_id = content.get("conversation_id")
+            user_message = content.get("message")
+            
+            if not conversation_id or not user_message:
+                await websocket_manager.send_error(connection, "Missing conversation_id or message")
+                continue
+            
+            # Process message (no AI)
+            result = await chat_service.send_message(user_id, conversation_id, user_message)
+            if change_stream.is_live():
+                # Kedua pesan dikirim oleh change stream consumer; hindari duplikat
+                continue
+            
+            # Kirim ke semua device user (termasuk di worker lain) agar ikut menampilkan pesan
+            await websocket_manager.deliver([user_id], _chat_message_frame(result["user_message"], conversation_id, "user"))
+            await websocket_manager.deliver([user_id], _chat_message_frame(result["system_response"], conversation_id, "system"))
     
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        pass
     except Exception as e:
-        await manager.send_personal_message({
-            "type": WSMessageType.ERROR,
-            "data": {"message": f"Error: {str(e)}"},
-            "timestamp": IndonesiaDatetime.now().isoformat()
-        }, user_id)
-        manager.disconnect(user_id)
+        await websocket_manager.send_error(connection, f"Error: {str(e)}")
+        # Tunggu frame error terkirim sebelum socket ditutup (1011: internal error)
+        await websocket_manager.close(connection, code=1011, reason="Internal error")
+    finally:
+        websocket_manager.disconnect(connection)
 
 @router.post("/conversations", response_model=ConversationResponse)
 async def create_conversation(
@@ -135,8 +112,8 @@ async def create_conversation(
 ):
     """Membuat percakapan baru"""
     try:
-        cleanup_stats = await chat_service.auto_delete_empty_conversations(current_user.id)
         conversation = await chat_service.create_conversation(current_user.id)
+        cleanup_stats = {"scheduled": conversation_sweeper.request_user_sweep(current_user.id)}
         
         created_time_wib = IndonesiaDatetime.from_utc(conversation.created_at)
         updated_time_wib = IndonesiaDatetime.from_utc(conversation.updated_at)
@@ -166,20 +143,31 @@ async def create_conversation(
 
 @router.get("/conversations")
 async def get_conversations(
-    limit: int = 20,
+    pagination: PaginationRequest = Depends(),
     auto_cleanup: bool = True,
     current_user: User = Depends(get_current_user)
 ):
-    """Mengambil daftar percakapan user"""
+    """Mengambil daftar percakapan user (keyset pagination lewat cursor)"""
     try:
         cleanup_stats = {}
         if auto_cleanup:
-            cleanup_stats = await chat_service.auto_delete_empty_conversations(current_user.id)
+            # Cleanup percakapan kosong berjalan di background, tidak menahan response
+            cleanup_stats = {"scheduled": conversation_sweeper.request_user_sweep(current_user.id)}
         
-        conversations = await chat_service.get_user_conversations(current_user.id, limit)
+        try:
+            page = await chat_service.get_user_conversations_page(
+                current_user.id,
+                limit=pagination.limit,
+                sort_by=pagination.sort_by,
+                sort_order=pagination.sort_order,
+                cursor=pagination.cursor,
+                direction=pagination.direction
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         conversation_list = []
-        for conv in conversations:
+        for conv in page["conversations"]:
             created_time_wib = IndonesiaDatetime.from_utc(conv.created_at)
             updated_time_wib = IndonesiaDatetime.from_utc(conv.updated_at)
             last_message_time_wib = None
@@ -207,6 +195,15 @@ async def get_conversations(
                 "total": len(conversation_list),
                 "timezone": "Asia/Jakarta (WIB/GMT+7)",
                 "current_time_wib": IndonesiaDatetime.format(IndonesiaDatetime.now())
+            },
+            "pagination": {
+                "limit": pagination.limit,
+                "sort_by": pagination.sort_by,
+                "sort_order": pagination.sort_order,
+                "has_next": page["has_next"],
+                "has_prev": page["has_prev"],
+                "next_cursor": page["next_cursor"],
+                "prev_cursor": page["prev_cursor"]
             }
         }
         
@@ -215,25 +212,34 @@ async def get_conversations(
         
         return JSONResponse(status_code=200, content=response_data)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gagal mengambil percakapan: {str(e)}")
 
 @router.get("/conversations/{conversation_id}/messages")
 async def get_conversation_messages(
     conversation_id: str,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=100),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Mengambil pesan dalam percakapan"""
+    """Mengambil pesan dalam percakapan (terbaru dulu, lanjut dengan cursor before/after)"""
     try:
         conversation = await chat_service.get_conversation_by_id(conversation_id)
         if not conversation or conversation.user_id != current_user.id:
             raise HTTPException(status_code=404, detail="Percakapan tidak ditemukan")
         
-        messages = await chat_service.get_conversation_messages(conversation_id, limit)
+        try:
+            page = await chat_service.get_conversation_messages(
+                conversation_id, limit, before=before, after=after, owner_id=current_user.id
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         message_list = []
-        for msg in messages:
+        for msg in page["messages"]:
             timestamp_wib = IndonesiaDatetime.from_utc(msg.timestamp)
             
             message_data = {
@@ -264,6 +270,13 @@ async def get_conversation_messages(
                 "message": "Pesan berhasil diambil",
                 "data": {
                     "messages": message_list,
+                    "pagination": {
+                        "limit": limit,
+                        "has_more": page["has_more"],
+                        "direction": "after" if after else "before",
+                        "before_cursor": page["before_cursor"],
+                        "after_cursor": page["after_cursor"]
+                    },
                     "conversation": {
                         "id": conversation.id,
                         "title": conversation.title,
@@ -362,17 +375,271 @@ async def delete_conversation(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gagal menghapus percakapan: {str(e)}")
 
+def _bulk_response(action: str, outcomes: Dict[str, str], changed_outcome: str) -> JSONResponse:
+    summary: Dict[str, int] = {}
+    for outcome in outcomes.values():
+        summary[outcome] = summary.get(outcome, 0) + 1
+    
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "message": f"{summary.get(changed_outcome, 0)} dari {len(outcomes)} percakapan berhasil {action}",
+            "data": {
+                "results": [
+                    {"id": conversation_id, "status": outcome}
+                    for conversation_id, outcome in outcomes.items()
+                ],
+                "summary": summary,
+                "processed_at": IndonesiaDatetime.format(IndonesiaDatetime.now()),
+                "timezone": "WIB"
+            }
+        }
+    )
+
+@router.post("/conversations/bulk-delete")
+async def bulk_delete_conversations(
+    request: BulkDeleteConversationsRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Menghapus beberapa percakapan sekaligus (maks. 50), hasil per id"""
+    try:
+        conversation_ids = list(dict.fromkeys(request.conversation_ids))
+        outcomes = await chat_service.bulk_delete_conversations(current_user.id, conversation_ids)
+        return _bulk_response("dihapus", outcomes, "deleted")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gagal menghapus percakapan: {str(e)}")
+
+@router.post("/conversations/archive")
+async def archive_conversations(
+    request: ArchiveConversationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Mengarsipkan satu atau beberapa percakapan (maks. 50), hasil per id"""
+    conversation_ids = request.get_conversation_ids()
+    if not conversation_ids:
+        raise HTTPException(status_code=400, detail="conversation_id atau conversation_ids wajib diisi")
+    if len(conversation_ids) > 50:
+        raise HTTPException(status_code=400, detail="Maksimal 50 percakapan per permintaan")
+    
+    try:
+        outcomes = await chat_service.archive_conversations(current_user.id, conversation_ids)
+        return _bulk_response("diarsipkan", outcomes, "archived")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gagal mengarsipkan percakapan: {str(e)}")
+
+@router.post("/conversations/unarchive")
+async def unarchive_conversations(
+    request: ArchiveConversationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Mengeluarkan satu atau beberapa percakapan dari arsip (maks. 50), hasil per id"""
+    conversation_ids = request.get_conversation_ids()
+    if not conversation_ids:
+        raise HTTPException(status_code=400, detail="conversation_id atau conversation_ids wajib diisi")
+    if len(conversation_ids) > 50:
+        raise HTTPException(status_code=400, detail="Maksimal 50 percakapan per permintaan")
+    
+    try:
+        outcomes = await chat_service.unarchive_conversations(current_user.id, conversation_ids)
+        return _bulk_response("dikeluarkan dari arsip", outcomes, "unarchived")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gagal mengeluarkan percakapan dari arsip: {str(e)}")
+
+@router.post("/conversations/export")
+async def export_conversation(
+    request: ExportConversationRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Export percakapan sebagai JSON, NDJSON atau TXT (di-stream dari cursor, memori tetap)
+    
+    Format PDF dirender di background; response 202 berisi job_id untuk
+    dicek di /exports/{job_id} lalu diunduh di /exports/{job_id}/download.
+    """
+    conversation = await chat_service.get_conversation_by_id(request.conversation_id)
+    if not conversation or conversation.user_id != current_user.id or conversation.status == ConversationStatus.DELETED:
+        raise HTTPException(status_code=404, detail="Percakapan tidak ditemukan")
+    
+    if request.format == "pdf":
+        job = await pdf_exports.submit(current_user.id, conversation)
+        if job is None:
+            raise HTTPException(status_code=429, detail="Terlalu banyak export PDF yang sedang diproses, coba lagi nanti")
+        return JSONResponse(
+            status_code=202,
+            content={
+                "success": True,
+                "message": "Export PDF sedang diproses",
+                "data": {
+                    **job.to_dict(),
+                    "status_url": f"/api/v1{router.prefix}/exports/{job.id}",
+                    "download_url": f"/api/v1{router.prefix}/exports/{job.id}/download"
+                }
+            }
+        )
+    
+    if request.format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=501, detail=f"Format {request.format} belum didukung")
+    
+    filename = f"lunance-chat-{conversation.id}.{request.format}"
+    return StreamingResponse(
+        stream_export(conversation, chat_service.iter_conversation_messages(conversation.id), request.format),
+        media_type=EXPORT_MEDIA_TYPES[request.format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/sync")
+async def sync_changes(
+    token: Optional[str] = Query(None, max_length=512),
+    limit: int = Query(100, ge=1, le=500),
+    current_user: User = Depends(get_current_user)
+):
+    """Delta sync: percakapan dan pesan yang berubah sejak sync token
+    
+    Tanpa token mengembalikan daftar percakapan lengkap dan token awal. Ulangi
+    dengan sync_token selama has_more bernilai true, lalu simpan token terakhir.
+    """
+    try:
+        changes = await chat_service.sync_changes(current_user.id, token=token, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gagal sinkronisasi: {str(e)}")
+    
+    conversation_list = []
+    for conv in changes["conversations"]:
+        conversation_list.append({
+            "id": conv.id,
+            "title": conv.title or "Chat Baru",
+            "status": conv.status,
+            "last_message": conv.last_message,
+            "last_message_at": IndonesiaDatetime.from_utc(conv.last_message_at).isoformat() if conv.last_message_at else None,
+            "message_count": conv.message_count,
+            "created_at": IndonesiaDatetime.from_utc(conv.created_at).isoformat(),
+            "updated_at": IndonesiaDatetime.from_utc(conv.updated_at).isoformat(),
+            "timezone": "WIB"
+        })
+    
+    message_list = []
+    for msg in changes["messages"]:
+        message_data = {
+            "id": msg.id,
+            "conversation_id": msg.conversation_id,
+            "sender_type": msg.sender_type,
+            "content": msg.content,
+            "message_type": msg.message_type,
+            "status": msg.status,
+            "timestamp": IndonesiaDatetime.from_utc(msg.timestamp).isoformat(),
+            "timezone": "WIB"
+        }
+        if msg.metadata:
+            message_data["metadata"] = msg.metadata
+        message_list.append(message_data)
+    
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "message": "Sinkronisasi berhasil",
+            "data": {
+                "conversations": conversation_list,
+                "deleted_conversation_ids": changes["deleted_conversation_ids"],
+                "messages": message_list,
+                "message_gaps": changes["message_gaps"],
+                "full_sync": changes["full_sync"],
+                "has_more": changes["has_more"],
+                "sync_token": changes["sync_token"],
+                "timezone": "Asia/Jakarta (WIB/GMT+7)"
+            }
+        }
+    )
+
+@router.get("/exports/{job_id}")
+async def get_export_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Status job export PDF"""
+    job = await pdf_exports.get_job(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job export tidak ditemukan")
+    
+    return JSONResponse(
+        status_code=200,
+        content={"success": True, "message": "Status export berhasil diambil", "data": job.to_dict()}
+    )
+
+@router.get("/exports/{job_id}/download")
+async def download_export(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Unduh hasil export PDF yang sudah selesai"""
+    job = await pdf_exports.get_job(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job export tidak ditemukan")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error or "Export PDF gagal")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail="Export PDF belum selesai")
+    if not pdf_exports.file_available(job):
+        raise HTTPException(status_code=410, detail="File export tidak lagi tersedia, silakan export ulang")
+    
+    return FileResponse(
+        job.path,
+        media_type="application/pdf",
+        filename=f"lunance-chat-{job.conversation_id}.pdf"
+    )
+
+@router.get("/conversations/autocomplete")
+async def autocomplete_conversations(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+    current_user: User = Depends(get_current_user)
+):
+    """Saran title percakapan saat user mengetik (prefix per kata, terbaru dulu)"""
+    try:
+        suggestions = await chat_service.autocomplete_titles(current_user.id, q, limit)
+        
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": f"{len(suggestions)} saran percakapan",
+                "data": {
+                    "suggestions": [
+                        {
+                            "id": suggestion["id"],
+                            "title": suggestion["title"],
+                            "updated_at": IndonesiaDatetime.from_utc(suggestion["updated_at"]).isoformat(),
+                            "timezone": "WIB"
+                        }
+                        for suggestion in suggestions
+                    ],
+                    "query": q,
+                    "total": len(suggestions)
+                }
+            }
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gagal mengambil saran percakapan: {str(e)}")
+
 @router.get("/conversations/search")
 async def search_conversations(
-    q: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Mencari percakapan"""
+    """Mencari percakapan berdasarkan title dan isi pesan (ranked, cursor pagination)"""
     try:
-        conversations = await chat_service.search_conversations(current_user.id, q)
+        try:
+            page = await chat_service.search_conversations(current_user.id, q, limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         conversation_list = []
-        for conv in conversations:
+        for result in page["results"]:
+            conv = result["conversation"]
             created_time_wib = IndonesiaDatetime.from_utc(conv.created_at)
             last_message_time_wib = None
             
@@ -387,7 +654,16 @@ async def search_conversations(
                 "message_count": conv.message_count,
                 "created_at": created_time_wib.isoformat(),
                 "timezone": "WIB",
-                "relative_time": IndonesiaDatetime.format_relative(conv.last_message_at or conv.created_at)
+                "relative_time": IndonesiaDatetime.format_relative(conv.last_message_at or conv.created_at),
+                "search": {
+                    "score": result["score"],
+                    "hit_count": result["hit_count"],
+                    "matched_in": result["matched_in"],
+                    "message_id": result["message_id"],
+                    "matched_at": IndonesiaDatetime.from_utc(result["matched_at"]).isoformat(),
+                    "snippet": result["snippet"]["text"],
+                    "highlights": result["snippet"]["highlights"]
+                }
             })
         
         return JSONResponse(
@@ -399,11 +675,20 @@ async def search_conversations(
                     "conversations": conversation_list,
                     "query": q,
                     "total": len(conversation_list),
+                    # True jika term terlalu umum: hanya hit terbaru yang dinilai
+                    "truncated": page["truncated"],
                     "timezone": "Asia/Jakarta (WIB/GMT+7)",
                     "search_time": IndonesiaDatetime.format(IndonesiaDatetime.now())
+                },
+                "pagination": {
+                    "limit": limit,
+                    "has_next": page["has_next"],
+                    "next_cursor": page["next_cursor"]
                 }
             }
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gagal mencari percakapan: {str(e)}")
 
@@ -109,8 +109,14 @@ class BulkDeleteConversationsRequest(BaseModel):
     conversation_ids: List[str] = Field(..., min_items=1, max_items=50)
 
 class ArchiveConversationRequest(BaseModel):
-    """Request model untuk mengarsipkan percakapan"""
-    conversation_id: str
+    """Request model untuk mengarsipkan / mengeluarkan percakapan dari arsip (satu atau beberapa sekaligus)"""
+    conversation_id: Optional[str] = None
+    conversation_ids: Optional[List[str]] = Field(None, min_items=1, max_items=50)
+    
+    def get_conversation_ids(self) -> List[str]:
+        """Gabungan conversation_id dan conversation_ids, tanpa duplikat"""
+        ids = ([self.conversation_id] if self.conversation_id else []) + (self.conversation_ids or [])
+        return list(dict.fromkeys(ids))
 
 class UpdateConversationTitleRequest(BaseModel):
     """Request model untuk mengupdate judul percakapan"""
@@ -119,7 +125,7 @@ class UpdateConversationTitleRequest(BaseModel):
 class ExportConversationRequest(BaseModel):
     """Request model untuk mengekspor percakapan"""
     conversation_id: str
-    format: str = Field("json", pattern="^(json|txt|pdf)$")
+    format: str = Field("json", pattern="^(json|ndjson|txt|pdf)$")
 
 class MessageReactionRequest(BaseModel):
     """Request model untuk reaksi pesan (future feature)"""
@@ -142,11 +148,13 @@ class MessageIdValidation(BaseModel):
     message_id: str = Field(..., min_length=1, max_length=50)
 
 class PaginationRequest(BaseModel):
-    """Request model untuk pagination"""
+    """Request model untuk pagination (keyset: lanjutkan dengan cursor dari response sebelumnya)"""
     page: int = Field(1, ge=1)
     limit: int = Field(20, ge=1, le=100)
-    sort_by: Optional[str] = Field("created_at", pattern="^(created_at|updated_at|title)$")
+    sort_by: Optional[str] = Field("updated_at", pattern="^(created_at|updated_at|title)$")
     sort_order: Optional[str] = Field("desc", pattern="^(asc|desc)$")
+    cursor: Optional[str] = Field(None, description="next_cursor atau prev_cursor dari halaman sebelumnya")
+    direction: str = Field("next", pattern="^(next|prev)$")
 
 # Response wrappers
 class BaseResponse(BaseModel):
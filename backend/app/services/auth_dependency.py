@@ -6,7 +6,7 @@ import traceback
 
 from ..utils.security import verify_token
 from ..models.user import User
-from ..config.database import get_database
+from ..config.database import get_async_database
 from bson import ObjectId
 
 security = HTTPBearer(auto_error=False)
@@ -43,8 +43,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             )
         
         # Ambil user dari database
-        db = get_database()
-        user_doc = db.users.find_one({"_id": ObjectId(user_id)})
+        db = get_async_database()
+        user_doc = await db.users.find_one({"_id": ObjectId(user_id)})
         
         if user_doc is None:
             raise HTTPException(
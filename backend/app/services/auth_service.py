@@ -4,7 +4,8 @@ from typing import Optional, Dict, Any
 from fastapi import HTTPException, status
 from bson import ObjectId
 
-from ..config.database import get_database
+from ..config.database import get_async_database
+from ..config.db_monitoring import instrument_db_calls
 from ..models.user import User, UserProfile, UserPreferences, FinancialSettings
 from ..utils.security import (
     verify_password, 
@@ -24,16 +25,17 @@ from ..schemas.auth_schemas import (
     UpdateFinancialSettings
 )
 
+@instrument_db_calls
 class AuthService:
     def __init__(self):
-        self.db = get_database()
+        self.db = get_async_database()
         self.users_collection = self.db.users
     
     async def register_user(self, user_data: UserRegister) -> User:
         """Registrasi mahasiswa baru"""
         
         # Cek apakah email sudah terdaftar
-        existing_user = self.users_collection.find_one({"email": user_data.email})
+        existing_user = await self.users_collection.find_one({"email": user_data.email})
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -41,7 +43,7 @@ class AuthService:
             )
         
         # Cek apakah username sudah digunakan
-        existing_username = self.users_collection.find_one({"username": user_data.username})
+        existing_username = await self.users_collection.find_one({"username": user_data.username})
         if existing_username:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -66,10 +68,10 @@ class AuthService:
         user_dict = new_user.to_mongo()
         
         try:
-            result = self.users_collection.insert_one(user_dict)
+            result = await self.users_collection.insert_one(user_dict)
             
             # Ambil user yang baru dibuat
-            created_user = self.users_collection.find_one({"_id": result.inserted_id})
+            created_user = await self.users_collection.find_one({"_id": result.inserted_id})
             
             if not created_user:
                 raise HTTPException(
@@ -90,7 +92,7 @@ class AuthService:
         """Autentikasi mahasiswa dengan email dan password"""
         
         try:
-            user_doc = self.users_collection.find_one({"email": login_data.email})
+            user_doc = await self.users_collection.find_one({"email": login_data.email})
             if not user_doc:
                 return None
             
@@ -111,7 +113,7 @@ class AuthService:
             budget_updated = user.update_budget_if_needed()
             if budget_updated:
                 # Save updated budget to database
-                self.users_collection.update_one(
+                await self.users_collection.update_one(
                     {"_id": ObjectId(user.id)},
                     {"$set": {
                         "financial_settings": user.financial_settings.dict() if user.financial_settings else None,
@@ -140,7 +142,7 @@ class AuthService:
             refresh_token = create_refresh_token(token_data)
             
             # Update refresh token di database
-            self.users_collection.update_one(
+            await self.users_collection.update_one(
                 {"_id": ObjectId(user.id)},
                 {
                     "$set": {
@@ -197,7 +199,7 @@ class AuthService:
                 "updated_at": datetime.utcnow()
             }
             
-            result = self.users_collection.update_one(
+            result = await self.users_collection.update_one(
                 {"_id": ObjectId(user_id)},
                 {"$set": update_data}
             )
@@ -209,7 +211,7 @@ class AuthService:
                 )
             
             # Ambil user yang sudah diupdate
-            updated_user = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            updated_user = await self.users_collection.find_one({"_id": ObjectId(user_id)})
             return User.from_mongo(updated_user)
             
         except HTTPException:
@@ -257,11 +259,11 @@ class AuthService:
             }
             
             # Cek apakah profile setup sudah selesai untuk menentukan onboarding
-            user_doc = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            user_doc = await self.users_collection.find_one({"_id": ObjectId(user_id)})
             if user_doc and user_doc.get("profile_setup_completed", False):
                 update_data["onboarding_completed"] = True
             
-            result = self.users_collection.update_one(
+            result = await self.users_collection.update_one(
                 {"_id": ObjectId(user_id)},
                 {"$set": update_data}
             )
@@ -281,7 +283,7 @@ class AuthService:
             print(f"📅 Budget reset setiap tanggal 1")
             
             # Ambil user yang sudah diupdate
-            updated_user = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            updated_user = await self.users_collection.find_one({"_id": ObjectId(user_id)})
             return User.from_mongo(updated_user)
             
         except HTTPException:
@@ -296,7 +298,7 @@ class AuthService:
     async def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Mendapatkan user berdasarkan ID"""
         try:
-            user_doc = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            user_doc = await self.users_collection.find_one({"_id": ObjectId(user_id)})
             if user_doc:
                 return User.from_mongo(user_doc)
             return None
@@ -307,7 +309,7 @@ class AuthService:
     async def logout_user(self, user_id: str) -> bool:
         """Logout user dengan menghapus refresh token"""
         try:
-            result = self.users_collection.update_one(
+            result = await self.users_collection.update_one(
                 {"_id": ObjectId(user_id)},
                 {
                     "$unset": {"refresh_token": ""},
@@ -324,7 +326,7 @@ class AuthService:
         
         try:
             # Ambil user saat ini
-            user_doc = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            user_doc = await self.users_collection.find_one({"_id": ObjectId(user_id)})
             if not user_doc:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -344,7 +346,7 @@ class AuthService:
             new_hashed_password = get_password_hash(password_data.new_password)
             
             # Update password di database
-            result = self.users_collection.update_one(
+            result = await self.users_collection.update_one(
                 {"_id": ObjectId(user_id)},
                 {
                     "$set": {
@@ -398,7 +400,7 @@ class AuthService:
             if profile_updates:
                 profile_updates["updated_at"] = datetime.utcnow()
                 
-                result = self.users_collection.update_one(
+                result = await self.users_collection.update_one(
                     {"_id": ObjectId(user_id)},
                     {"$set": profile_updates}
                 )
@@ -410,7 +412,7 @@ class AuthService:
                     )
             
             # Ambil user yang sudah diupdate
-            updated_user = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            updated_user = await self.users_collection.find_one({"_id": ObjectId(user_id)})
             return User.from_mongo(updated_user)
             
         except HTTPException:
@@ -428,7 +430,7 @@ class AuthService:
         """Update financial settings dengan recalculate budget 50/30/20"""
         try:
             # Get current user
-            user_doc = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            user_doc = await self.users_collection.find_one({"_id": ObjectId(user_id)})
             if not user_doc:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -472,7 +474,7 @@ class AuthService:
             if financial_updates:
                 financial_updates["updated_at"] = datetime.utcnow()
                 
-                result = self.users_collection.update_one(
+                result = await self.users_collection.update_one(
                     {"_id": ObjectId(user_id)},
                     {"$set": financial_updates}
                 )
@@ -484,7 +486,7 @@ class AuthService:
                     )
             
             # Ambil user yang sudah diupdate
-            updated_user = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            updated_user = await self.users_collection.find_one({"_id": ObjectId(user_id)})
             return User.from_mongo(updated_user)
             
         except HTTPException:
@@ -555,7 +557,7 @@ class AuthService:
             user.financial_settings.last_budget_reset = datetime.utcnow()
             
             # Update di database
-            result = self.users_collection.update_one(
+            result = await self.users_collection.update_one(
                 {"_id": ObjectId(user_id)},
                 {"$set": {
                     "financial_settings.last_budget_reset": datetime.utcnow(),
@@ -639,7 +641,7 @@ class AuthService:
         user_id = payload.get("sub")
         
         try:
-            user_doc = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            user_doc = await self.users_collection.find_one({"_id": ObjectId(user_id)})
             
             if not user_doc:
                 raise HTTPException(
@@ -0,0 +1,392 @@
+# app/services/change_stream_consumer.py - Pengiriman real-time dari change stream MongoDB
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+
+from ..config.database import get_async_database
+from ..config.db_monitoring import instrument_db_calls
+from ..models.chat import WSMessageType
+from ..utils.timezone_utils import IndonesiaDatetime, now_for_db
+
+logger = logging.getLogger(__name__)
+
+RESUME_TOKENS_COLLECTION = "change_stream_tokens"
+WATCHED_COLLECTIONS = ["messages", "conversations"]
+# Replica set / sharded cluster wajib untuk change stream
+CHANGE_STREAM_UNSUPPORTED_CODES = {40573, 20}
+# ChangeStreamHistoryLost, InvalidResumeToken (oplog sudah lewat / token rusak)
+RESUME_FAILED_CODES = {286, 260}
+# Batas slot checkpoint per host (jumlah worker maksimum yang bisa resume)
+MAX_WORKER_SLOTS = 256
+
+Deliver = Callable[[Dict[str, Any], str], Awaitable[Any]]
+
+def message_event(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Frame chat_message untuk dokumen pesan (bentuk sama dengan balasan WebSocket)
+
+    Waktu dibiarkan sebagai datetime WIB; Frame meng-encode-nya sekali saat dikirim.
+    """
+    message = {
+        "id": str(doc["_id"]),
+        "conversation_id": doc.get("conversation_id"),
+        "sender_type": doc.get("sender_type"),
+        "content": doc.get("content", ""),
+        "timestamp": IndonesiaDatetime.from_utc(doc["timestamp"]) if doc.get("timestamp") else None,
+        "status": "delivered",
+        "timezone": "WIB",
+        "message_type": doc.get("message_type"),
+    }
+    return {
+        "type": WSMessageType.CHAT_MESSAGE,
+        "data": {"message": message},
+        "timestamp": IndonesiaDatetime.now()
+    }
+
+def conversation_event(doc: Dict[str, Any]) -> Dict[str, Any]:
+    conversation = {
+        "id": str(doc["_id"]),
+        "title": doc.get("title") or "Chat Baru",
+        "status": doc.get("status") or "active",
+        "last_message": doc.get("last_message"),
+        "last_message_at": IndonesiaDatetime.from_utc(doc["last_message_at"]) if doc.get("last_message_at") else None,
+        "message_count": doc.get("message_count", 0),
+        "updated_at": IndonesiaDatetime.from_utc(doc["updated_at"]) if doc.get("updated_at") else None,
+        "timezone": "WIB"
+    }
+    return {
+        "type": WSMessageType.CONVERSATION_UPDATED,
+        "data": {"conversation": conversation},
+        "timestamp": IndonesiaDatetime.now()
+    }
+
+@instrument_db_calls
+class ChangeStreamConsumer:
+    """Satu change stream (level database) atas `messages` dan `conversations`
+
+    Insert/update dikirim ke pemilik yang terhubung di worker ini lewat
+    `deliver(message, user_id)`, sehingga pesan dari send_message_http, worker
+    lain atau batch job sampai ke client tanpa polling. Pemilik pesan dicari
+    dari conversation_id (cache LRU; pemilik percakapan tidak pernah berubah).
+
+    Setiap worker menonton stream-nya sendiri, jadi resume token disimpan
+    per worker di collection `change_stream_tokens`. Worker di satu host
+    berbagi environment, jadi saat start setiap worker mengklaim slot
+    `<CHAT_CHANGE_STREAM_ID>:<host>:slot<n>` terkecil yang lease-nya kosong
+    atau habis. Lease diperpanjang di setiap checkpoint dan dilepas saat
+    stop(), sehingga worker yang restart mengambil slot (dan token) worker
+    sebelumnya dan event selama restart tetap terkirim. Worker yang mati
+    tanpa stop() melepas slotnya setelah lease habis. Deployment satu proses
+    per container bisa memakai CHAT_WORKER_ID sebagai id tetap tanpa lease.
+
+    Token yang lebih tua dari CHAT_CHANGE_STREAM_MAX_RESUME_SECONDS tidak
+    dipakai (memutar ulang event lama hanya menggandakan pesan di client);
+    token yang tidak lagi di-checkpoint dihapus TTL index. Jika oplog sudah
+    melewati token, stream dimulai ulang dari sekarang.
+
+    `active` hanya berarti stream terbuka. Stream yang macet (mis. primary
+    hilang dan getMore tertahan) belum tentu sudah error, jadi handler
+    WebSocket memakai `is_live()`: stream juga harus berputar dalam
+    CHAT_CHANGE_STREAM_MAX_LAG_SECONDS terakhir. Jika tidak, handler mengirim
+    balasan sendiri; event yang menyusul setelah stream pulih bisa terkirim
+    dua kali dan client menyaring berdasarkan id pesan. Tanpa replica set
+    consumer berhenti dan `active` tetap False.
+    """
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        is_connected: Callable[[str], bool],
+        db=None,
+        stream_id: Optional[str] = None,
+        checkpoint_seconds: Optional[float] = None,
+        owner_cache_size: int = 10000,
+        max_lag_seconds: Optional[float] = None,
+        on_message: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.deliver = deliver
+        self.is_connected = is_connected
+        # Dipanggil untuk setiap insert pesan (mis. memperbarui buffer pesan worker ini)
+        self.on_message = on_message
+        self.db = db
+        # None: slot diklaim saat stream mulai (_claim_slot)
+        self.stream_id = stream_id or self.configured_stream_id()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._leased = False
+        self.checkpoint_seconds = checkpoint_seconds or float(os.getenv("CHAT_CHANGE_STREAM_CHECKPOINT_SECONDS", "5"))
+        self.lease_seconds = float(os.getenv("CHAT_CHANGE_STREAM_LEASE_SECONDS", str(max(30.0, self.checkpoint_seconds * 6))))
+        self.max_resume_seconds = float(os.getenv("CHAT_CHANGE_STREAM_MAX_RESUME_SECONDS", "600"))
+        self.max_lag_seconds = max_lag_seconds or float(os.getenv("CHAT_CHANGE_STREAM_MAX_LAG_SECONDS", "5"))
+        self.owner_cache_size = owner_cache_size
+
+        self._owners: "OrderedDict[str, str]" = OrderedDict()
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self._saved_token: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.active = False
+        # loop.time() terakhir stream berputar (try_next kembali, maksimal tiap max_await_time_ms)
+        self.last_alive: Optional[float] = None
+        self.metrics = {"events": 0, "delivered": 0, "skipped": 0, "restarts": 0, "checkpoints": 0}
+
+    @staticmethod
+    def enabled_by_env() -> bool:
+        return os.getenv("CHAT_CHANGE_STREAMS", "true").lower() == "true"
+
+    @staticmethod
+    def _id_prefix() -> str:
+        return f"{os.getenv('CHAT_CHANGE_STREAM_ID', 'chat_realtime')}:{socket.gethostname()}"
+
+    @classmethod
+    def configured_stream_id(cls) -> Optional[str]:
+        """Id tetap dari CHAT_WORKER_ID (hanya jika setiap proses punya environment sendiri)"""
+        worker = os.getenv("CHAT_WORKER_ID")
+        return f"{cls._id_prefix()}:{worker}" if worker else None
+
+    def is_live(self) -> bool:
+        """Stream terbuka dan masih berputar dalam max_lag_seconds terakhir"""
+        if not self.active or self.last_alive is None:
+            return False
+        return asyncio.get_running_loop().time() - self.last_alive <= self.max_lag_seconds
+
+    def start(self):
+        if self._task is None or self._task.done():
+            if self.db is None:
+                self.db = get_async_database()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.active = False
+        try:
+            await self._checkpoint()
+            await self._release_slot()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save change stream resume token: {e}")
+
+    # ------------------------------------------------------------------
+    # Resume token
+    # ------------------------------------------------------------------
+
+    async def _claim_slot(self) -> str:
+        """Lease slot checkpoint terkecil yang kosong/habis di host ini"""
+        collection = self.db[RESUME_TOKENS_COLLECTION]
+        for slot in range(MAX_WORKER_SLOTS):
+            slot_id = f"{self._id_prefix()}:slot{slot}"
+            now = now_for_db()
+            try:
+                doc = await collection.find_one_and_update(
+                    {"_id": slot_id, "$or": [
+                        {"lease_owner": self.owner},
+                        {"lease_expires_at": {"$lt": now}},
+                        {"lease_expires_at": {"$exists": False}}
+                    ]},
+                    {"$set": {"lease_owner": self.owner, "lease_expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Slot dipegang worker lain yang lease-nya masih berlaku
+                continue
+            if doc is not None and doc.get("lease_owner") == self.owner:
+                self._leased = True
+                logger.info(f"📡 Change stream checkpoint slot {slot_id}")
+                return slot_id
+        raise RuntimeError(f"Semua {MAX_WORKER_SLOTS} slot change stream di host ini sedang dipakai")
+
+    async def _claim_stream_id(self) -> str:
+        """Slot checkpoint, atau id per proses (tidak bisa resume setelah restart) jika tidak ada slot"""
+        try:
+            return await self._claim_slot()
+        except RuntimeError as e:
+            logger.warning(f"⚠️ {e}; change stream checkpoints are per process")
+            return f"{self._id_prefix()}:{self.owner}"
+
+    async def _release_slot(self):
+        if not self._leased or self.db is None:
+            return
+        await self.db[RESUME_TOKENS_COLLECTION].update_one(
+            {"_id": self.stream_id, "lease_owner": self.owner},
+            {"$unset": {"lease_owner": "", "lease_expires_at": ""}}
+        )
+        self._leased = False
+
+    async def _load_token(self) -> Optional[Dict[str, Any]]:
+        doc = await self.db[RESUME_TOKENS_COLLECTION].find_one({"_id": self.stream_id})
+        if not doc or not doc.get("token"):
+            return None
+        updated_at = doc.get("updated_at")
+        if updated_at is not None and (now_for_db() - updated_at).total_seconds() > self.max_resume_seconds:
+            logger.info(f"📡 Change stream token {self.stream_id} is older than {self.max_resume_seconds:g}s; starting from now")
+            return None
+        return doc["token"]
+
+    async def _checkpoint(self):
+        """Simpan resume token (jika berubah) dan perpanjang lease slot"""
+        if self.db is None or self.stream_id is None:
+            return
+        token = self._resume_token
+        token_changed = token is not None and token != self._saved_token
+        if not token_changed and not self._leased:
+            return
+
+        now = now_for_db()
+        update: Dict[str, Any] = {}
+        if token_changed:
+            update.update({"token": token, "updated_at": now})
+        query: Dict[str, Any] = {"_id": self.stream_id}
+        if self._leased:
+            update["lease_expires_at"] = now + timedelta(seconds=self.lease_seconds)
+            query["lease_owner"] = self.owner
+        result = await self.db[RESUME_TOKENS_COLLECTION].update_one(query, {"$set": update}, upsert=not self._leased)
+
+        if self._leased and result.matched_count == 0:
+            # Lease habis (stream lama terputus) dan slot diambil worker lain: klaim slot baru
+            logger.warning(f"⚠️ Change stream slot {self.stream_id} was taken over; claiming a new slot")
+            self._leased = False
+            self.stream_id = await self._claim_stream_id()
+            self._saved_token = None
+            await self._checkpoint()
+            return
+        if token_changed:
+            self._saved_token = token
+            self.metrics["checkpoints"] += 1
+
+    # ------------------------------------------------------------------
+    # Stream
+    # ------------------------------------------------------------------
+
+    async def _run(self):
+        try:
+            if self.stream_id is None:
+                self.stream_id = await self._claim_stream_id()
+            self._resume_token = self._saved_token = await self._load_token()
+        except PyMongoError as e:
+            logger.warning(f"⚠️ Could not load change stream resume token, starting from now: {e}")
+            if self.stream_id is None:
+                self.stream_id = f"{self._id_prefix()}:{self.owner}"
+        backoff = 1.0
+        while True:
+            try:
+                await self._consume()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if self.active:
+                    backoff = 1.0
+                self.active = False
+                if e.code in CHANGE_STREAM_UNSUPPORTED_CODES:
+                    logger.warning("⚠️ Change streams need a replica set; real-time delivery falls back to the WebSocket handler")
+                    return
+                if e.code in RESUME_FAILED_CODES and self._resume_token is not None:
+                    logger.warning(f"⚠️ Change stream resume token rejected ({e.code}); restarting from now")
+                    self._resume_token = None
+                    continue
+                logger.error(f"❌ Change stream failed: {e}")
+            except PyMongoError as e:
+                if self.active:
+                    backoff = 1.0
+                self.active = False
+                logger.error(f"❌ Change stream interrupted: {e}")
+            self.metrics["restarts"] += 1
+            await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+            backoff = min(backoff * 2, 60.0)
+
+    async def _consume(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": WATCHED_COLLECTIONS},
+            "operationType": {"$in": ["insert", "update", "replace"]}
+        }}]
+        loop = asyncio.get_running_loop()
+        async with self.db.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self._resume_token,
+            max_await_time_ms=1000
+        ) as stream:
+            if not self.active:
+                logger.info(f"📡 Change stream consumer started ({'resumed' if self._resume_token else 'from now'})")
+            self.active = True
+            self.last_alive = loop.time()
+            next_checkpoint = loop.time() + self.checkpoint_seconds
+            while stream.alive:
+                change = await stream.try_next()
+                self.last_alive = loop.time()
+                if change is not None:
+                    await self._handle(change)
+                # Token ikut maju saat idle (post-batch resume token)
+                self._resume_token = stream.resume_token
+                if loop.time() >= next_checkpoint:
+                    await self._checkpoint()
+                    next_checkpoint = loop.time() + self.checkpoint_seconds
+
+    async def _owner_of(self, conversation_id: str) -> Optional[str]:
+        owner = self._owners.get(conversation_id)
+        if owner is not None:
+            self._owners.move_to_end(conversation_id)
+            return owner
+        if not ObjectId.is_valid(conversation_id):
+            return None
+        doc = await self.db.conversations.find_one({"_id": ObjectId(conversation_id)}, {"user_id": 1})
+        if doc is None:
+            return None
+        self._remember_owner(conversation_id, doc["user_id"])
+        return doc["user_id"]
+
+    def _remember_owner(self, conversation_id: str, owner: str):
+        self._owners[conversation_id] = owner
+        self._owners.move_to_end(conversation_id)
+        while len(self._owners) > self.owner_cache_size:
+            self._owners.popitem(last=False)
+
+    async def _handle(self, change: Dict[str, Any]):
+        self.metrics["events"] += 1
+        doc = change.get("fullDocument")
+        if doc is None:
+            # Dokumen sudah hilang saat updateLookup
+            self.metrics["skipped"] += 1
+            return
+
+        if change["ns"]["coll"] == "conversations":
+            owner = doc.get("user_id")
+            if owner:
+                self._remember_owner(str(doc["_id"]), owner)
+            event = conversation_event(doc)
+        else:
+            if self.on_message is not None and change.get("operationType") == "insert":
+                self.on_message(doc)
+            owner = await self._owner_of(doc.get("conversation_id") or "")
+            event = message_event(doc)
+
+        if not owner or not self.is_connected(owner):
+            self.metrics["skipped"] += 1
+            return
+        try:
+            await self.deliver(event, owner)
+            self.metrics["delivered"] += 1
+        except Exception as e:
+            logger.error(f"❌ Error delivering change event to {owner}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lag = None
+        if self.last_alive is not None:
+            lag = round(asyncio.get_running_loop().time() - self.last_alive, 3)
+        return {
+            **self.metrics,
+            "active": self.active,
+            "live": self.is_live(),
+            "lag_seconds": lag,
+            "stream_id": self.stream_id,
+            "leased": self._leased
+        }
@@ -0,0 +1,219 @@
+# app/services/chat_search_service.py - Full-text search percakapan dan isi pesan
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+import os
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from ..config.database import get_async_database
+from ..config.db_monitoring import instrument_db_calls
+from ..models.chat import ConversationStatus
+from ..utils.indonesian_text import analyze, query_groups, build_snippet
+from ..utils.pagination import encode_cursor, decode_cursor, keyset_filter
+from ..utils.timezone_utils import now_for_db
+
+logger = logging.getLogger(__name__)
+
+# Hit terbaru yang dinilai per query; membatasi biaya query untuk term yang sangat umum
+SEARCH_MAX_HITS = int(os.getenv("CHAT_SEARCH_MAX_HITS", "2000"))
+# Teks yang disimpan per posting untuk snippet
+SNIPPET_SOURCE_LENGTH = 1000
+# Bobot match di title dibanding match di isi pesan
+TITLE_WEIGHT = 3
+RESULT_SORT = [("score", -1), ("last_hit", -1), ("_id", -1)]
+
+@instrument_db_calls
+class ChatSearchService:
+    """Inverted index di collection `search_index`: satu posting per title percakapan / pesan user
+
+    Posting menyimpan term hasil analyze() (kata + kandidat akar Bahasa Indonesia)
+    dalam array yang di-index multikey (user_id, terms, timestamp). Text index
+    MongoDB tidak punya analyzer Bahasa Indonesia dan tidak bisa di-page dengan
+    keyset, jadi term dihitung di aplikasi.
+    """
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_async_database()
+        self.collection = self.db.search_index
+        self.indexed_users = self.db.search_index_users
+
+    @staticmethod
+    def _posting(user_id: str, conversation_id: str, kind: str, ref_id: ObjectId, text: str, timestamp: datetime) -> Dict[str, Any]:
+        return {
+            "_id": ref_id,
+            "user_id": user_id,
+            "conversation_id": conversation_id,
+            "kind": kind,
+            "text": (text or "")[:SNIPPET_SOURCE_LENGTH],
+            "terms": analyze(text or ""),
+            "timestamp": timestamp
+        }
+
+    async def index_message(self, user_id: str, conversation_id: str, message_id: str, content: str, timestamp: datetime):
+        """Index satu pesan user (pesan sistem tidak di-index)"""
+        try:
+            posting = self._posting(user_id, conversation_id, "message", ObjectId(message_id), content, timestamp)
+            await self.collection.replace_one({"_id": posting["_id"]}, posting, upsert=True)
+        except Exception as e:
+            logger.error(f"❌ Error indexing message for search: {e}")
+
+    async def index_messages(self, entries: List[Tuple[str, str, str, str, datetime]]):
+        """index_message untuk banyak pesan dalam satu bulk_write
+
+        entries: (user_id, conversation_id, message_id, content, timestamp)
+        """
+        if not entries:
+            return
+        try:
+            postings = [
+                self._posting(user_id, conversation_id, "message", ObjectId(message_id), content, timestamp)
+                for user_id, conversation_id, message_id, content, timestamp in entries
+            ]
+            await self.collection.bulk_write(
+                [ReplaceOne({"_id": posting["_id"]}, posting, upsert=True) for posting in postings], ordered=False
+            )
+        except Exception as e:
+            logger.error(f"❌ Error indexing messages for search: {e}")
+
+    async def index_title(self, user_id: str, conversation_id: str, title: str, timestamp: datetime):
+        """Index (atau ganti) title percakapan; _id posting = _id percakapan"""
+        try:
+            posting = self._posting(user_id, conversation_id, "title", ObjectId(conversation_id), title, timestamp)
+            await self.collection.replace_one({"_id": posting["_id"]}, posting, upsert=True)
+        except Exception as e:
+            logger.error(f"❌ Error indexing title for search: {e}")
+
+    async def search(self, user_id: str, query: str, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Percakapan yang cocok, diurutkan berdasarkan skor lalu hit terbaru
+
+        Skor per hit = jumlah kata query yang cocok (x TITLE_WEIGHT untuk title);
+        skor percakapan = jumlah skor hit-nya. Hit dengan kata cocok terbanyak
+        (lalu terbaru) menjadi snippet. ValueError jika cursor tidak valid.
+
+        Hanya SEARCH_MAX_HITS hit terbaru yang dinilai. Jika term lebih umum dari
+        itu, `truncated` bernilai True: hit yang lebih lama tidak ikut dinilai
+        sehingga skor dan halaman berikutnya hanya mencakup hit terbaru.
+        """
+        groups = query_groups(query)
+        position = decode_cursor(cursor) if cursor else None
+        empty = {"results": [], "has_next": False, "next_cursor": None, "truncated": False}
+        if not groups:
+            return empty
+
+        if not await self.indexed_users.find_one({"_id": user_id}):
+            await self.rebuild(user_id)
+
+        all_forms = sorted(set().union(*groups))
+        matched_words = {"$add": [
+            {"$cond": [{"$gt": [{"$size": {"$setIntersection": ["$terms", group]}}, 0]}, 1, 0]}
+            for group in groups
+        ]}
+
+        match = {"user_id": user_id, "terms": {"$in": all_forms}}
+        # Hitungan dibatasi SEARCH_MAX_HITS + 1 lewat index yang sama: murah walau term sangat umum
+        truncated = await self.collection.count_documents(match, limit=SEARCH_MAX_HITS + 1) > SEARCH_MAX_HITS
+
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": match},
+            {"$sort": {"timestamp": -1}},
+            {"$limit": SEARCH_MAX_HITS},
+            {"$project": {
+                "conversation_id": 1, "kind": 1, "text": 1, "timestamp": 1,
+                "matched": matched_words,
+                "weight": {"$cond": [{"$eq": ["$kind", "title"]}, TITLE_WEIGHT, 1]}
+            }},
+            {"$sort": {"conversation_id": 1, "matched": -1, "timestamp": -1}},
+            {"$group": {
+                "_id": "$conversation_id",
+                "score": {"$sum": {"$multiply": ["$matched", "$weight"]}},
+                "last_hit": {"$max": "$timestamp"},
+                "hit_count": {"$sum": 1},
+                "best": {"$first": {"kind": "$kind", "text": "$text", "timestamp": "$timestamp", "id": "$_id"}}
+            }},
+            {"$lookup": {
+                "from": "conversations",
+                "let": {"conversation_id": {"$toObjectId": "$_id"}},
+                "pipeline": [{"$match": {"$expr": {"$eq": ["$_id", "$$conversation_id"]}}}],
+                "as": "conversation"
+            }},
+            {"$unwind": "$conversation"},
+            {"$match": {"conversation.status": {"$in": [ConversationStatus.ACTIVE.value, None]}}},
+        ]
+        if position:
+            pipeline.append({"$match": keyset_filter(RESULT_SORT, position)})
+        pipeline += [
+            {"$sort": dict(RESULT_SORT)},
+            {"$limit": limit + 1}
+        ]
+
+        docs = [doc async for doc in self.collection.aggregate(pipeline)]
+        has_next = len(docs) > limit
+        docs = docs[:limit]
+
+        results = []
+        for doc in docs:
+            best = doc["best"]
+            results.append({
+                "conversation": doc["conversation"],
+                "score": doc["score"],
+                "hit_count": doc["hit_count"],
+                "matched_in": best["kind"],
+                "message_id": str(best["id"]) if best["kind"] == "message" else None,
+                "matched_at": best["timestamp"],
+                "snippet": build_snippet(best["text"], groups)
+            })
+
+        next_cursor = None
+        if has_next and docs:
+            last = docs[-1]
+            next_cursor = encode_cursor({field: last[field] for field, _ in RESULT_SORT})
+
+        return {"results": results, "has_next": has_next, "next_cursor": next_cursor, "truncated": truncated}
+
+    async def rebuild(self, user_id: str, batch_size: int = 500) -> int:
+        """Index ulang title dan pesan user milik user (backfill data lama)"""
+        postings = 0
+        batch: List[ReplaceOne] = []
+
+        async def flush():
+            nonlocal batch, postings
+            if batch:
+                await self.collection.bulk_write(batch, ordered=False)
+                postings += len(batch)
+                batch = []
+
+        conversations = self.db.conversations.find(
+            {"user_id": user_id, "status": {"$ne": ConversationStatus.DELETED.value}},
+            {"_id": 1, "title": 1, "created_at": 1, "updated_at": 1}
+        )
+        conversation_ids = []
+        async for conv in conversations:
+            conversation_id = str(conv["_id"])
+            conversation_ids.append(conversation_id)
+            if conv.get("title"):
+                posting = self._posting(user_id, conversation_id, "title", conv["_id"], conv["title"],
+                                        conv.get("created_at") or conv.get("updated_at") or now_for_db())
+                batch.append(ReplaceOne({"_id": posting["_id"]}, posting, upsert=True))
+                if len(batch) >= batch_size:
+                    await flush()
+
+        for start in range(0, len(conversation_ids), batch_size):
+            messages = self.db.messages.find(
+                {"conversation_id": {"$in": conversation_ids[start:start + batch_size]}, "sender_type": "user"},
+                {"_id": 1, "conversation_id": 1, "content": 1, "timestamp": 1}
+            )
+            async for message in messages:
+                posting = self._posting(user_id, message["conversation_id"], "message", message["_id"],
+                                        message.get("content"), message.get("timestamp") or now_for_db())
+                batch.append(ReplaceOne({"_id": posting["_id"]}, posting, upsert=True))
+                if len(batch) >= batch_size:
+                    await flush()
+        await flush()
+
+        await self.indexed_users.update_one(
+            {"_id": user_id}, {"$set": {"indexed_at": now_for_db(), "postings": postings}}, upsert=True
+        )
+        logger.info(f"🔎 Search index rebuilt for user {user_id} ({postings} postings)")
+        return postings
@@ -1,20 +1,48 @@
 # app/services/chat_service.py - CLEANED VERSION - No AI responses
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Dict, Any, Optional
 from bson import ObjectId
+from pymongo import UpdateOne
+import asyncio
 import logging
+import os
 
-from ..config.database import get_database
+from ..config.database import get_async_database
+from ..config.db_monitoring import instrument_db_calls
+from .chat_stats_service import ChatStatsService
+from .chat_search_service import ChatSearchService
+from .chat_sync_service import ChatSyncService
+from .title_autocomplete import TitleAutocompleteService
+from .message_write_queue import MessageWriteQueue
+from .conversation_cache import ConversationListCache
+from .message_buffer import RecentMessageBuffer
 from ..models.chat import Conversation, Message, MessageType, ConversationStatus
-from ..utils.timezone_utils import IndonesiaDatetime, now_for_db
+from ..utils.timezone_utils import IndonesiaDatetime, now_for_db, now_for_db_ms
+from ..utils.pagination import encode_cursor, decode_cursor, keyset_filter
 
 logger = logging.getLogger(__name__)
 
+# Field yang bisa dipakai untuk mengurutkan daftar percakapan (lihat PaginationRequest)
+CONVERSATION_SORT_FIELDS = ("created_at", "updated_at", "title")
+
+@instrument_db_calls
 class ChatService:
     """Simple Chat Service without AI responses"""
     
-    def __init__(self):
-        self.db = get_database()
+    def __init__(self, write_behind: Optional[bool] = None):
+        self.db = get_async_database()
+        self.stats = ChatStatsService(self.db)
+        self.search = ChatSearchService(self.db)
+        self.sync = ChatSyncService(self.db)
+        self.titles = TitleAutocompleteService(self.db)
+        self.conversation_cache = ConversationListCache()
+        self.message_buffer = RecentMessageBuffer()
+        if write_behind is None:
+            write_behind = os.getenv("CHAT_WRITE_BEHIND", "false").lower() == "true"
+        # write_behind: insert pesan juga ikut group commit. Tanpa itu pesan di-insert
+        # langsung dan hanya update turunannya (conversation, stats, search) yang di-batch
+        self.write_behind = write_behind
+        self.write_queue = MessageWriteQueue(self)
         logger.info("✅ ChatService initialized (No AI responses)")
     
     async def create_conversation(self, user_id: str) -> Conversation:
@@ -32,8 +60,10 @@ class ChatService:
             "updated_at": now
         }
         
-        result = self.db.conversations.insert_one(conversation_data)
+        result = await self.db.conversations.insert_one(conversation_data)
         conversation_id = str(result.inserted_id)
+        await self.stats.adjust_conversations(user_id, 1, now)
+        self.conversation_cache.invalidate(user_id)
         
         conversation = Conversation(
             id=conversation_id,
@@ -52,19 +82,68 @@ class ChatService:
     
     async def get_user_conversations(self, user_id: str, limit: int = 20) -> List[Conversation]:
         """Mengambil daftar percakapan user"""
+        page = await self.get_user_conversations_page(user_id, limit=limit, sort_by="updated_at")
+        return page["conversations"]
+    
+    async def get_user_conversations_page(
+        self,
+        user_id: str,
+        limit: int = 20,
+        sort_by: str = "updated_at",
+        sort_order: str = "desc",
+        cursor: Optional[str] = None,
+        direction: str = "next"
+    ) -> Dict[str, Any]:
+        """Mengambil satu halaman percakapan user dengan keyset pagination
+        
+        Urutan (sort_by, _id) dilayani index (user_id, status, sort_by, _id), dan
+        has_next/has_prev diturunkan dari satu dokumen ekstra, tanpa count_documents.
+        """
+        if sort_by not in CONVERSATION_SORT_FIELDS:
+            raise ValueError(f"sort_by tidak didukung: {sort_by}")
+        
+        position = decode_cursor(cursor) if cursor else None
+        if position is not None and set(position) != {sort_by, "_id"}:
+            raise ValueError("Cursor tidak cocok dengan sort_by")
+        if position is None and direction == "prev":
+            raise ValueError("direction=prev membutuhkan cursor")
+        
+        # Halaman pertama (tanpa cursor, arah next) dilayani dari cache per user
+        cache_key = (limit, sort_by, sort_order, direction)
+        cache_token = None
+        if position is None and direction == "next":
+            cached = self.conversation_cache.get(user_id, cache_key)
+            if cached is not None:
+                return cached
+            cache_token = self.conversation_cache.begin_fill(user_id)
+        
+        order = -1 if sort_order == "desc" else 1
+        backward = direction == "prev"
+        # Halaman sebelumnya diambil dengan urutan terbalik lalu dibalik lagi
+        query_order = -order if backward else order
+        sort_fields = [(sort_by, query_order), ("_id", query_order)]
+        
         try:
+            # status: null juga cocok dengan field yang tidak ada (data lama tanpa status)
             query = {
                 "user_id": user_id,
-                "$or": [
-                    {"status": ConversationStatus.ACTIVE.value},
-                    {"status": {"$exists": False}}
-                ]
+                "status": {"$in": [ConversationStatus.ACTIVE.value, None]}
             }
+            if position is not None:
+                query.update(keyset_filter(sort_fields, position, nullable=["title"]))
+            
+            docs = [doc async for doc in self.db.conversations.find(query).sort(sort_fields).limit(limit + 1)]
+            has_more = len(docs) > limit
+            docs = docs[:limit]
+            if backward:
+                docs.reverse()
             
-            cursor = self.db.conversations.find(query).sort("updated_at", -1).limit(limit)
+            # Cursor dari nilai asli di database, sebelum default untuk data lama diisi
+            next_cursor = self._conversation_cursor(docs[-1], sort_by) if docs else None
+            prev_cursor = self._conversation_cursor(docs[0], sort_by) if docs else None
             
             conversations = []
-            for doc in cursor:
+            for doc in docs:
                 if "created_at" not in doc:
                     doc["created_at"] = doc.get("updated_at", now_for_db())
                 if "status" not in doc:
@@ -73,41 +152,154 @@ class ChatService:
                 conversation = Conversation.from_mongo(doc)
                 conversations.append(conversation)
             
-            return conversations
+            page = {
+                "conversations": conversations,
+                # Ada cursor berarti setidaknya dokumen di posisi cursor ada di sisi lain
+                "has_next": has_more if not backward else position is not None,
+                "has_prev": has_more if backward else position is not None,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
+            }
+            if cache_token is not None:
+                self.conversation_cache.put(user_id, cache_key, page, cache_token)
+            return page
             
         except Exception as e:
+            if cache_token is not None:
+                self.conversation_cache.cancel_fill(user_id, cache_token)
             logger.error(f"❌ Error getting conversations: {e}")
-            return []
+            return {"conversations": [], "has_next": False, "has_prev": False, "next_cursor": None, "prev_cursor": None}
+    
+    @staticmethod
+    def _conversation_cursor(doc: Dict[str, Any], sort_by: str) -> str:
+        """Cursor keyset (sort_by, _id) untuk sebuah dokumen percakapan"""
+        return encode_cursor({sort_by: doc.get(sort_by), "_id": ObjectId(doc["_id"])})
     
-    async def get_conversation_messages(self, conversation_id: str, limit: int = 50) -> List[Message]:
-        """Mengambil pesan dalam percakapan"""
+    async def get_conversation_messages(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        owner_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Mengambil pesan dalam percakapan dengan keyset pagination
+        
+        Tanpa cursor: `limit` pesan terbaru. `before`: pesan yang lebih lama dari
+        cursor, `after`: pesan yang lebih baru dari cursor. Pesan di setiap halaman
+        dikembalikan berurutan dari yang terlama ke terbaru. Jendela yang muat di
+        RecentMessageBuffer dilayani dari memori; `owner_id` yang terhubung lewat
+        WebSocket membuat halaman terbaru mengisi buffer.
+        """
+        if before and after:
+            raise ValueError("Gunakan salah satu dari before atau after")
+        
+        # Decode di luar try agar cursor yang rusak menjadi error 400, bukan hasil kosong
+        cursor_token = before or after
+        position = decode_cursor(cursor_token) if cursor_token else None
+        if position is not None and set(position) != {"timestamp", "_id"}:
+            raise ValueError("Cursor tidak valid untuk pesan")
+        
+        position_key = (position["timestamp"], position["_id"]) if position is not None else None
+        buffered = self.message_buffer.read(
+            conversation_id,
+            limit,
+            before=position_key if before else None,
+            after=position_key if after else None
+        )
+        if buffered is not None:
+            messages = buffered["messages"]
+            return {
+                "messages": messages,
+                "has_more": buffered["has_more"],
+                "before_cursor": self._message_cursor({"timestamp": messages[0].timestamp, "_id": messages[0].id}) if messages else before,
+                "after_cursor": self._message_cursor({"timestamp": messages[-1].timestamp, "_id": messages[-1].id}) if messages else after
+            }
+        
+        # Default dan `before` berjalan newest-first; `after` berjalan maju dari cursor
+        forward = after is not None
+        direction = 1 if forward else -1
+        sort_fields = [("timestamp", direction), ("_id", direction)]
+        
+        # Halaman terbaru untuk pemilik yang terhubung: ambil satu buffer penuh sekaligus
+        fill_buffer = (
+            position is None
+            and owner_id is not None
+            and self.message_buffer.enabled
+            and self.message_buffer.is_connected(owner_id)
+            and limit <= self.message_buffer.capacity
+        )
+        fetch_limit = self.message_buffer.capacity if fill_buffer else limit
+        
         try:
-            cursor = self.db.messages.find(
-                {"conversation_id": conversation_id}
-            ).sort("timestamp", 1).limit(limit)
+            query = {"conversation_id": conversation_id}
+            if position is not None:
+                query.update(keyset_filter(sort_fields, position))
+            
+            cursor = self.db.messages.find(query).sort(sort_fields).limit(fetch_limit + 1)
+            
+            docs = [doc async for doc in cursor]
+            has_more_fetched = len(docs) > fetch_limit
+            docs = docs[:fetch_limit]
+            if not forward:
+                docs.reverse()
             
             messages = []
-            for doc in cursor:
+            for doc in docs:
                 if "timestamp" not in doc:
                     doc["timestamp"] = now_for_db()
                 
                 message = Message.from_mongo(doc)
                 messages.append(message)
             
-            return messages
+            has_more = has_more_fetched
+            if fill_buffer:
+                self.message_buffer.fill(conversation_id, owner_id, messages, complete=not has_more_fetched)
+                has_more = has_more_fetched or len(docs) > limit
+                docs, messages = docs[-limit:], messages[-limit:]
+            
+            return {
+                "messages": messages,
+                "has_more": has_more,
+                "before_cursor": self._message_cursor(docs[0]) if docs else before,
+                "after_cursor": self._message_cursor(docs[-1]) if docs else after
+            }
             
         except Exception as e:
             logger.error(f"❌ Error getting messages: {e}")
-            return []
+            return {"messages": [], "has_more": False, "before_cursor": before, "after_cursor": after}
+    
+    async def iter_conversation_messages(self, conversation_id: str, batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """Semua pesan percakapan (terlama -> terbaru) langsung dari cursor Mongo per batch
+        
+        Dipakai export: hanya satu batch yang ditampung di memori pada satu waktu.
+        """
+        cursor = self.db.messages.find(
+            {"conversation_id": conversation_id},
+            {"conversation_id": 0}
+        ).sort([("timestamp", 1), ("_id", 1)]).batch_size(batch_size)
+        
+        async for doc in cursor:
+            yield doc
+    
+    @staticmethod
+    def _message_cursor(doc: Dict[str, Any]) -> str:
+        """Cursor keyset (timestamp, _id) untuk sebuah dokumen pesan"""
+        return encode_cursor({"timestamp": doc["timestamp"], "_id": ObjectId(doc["_id"])})
     
     async def send_message(self, user_id: str, conversation_id: str, content: str) -> Dict[str, Any]:
         """Send message without AI response"""
+        if not ObjectId.is_valid(conversation_id):
+            raise ValueError(f"conversation_id tidak valid: {conversation_id}")
         
         try:
-            now = now_for_db()
+            # Resolusi milidetik: Message yang di-buffer harus sama dengan dokumen tersimpan (cursor keyset)
+            now = now_for_db_ms()
             logger.info(f"📨 Processing message from user {user_id}: '{content}'")
             
-            # Save user message
+            # NO AI RESPONSE - Just echo message or return simple confirmation
+            echo_timestamp = now_for_db_ms()
+            
             user_message_data = {
                 "conversation_id": conversation_id,
                 "sender_id": user_id,
@@ -118,23 +310,6 @@ class ChatService:
                 "timestamp": now
             }
             
-            user_result = self.db.messages.insert_one(user_message_data)
-            user_message_id = str(user_result.inserted_id)
-            
-            user_message = Message(
-                id=user_message_id,
-                conversation_id=conversation_id,
-                sender_id=user_id,
-                sender_type="user",
-                content=content,
-                message_type=MessageType.TEXT,
-                status="sent",
-                timestamp=now
-            )
-            
-            # NO AI RESPONSE - Just echo message or return simple confirmation
-            echo_timestamp = now_for_db()
-            
             echo_message_data = {
                 "conversation_id": conversation_id,
                 "sender_id": None,
@@ -149,8 +324,28 @@ class ChatService:
                 }
             }
             
-            echo_result = self.db.messages.insert_one(echo_message_data)
-            echo_message_id = str(echo_result.inserted_id)
+            if self.write_behind:
+                # Write-behind: di-commit bersama pengirim lain dalam satu batch
+                user_message_data["_id"], echo_message_data["_id"] = ObjectId(), ObjectId()
+                await self.write_queue.submit(
+                    user_id, conversation_id, content, [user_message_data, echo_message_data], now
+                )
+                user_message_id, echo_message_id = str(user_message_data["_id"]), str(echo_message_data["_id"])
+            else:
+                user_message_id, echo_message_id = await self._write_message_pair(
+                    user_id, conversation_id, content, user_message_data, echo_message_data
+                )
+            
+            user_message = Message(
+                id=user_message_id,
+                conversation_id=conversation_id,
+                sender_id=user_id,
+                sender_type="user",
+                content=content,
+                message_type=MessageType.TEXT,
+                status="sent",
+                timestamp=now
+            )
             
             echo_message = Message(
                 id=echo_message_id,
@@ -167,9 +362,8 @@ class ChatService:
                 }
             )
             
-            # Update conversation
-            await self._update_conversation_safe(conversation_id, content, "Pesan Anda telah diterima", user_id)
-            
+            self.conversation_cache.on_message(user_id, conversation_id, content, now, 2)
+            self.message_buffer.append(conversation_id, [user_message, echo_message])
             logger.info(f"✅ Message processed successfully (No AI)")
             
             return {
@@ -183,49 +377,66 @@ class ChatService:
             logger.error(f"❌ Error in send_message: {e}")
             raise e
     
-    async def _update_conversation_safe(self, conversation_id: str, user_message: str, system_response: str, user_id: str):
-        """Update conversation dengan title generation"""
-        try:
-            current_conv = self.db.conversations.find_one({"_id": ObjectId(conversation_id)})
-            if not current_conv:
-                return
-            
-            current_count = current_conv.get("message_count", 0)
-            new_count = current_count + 2
-            
-            current_title = current_conv.get("title")
-            new_title = current_title
-            
-            # Simple title generation from first words
-            if not current_title and current_count == 0:
-                words = user_message.split()[:3]
-                new_title = " ".join(words) + "..." if len(words) == 3 else " ".join(words)
-            
-            update_time = now_for_db()
-            
-            update_data = {
-                "last_message": user_message,
-                "last_message_at": update_time,
-                "updated_at": update_time,
-                "message_count": new_count,
-                "status": ConversationStatus.ACTIVE.value
-            }
-            
-            if new_title:
-                update_data["title"] = new_title
-            
-            self.db.conversations.update_one(
-                {"_id": ObjectId(conversation_id)},
-                {"$set": update_data}
-            )
-            
-        except Exception as e:
-            logger.error(f"❌ Error updating conversation: {e}")
+    async def _write_message_pair(
+        self,
+        user_id: str,
+        conversation_id: str,
+        content: str,
+        user_message_data: Dict[str, Any],
+        echo_message_data: Dict[str, Any]
+    ) -> List[str]:
+        """Write path langsung: insert pesan, lalu update turunan lewat batch bersama pengirim lain
+        
+        Pesan sudah tersimpan saat insert_many kembali. Update conversation,
+        chat_stats, search_index dan title digabung per flush MessageWriteQueue
+        (satu bulk_write per collection untuk semua pengirim), bukan 3-4 write
+        per pesan.
+        """
+        # Save user message dan echo dalam satu round trip (ordered, urutan tetap terjaga)
+        insert_result = await self.db.messages.insert_many([user_message_data, echo_message_data])
+        user_message_id, echo_message_id = [str(inserted_id) for inserted_id in insert_result.inserted_ids]
+        
+        await self.write_queue.submit(
+            user_id, conversation_id, content, [user_message_data, echo_message_data],
+            user_message_data["timestamp"], stored=True
+        )
+        return [user_message_id, echo_message_id]
+    
+    @staticmethod
+    def _generate_title(user_message: str) -> str:
+        """Simple title generation from first words"""
+        words = user_message.split()[:3]
+        return " ".join(words) + "..." if len(words) == 3 else " ".join(words)
+    
+    @staticmethod
+    def _conversation_update(last_message: str, new_title: Optional[str], update_time: datetime, added: int) -> List[Dict[str, Any]]:
+        """Update pipeline conversation setelah `added` pesan baru
+        
+        $add atomik per dokumen seperti $inc, plus $cond: title hanya diisi jika
+        percakapan belum punya title dan belum punya pesan.
+        """
+        current_count = {"$ifNull": ["$message_count", 0]}
+        return [{"$set": {
+            "title": {"$cond": [
+                {"$and": [
+                    {"$not": [{"$ifNull": ["$title", None]}]},
+                    {"$eq": [current_count, 0]}
+                ]},
+                {"$literal": new_title},
+                {"$ifNull": ["$title", None]}
+            ]},
+            # $literal: isi pesan yang diawali "$" tidak boleh dibaca sebagai field path
+            "last_message": {"$literal": last_message},
+            "last_message_at": update_time,
+            "updated_at": update_time,
+            "message_count": {"$add": [current_count, added]},
+            "status": ConversationStatus.ACTIVE.value
+        }}]
     
     async def get_conversation_by_id(self, conversation_id: str) -> Optional[Conversation]:
         """Mengambil percakapan berdasarkan ID"""
         try:
-            doc = self.db.conversations.find_one({"_id": ObjectId(conversation_id)})
+            doc = await self.db.conversations.find_one({"_id": ObjectId(conversation_id)})
             if doc:
                 if "created_at" not in doc:
                     doc["created_at"] = doc.get("updated_at", now_for_db())
@@ -240,87 +451,290 @@ class ChatService:
     async def delete_conversation(self, conversation_id: str, user_id: str) -> bool:
         """Hapus percakapan"""
         try:
-            result = self.db.conversations.update_one(
+            # Dokumen sebelum update: message_count untuk statistik, status lama agar hapus ulang tidak dihitung dua kali
+            previous = await self.db.conversations.find_one_and_update(
                 {"_id": ObjectId(conversation_id), "user_id": user_id},
                 {"$set": {
                     "status": ConversationStatus.DELETED.value,
                     "updated_at": now_for_db()
-                }}
+                }},
+                projection={"status": 1, "message_count": 1}
             )
-            return result.modified_count > 0
+            if previous is None:
+                return False
+            if previous.get("status") != ConversationStatus.DELETED.value:
+                self.titles.on_conversation_removed(user_id, conversation_id)
+                self.conversation_cache.invalidate(user_id)
+                self.message_buffer.evict(conversation_id)
+                await self.stats.adjust_conversations(user_id, -1, messages_delta=-(previous.get("message_count") or 0))
+            return True
         except Exception as e:
             logger.error(f"❌ Error deleting conversation: {e}")
             return False
     
-    async def auto_delete_empty_conversations(self, user_id: str) -> int:
-        """Auto-delete conversations kosong"""
+    async def _bulk_set_status(
+        self,
+        user_id: str,
+        conversation_ids: List[str],
+        target: ConversationStatus,
+        from_statuses: List[Optional[str]],
+        changed_outcome: str,
+        unchanged_outcome: str
+    ) -> Dict[str, str]:
+        """Ubah status banyak percakapan milik user dengan satu update_many
+        
+        Dokumen yang berubah ditandai dengan updated_at yang sama persis, lalu satu
+        find membedakan hasil per id: `changed_outcome`, `unchanged_outcome` (sudah
+        berstatus target), "not_found" (bukan milik user / status lain) atau
+        "invalid_id".
+        """
+        outcomes: Dict[str, str] = {}
+        object_ids = {}
+        for conversation_id in conversation_ids:
+            if ObjectId.is_valid(conversation_id):
+                object_ids[conversation_id] = ObjectId(conversation_id)
+            else:
+                outcomes[conversation_id] = "invalid_id"
+        if not object_ids:
+            return outcomes
+        
+        # BSON datetime beresolusi milidetik; dibulatkan agar bisa dibandingkan dengan hasil find
+        operation_time = now_for_db_ms()
+        owned = {"_id": {"$in": list(object_ids.values())}, "user_id": user_id}
+        await self.db.conversations.update_many(
+            {**owned, "status": {"$in": from_statuses}},
+            {"$set": {"status": target.value, "updated_at": operation_time}}
+        )
+        current = {
+            str(doc["_id"]): doc
+            async for doc in self.db.conversations.find(owned, {"status": 1, "updated_at": 1})
+        }
+        
+        for conversation_id in object_ids:
+            doc = current.get(conversation_id)
+            if doc is None or doc.get("status") != target.value:
+                outcomes[conversation_id] = "not_found"
+            elif doc.get("updated_at") == operation_time:
+                outcomes[conversation_id] = changed_outcome
+            else:
+                outcomes[conversation_id] = unchanged_outcome
+        
+        # State in-memory dan cache diperbarui sekali per batch
+        changed = [conversation_id for conversation_id, outcome in outcomes.items() if outcome == changed_outcome]
+        if changed:
+            self.conversation_cache.invalidate(user_id)
+            self.titles.evict(user_id)
+            for conversation_id in changed:
+                self.message_buffer.evict(conversation_id)
+        
+        return {conversation_id: outcomes[conversation_id] for conversation_id in conversation_ids}
+    
+    async def bulk_delete_conversations(self, user_id: str, conversation_ids: List[str]) -> Dict[str, str]:
+        """Hapus (soft delete) banyak percakapan; hasil per id: deleted / already_deleted / not_found / invalid_id"""
+        outcomes = await self._bulk_set_status(
+            user_id, conversation_ids, ConversationStatus.DELETED,
+            [ConversationStatus.ACTIVE.value, ConversationStatus.ARCHIVED.value, None],
+            "deleted", "already_deleted"
+        )
+        deleted_ids = [ObjectId(conversation_id) for conversation_id, outcome in outcomes.items() if outcome == "deleted"]
+        if deleted_ids:
+            deleted_messages = 0
+            async for doc in self.db.conversations.find({"_id": {"$in": deleted_ids}}, {"message_count": 1}):
+                deleted_messages += doc.get("message_count") or 0
+            await self.stats.adjust_conversations(user_id, -len(deleted_ids), messages_delta=-deleted_messages)
+        return outcomes
+    
+    async def archive_conversations(self, user_id: str, conversation_ids: List[str]) -> Dict[str, str]:
+        """Arsipkan percakapan aktif; hasil per id: archived / already_archived / not_found / invalid_id"""
+        return await self._bulk_set_status(
+            user_id, conversation_ids, ConversationStatus.ARCHIVED,
+            [ConversationStatus.ACTIVE.value, None],
+            "archived", "already_archived"
+        )
+    
+    async def unarchive_conversations(self, user_id: str, conversation_ids: List[str]) -> Dict[str, str]:
+        """Keluarkan percakapan dari arsip; hasil per id: unarchived / not_archived / not_found / invalid_id"""
+        return await self._bulk_set_status(
+            user_id, conversation_ids, ConversationStatus.ACTIVE,
+            [ConversationStatus.ARCHIVED.value],
+            "unarchived", "not_archived"
+        )
+    
+    async def auto_delete_empty_conversations(
+        self,
+        user_id: Optional[str] = None,
+        older_than_minutes: int = 0,
+        batch_size: int = 500
+    ) -> int:
+        """Auto-delete conversations kosong (set-based); jumlah percakapan yang dihapus"""
+        batch = await self.sweep_empty_conversations_batch(user_id, older_than_minutes, batch_size)
+        return batch["deleted"]
+    
+    async def sweep_empty_conversations_batch(
+        self,
+        user_id: Optional[str] = None,
+        older_than_minutes: int = 0,
+        batch_size: int = 500
+    ) -> Dict[str, int]:
+        """Satu batch sweep percakapan kosong: {scanned, deleted, backfilled}
+        
+        Satu aggregation mengambil maksimal `batch_size` kandidat (message_count
+        0/tidak ada) dan memeriksa lewat $lookup ke index messages.conversation_id
+        apakah kandidat benar-benar tidak punya pesan; yang kosong ditandai deleted
+        dengan satu update_many. Kandidat lama yang ternyata punya pesan diisi
+        message_count-nya, sehingga tidak muncul lagi sebagai kandidat dan batch
+        berikutnya maju ke percakapan lain. Tanpa user_id berlaku untuk semua user
+        (dipakai sweeper background).
+        """
+        outcome = {"scanned": 0, "deleted": 0, "backfilled": 0}
         try:
-            empty_conversations = self.db.conversations.find({
-                "user_id": user_id,
-                "$or": [
-                    {"message_count": 0},
-                    {"message_count": {"$exists": False}},
-                    {"last_message": {"$exists": False}},
-                    {"last_message": None}
-                ],
+            match = {
+                "message_count": {"$in": [0, None]},
                 "status": {"$ne": ConversationStatus.DELETED.value}
-            })
-            
-            deleted_count = 0
-            for conv in empty_conversations:
-                conversation_id = str(conv["_id"])
-                message_count = self.db.messages.count_documents({
-                    "conversation_id": conversation_id
-                })
-                
-                if message_count == 0:
-                    result = self.db.conversations.update_one(
-                        {"_id": conv["_id"]},
-                        {"$set": {
-                            "status": ConversationStatus.DELETED.value,
-                            "updated_at": now_for_db()
-                        }}
-                    )
-                    if result.modified_count > 0:
-                        deleted_count += 1
+            }
+            if user_id:
+                match["user_id"] = user_id
+            if older_than_minutes > 0:
+                match["updated_at"] = {"$lt": now_for_db() - timedelta(minutes=older_than_minutes)}
+            
+            pipeline = [
+                {"$match": match},
+                {"$limit": batch_size},
+                {"$lookup": {
+                    "from": "messages",
+                    "let": {"conversation_id": {"$toString": "$_id"}},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$eq": ["$conversation_id", "$$conversation_id"]}}},
+                        {"$limit": 1},
+                        {"$project": {"_id": 1}}
+                    ],
+                    "as": "messages"
+                }},
+                {"$project": {"_id": 1, "user_id": 1, "has_messages": {"$gt": [{"$size": "$messages"}, 0]}}}
+            ]
+            scanned = [doc async for doc in self.db.conversations.aggregate(pipeline)]
+            outcome["scanned"] = len(scanned)
+            candidates = [doc for doc in scanned if not doc["has_messages"]]
+            
+            stale = [doc["_id"] for doc in scanned if doc["has_messages"]]
+            if stale:
+                outcome["backfilled"] = await self._backfill_message_counts(stale)
+            if not candidates:
+                return outcome
+            
+            # Resolusi milidetik: dibandingkan lagi dengan updated_at hasil find di bawah
+            sweep_time = now_for_db_ms()
+            candidate_ids = [doc["_id"] for doc in candidates]
+            # Cek ulang message_count agar percakapan yang baru menerima pesan tidak ikut terhapus
+            result = await self.db.conversations.update_many(
+                {
+                    "_id": {"$in": candidate_ids},
+                    "message_count": {"$in": [0, None]},
+                    "status": {"$ne": ConversationStatus.DELETED.value}
+                },
+                {"$set": {
+                    "status": ConversationStatus.DELETED.value,
+                    "updated_at": sweep_time
+                }}
+            )
             
-            return deleted_count
+            deleted = candidates
+            if result.modified_count != len(candidates):
+                # Sebagian kandidat berubah di antara aggregation dan update; ambil yang benar-benar terhapus
+                deleted = [doc async for doc in self.db.conversations.find(
+                    {"_id": {"$in": candidate_ids}, "updated_at": sweep_time,
+                     "status": ConversationStatus.DELETED.value},
+                    {"_id": 1, "user_id": 1}
+                )]
+            
+            deleted_per_user: Dict[str, int] = {}
+            for doc in deleted:
+                deleted_per_user[doc["user_id"]] = deleted_per_user.get(doc["user_id"], 0) + 1
+            for owner_id, count in deleted_per_user.items():
+                self.conversation_cache.invalidate(owner_id)
+                await self.stats.adjust_conversations(owner_id, -count, sweep_time)
+            
+            outcome["deleted"] = result.modified_count
+            return outcome
             
         except Exception as e:
             logger.error(f"❌ Error in auto_delete_empty_conversations: {e}")
+            return outcome
+    
+    async def _backfill_message_counts(self, conversation_ids: List[ObjectId]) -> int:
+        """Isi message_count percakapan data lama yang ternyata punya pesan"""
+        counts = {
+            row["_id"]: row["count"]
+            async for row in self.db.messages.aggregate([
+                {"$match": {"conversation_id": {"$in": [str(conversation_id) for conversation_id in conversation_ids]}}},
+                {"$group": {"_id": "$conversation_id", "count": {"$sum": 1}}}
+            ])
+        }
+        if not counts:
             return 0
+        result = await self.db.conversations.bulk_write([
+            UpdateOne(
+                {"_id": ObjectId(conversation_id), "message_count": {"$in": [0, None]}},
+                {"$set": {"message_count": count}}
+            )
+            for conversation_id, count in counts.items()
+        ], ordered=False)
+        return result.modified_count
+    
+    async def search_conversations(
+        self,
+        user_id: str,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Full-text search title dan isi pesan (ChatSearchService)
+        
+        Mengembalikan {results, has_next, next_cursor, truncated}; setiap result berisi
+        Conversation, skor dan snippet dengan offset highlight. ValueError jika
+        cursor tidak valid.
+        """
+        page = await self.search.search(user_id, query, limit=limit, cursor=cursor)
+        
+        for result in page["results"]:
+            doc = result["conversation"]
+            if "created_at" not in doc:
+                doc["created_at"] = doc.get("updated_at", now_for_db())
+            if "status" not in doc:
+                doc["status"] = ConversationStatus.ACTIVE.value
+            result["conversation"] = Conversation.from_mongo(doc)
+        
+        return page
     
-    async def search_conversations(self, user_id: str, query: str) -> List[Conversation]:
-        """Search percakapan"""
+    async def sync_changes(self, user_id: str, token: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """Delta sync untuk client mobile (ChatSyncService); ValueError jika token tidak valid"""
+        return await self.sync.changes(user_id, token=token, limit=limit)
+    
+    def on_message_stored(self, doc: Dict[str, Any]):
+        """Pesan baru dari change stream (worker mana pun): perbarui buffer percakapan di worker ini"""
+        conversation_id = doc.get("conversation_id")
+        if not conversation_id:
+            return
         try:
-            search_query = {
-                "user_id": user_id,
-                "$or": [
-                    {"status": ConversationStatus.ACTIVE.value},
-                    {"status": {"$exists": False}}
-                ],
-                "$and": [
-                    {"$or": [
-                        {"title": {"$regex": query, "$options": "i"}},
-                        {"last_message": {"$regex": query, "$options": "i"}}
-                    ]}
-                ]
-            }
-            
-            conversations = self.db.conversations.find(search_query).sort("updated_at", -1)
-            
-            result = []
-            for doc in conversations:
-                if "created_at" not in doc:
-                    doc["created_at"] = doc.get("updated_at", now_for_db())
-                if "status" not in doc:
-                    doc["status"] = ConversationStatus.ACTIVE.value
-                result.append(Conversation.from_mongo(doc))
-            
-            return result
+            self.message_buffer.append(conversation_id, [Message.from_mongo(dict(doc))])
         except Exception as e:
-            logger.error(f"Error searching conversations: {e}")
-            return []
+            # Dokumen tidak valid sebagai Message: buffer tidak bisa dipercaya lagi
+            logger.warning(f"⚠️ Evicting message buffer for {conversation_id}: {e}")
+            self.message_buffer.evict(conversation_id)
+    
+    def on_user_connected(self, user_id: str):
+        """Satu socket WebSocket user terbuka (dipanggil per device): cache in-memory per user boleh diisi"""
+        self.message_buffer.retain_user(user_id)
+    
+    def on_user_disconnected(self, user_id: str):
+        """Satu socket user tertutup; state in-memory dibuang setelah device terakhir putus"""
+        self.message_buffer.release_user(user_id)
+        if not self.message_buffer.is_connected(user_id):
+            self.titles.evict(user_id)
+    
+    async def autocomplete_titles(self, user_id: str, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Top-k title percakapan aktif yang cocok dengan prefix (in-memory, lihat TitleAutocompleteService)"""
+        return await self.titles.complete(user_id, prefix, limit)
     
     async def cleanup_user_conversations(self, user_id: str) -> Dict[str, int]:
         """Cleanup conversations user"""
@@ -338,34 +752,10 @@ class ChatService:
     async def get_chat_statistics(self, user_id: str) -> Dict[str, Any]:
         """Statistik chat"""
         try:
-            total_conversations = self.db.conversations.count_documents({
-                "user_id": user_id,
-                "status": {"$ne": ConversationStatus.DELETED.value}
-            })
-            
-            user_conversations = self.db.conversations.find(
-                {"user_id": user_id, "status": {"$ne": ConversationStatus.DELETED.value}},
-                {"_id": 1}
-            )
-            conversation_ids = [str(conv["_id"]) for conv in user_conversations]
-            
-            total_messages = self.db.messages.count_documents({
-                "conversation_id": {"$in": conversation_ids}
-            })
-            
-            recent_activity = self.db.conversations.find_one(
-                {"user_id": user_id, "status": {"$ne": ConversationStatus.DELETED.value}},
-                sort=[("updated_at", -1)]
-            )
-            
-            last_activity = recent_activity.get("updated_at") if recent_activity else None
+            stats = await self.stats.get_stats(user_id)
             
             return {
-                "total_conversations": total_conversations,
-                "total_messages": total_messages,
-                "today_messages": 0,
-                "weekly_messages": 0,
-                "last_activity": last_activity,
+                **stats,
                 "timezone": "Asia/Jakarta (WIB/GMT+7)",
                 "current_time_wib": IndonesiaDatetime.format(IndonesiaDatetime.now()),
                 "chat_version": "Simple Chat (No AI)",
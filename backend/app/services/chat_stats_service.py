@@ -0,0 +1,196 @@
+# app/services/chat_stats_service.py - Statistik chat per user yang di-maintain secara inkremental
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from ..config.database import get_async_database
+from ..config.db_monitoring import instrument_db_calls
+from ..models.chat import ConversationStatus
+from ..utils.timezone_utils import IndonesiaDatetime, now_for_db
+
+logger = logging.getLogger(__name__)
+
+def wib_buckets(at: Optional[datetime] = None) -> Tuple[str, str]:
+    """Key bucket harian (YYYY-MM-DD) dan mingguan ISO (YYYY-Www) dalam WIB"""
+    wib_now = IndonesiaDatetime.from_utc(at) if at else IndonesiaDatetime.now()
+    iso_year, iso_week, _ = wib_now.isocalendar()
+    return wib_now.strftime("%Y-%m-%d"), f"{iso_year}-W{iso_week:02d}"
+
+def _rolling_bucket(field: str, key: str, amount: int) -> Dict[str, Any]:
+    """Bucket {key, count}: ditambah jika key masih sama, di-reset jika periode sudah berganti"""
+    return {"$cond": [
+        {"$eq": [f"${field}.key", key]},
+        {"key": key, "count": {"$add": [{"$ifNull": [f"${field}.count", 0]}, amount]}},
+        {"key": key, "count": amount}
+    ]}
+
+@instrument_db_calls
+class ChatStatsService:
+    """Satu dokumen `chat_stats` per user (_id = user_id), di-update atomik oleh write path chat
+
+    total_conversations dan total_messages hanya menghitung percakapan yang
+    belum dihapus; daily/weekly menghitung aktivitas (pesan yang dikirim),
+    termasuk di percakapan yang kemudian dihapus. Setiap update inkremental
+    menaikkan `rev` sehingga rebuild tidak menimpa increment yang terjadi
+    selama rebuild berjalan.
+    """
+
+    REBUILD_ATTEMPTS = 3
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_async_database()
+        self.collection = self.db.chat_stats
+
+    @staticmethod
+    def _messages_update(count: int, at: datetime) -> List[Dict[str, Any]]:
+        day_key, week_key = wib_buckets(at)
+        return [{"$set": {
+            "total_messages": {"$add": [{"$ifNull": ["$total_messages", 0]}, count]},
+            "daily": _rolling_bucket("daily", day_key, count),
+            "weekly": _rolling_bucket("weekly", week_key, count),
+            "last_activity": {"$max": [{"$ifNull": ["$last_activity", at]}, at]},
+            "updated_at": at,
+            "rev": {"$add": [{"$ifNull": ["$rev", 0]}, 1]}
+        }}]
+
+    async def record_messages(self, user_id: str, count: int, at: Optional[datetime] = None):
+        """Tambah hitungan pesan (total, hari ini, minggu ini) dan last_activity"""
+        at = at or now_for_db()
+
+        try:
+            await self.collection.update_one({"_id": user_id}, self._messages_update(count, at), upsert=True)
+        except Exception as e:
+            logger.error(f"❌ Error updating chat stats (messages): {e}")
+
+    async def record_messages_bulk(self, counts: Dict[str, Tuple[int, datetime]]):
+        """record_messages untuk banyak user dalam satu bulk_write ({user_id: (count, at)})"""
+        if not counts:
+            return
+
+        try:
+            await self.collection.bulk_write([
+                UpdateOne({"_id": user_id}, self._messages_update(count, at), upsert=True)
+                for user_id, (count, at) in counts.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"❌ Error updating chat stats (messages, bulk): {e}")
+
+    async def adjust_conversations(
+        self,
+        user_id: str,
+        delta: int,
+        at: Optional[datetime] = None,
+        messages_delta: int = 0
+    ):
+        """Tambah/kurangi jumlah percakapan yang belum dihapus (dan pesan di dalamnya)"""
+        if delta == 0 and messages_delta == 0:
+            return
+        at = at or now_for_db()
+
+        try:
+            update = {
+                "$inc": {"total_conversations": delta, "total_messages": messages_delta, "rev": 1},
+                "$set": {"updated_at": at}
+            }
+            if delta > 0:
+                update["$max"] = {"last_activity": at}
+            await self.collection.update_one({"_id": user_id}, update, upsert=True)
+        except Exception as e:
+            logger.error(f"❌ Error updating chat stats (conversations): {e}")
+
+    async def get_stats(self, user_id: str) -> Dict[str, Any]:
+        """Satu point read; dokumen dibangun ulang sekali untuk user dengan data lama"""
+        doc = await self.collection.find_one({"_id": user_id})
+        if not doc or not doc.get("initialized"):
+            doc = await self.rebuild(user_id)
+
+        day_key, week_key = wib_buckets()
+        daily = doc.get("daily") or {}
+        weekly = doc.get("weekly") or {}
+
+        return {
+            "total_conversations": max(0, doc.get("total_conversations", 0)),
+            "total_messages": doc.get("total_messages", 0),
+            "today_messages": daily.get("count", 0) if daily.get("key") == day_key else 0,
+            "weekly_messages": weekly.get("count", 0) if weekly.get("key") == week_key else 0,
+            "last_activity": doc.get("last_activity")
+        }
+
+    async def rebuild(self, user_id: str) -> Dict[str, Any]:
+        """Hitung ulang statistik dari conversations/messages (hanya untuk backfill)
+
+        Hasil ditulis dengan $set bersyarat `rev` yang dibaca sebelum menghitung;
+        jika ada update inkremental di tengah jalan, hitungan diulang.
+        """
+        for _ in range(self.REBUILD_ATTEMPTS):
+            current = await self.collection.find_one({"_id": user_id}, {"rev": 1})
+            rev = current.get("rev") if current else None
+            fields = await self._count(user_id)
+            fields["rev"] = (rev or 0) + 1
+
+            guard = {"_id": user_id, "rev": rev if rev is not None else {"$exists": False}}
+            try:
+                result = await self.collection.update_one(guard, {"$set": fields}, upsert=True)
+            except DuplicateKeyError:
+                # Dokumen dibuat oleh update inkremental selama rebuild
+                continue
+            if result.matched_count or result.upserted_id is not None:
+                logger.info(f"📊 Chat stats rebuilt for user {user_id}")
+                return {"_id": user_id, **fields}
+
+        # Masih ada write bersamaan: kembalikan hitungan tanpa menyimpan, rebuild dicoba lagi nanti
+        logger.warning(f"⚠️ Chat stats rebuild for user {user_id} kept racing with writes; not saved")
+        return {"_id": user_id, **fields, "initialized": False}
+
+    async def _count(self, user_id: str) -> Dict[str, Any]:
+        not_deleted = {"user_id": user_id, "status": {"$ne": ConversationStatus.DELETED.value}}
+
+        # total_* hanya dari percakapan yang belum dihapus; aktivitas harian/mingguan dari semua
+        conversation_ids, live_ids = [], []
+        async for conv in self.db.conversations.find({"user_id": user_id}, {"status": 1}):
+            conversation_ids.append(str(conv["_id"]))
+            if conv.get("status") != ConversationStatus.DELETED.value:
+                live_ids.append(str(conv["_id"]))
+        total_conversations = len(live_ids)
+
+        wib_now = IndonesiaDatetime.now()
+        day_start = wib_now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start = day_start - timedelta(days=day_start.weekday())
+        # Timestamp pesan disimpan sebagai UTC naive
+        day_start_utc = IndonesiaDatetime.to_utc(day_start).replace(tzinfo=None)
+        week_start_utc = IndonesiaDatetime.to_utc(week_start).replace(tzinfo=None)
+
+        counts = {"total": 0, "today": 0, "week": 0}
+        last_activity = None
+        if conversation_ids:
+            pipeline = [
+                {"$match": {"conversation_id": {"$in": conversation_ids}}},
+                {"$group": {
+                    "_id": None,
+                    "total": {"$sum": {"$cond": [{"$in": ["$conversation_id", live_ids]}, 1, 0]}},
+                    "today": {"$sum": {"$cond": [{"$gte": ["$timestamp", day_start_utc]}, 1, 0]}},
+                    "week": {"$sum": {"$cond": [{"$gte": ["$timestamp", week_start_utc]}, 1, 0]}},
+                    "last_activity": {"$max": "$timestamp"}
+                }}
+            ]
+            async for row in self.db.messages.aggregate(pipeline):
+                counts = row
+                last_activity = row.get("last_activity")
+
+        recent = await self.db.conversations.find_one(not_deleted, sort=[("updated_at", -1)])
+        if recent and recent.get("updated_at"):
+            last_activity = max(filter(None, [last_activity, recent["updated_at"]]))
+
+        day_key, week_key = wib_buckets()
+        return {
+            "initialized": True,
+            "total_conversations": total_conversations,
+            "total_messages": counts["total"],
+            "daily": {"key": day_key, "count": counts["today"]},
+            "weekly": {"key": week_key, "count": counts["week"]},
+            "last_activity": last_activity,
+            "updated_at": now_for_db()
+        }
@@ -0,0 +1,142 @@
+# app/services/chat_sync_service.py - Delta sync percakapan dan pesan untuk client mobile
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+import os
+
+from bson import ObjectId
+
+from ..config.database import get_async_database
+from ..config.db_monitoring import instrument_db_calls
+from ..models.chat import Conversation, Message, ConversationStatus
+from ..utils.pagination import encode_cursor, decode_cursor, keyset_filter
+from ..utils.timezone_utils import now_for_db
+
+logger = logging.getLogger(__name__)
+
+SYNC_SORT = [("updated_at", 1), ("_id", 1)]
+MESSAGE_SORT = [("conversation_id", 1), ("timestamp", 1), ("_id", 1)]
+# _id terkecil: cursor "semua pesan sejak `since`" untuk endpoint pesan biasa
+MIN_OBJECT_ID = ObjectId("0" * 24)
+
+@instrument_db_calls
+class ChatSyncService:
+    """Perubahan sejak sync token: percakapan (termasuk soft delete) dan pesan baru
+
+    Setiap write percakapan dan pesan menaikkan conversations.updated_at, jadi
+    perubahan dibaca lewat index (user_id, updated_at, _id) dan pesan hanya
+    dicari di percakapan yang berubah lewat index (conversation_id, timestamp, _id).
+
+    updated_at diisi jam aplikasi sebelum write selesai, sehingga token baru
+    mundur CHAT_SYNC_OVERLAP_SECONDS dari awal sync. Perubahan di jendela itu
+    bisa terkirim dua kali; client menerapkannya sebagai upsert per id.
+    """
+
+    def __init__(self, db=None, overlap_seconds: Optional[float] = None, max_messages: Optional[int] = None):
+        self.db = db if db is not None else get_async_database()
+        self.overlap = timedelta(seconds=overlap_seconds if overlap_seconds is not None else float(
+            os.getenv("CHAT_SYNC_OVERLAP_SECONDS", "5")
+        ))
+        self.max_messages = max_messages or int(os.getenv("CHAT_SYNC_MAX_MESSAGES", "500"))
+
+    @staticmethod
+    def _parse_token(token: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime], Optional[Dict[str, Any]]]:
+        """(since, until, posisi keyset); ValueError jika token tidak valid"""
+        if not token:
+            return None, None, None
+        payload = decode_cursor(token)
+        if "since" not in payload or not isinstance(payload["since"], (datetime, type(None))):
+            raise ValueError("Sync token tidak valid")
+        position = None
+        if "_id" in payload:
+            if not isinstance(payload.get("until"), datetime) or not isinstance(payload["_id"], ObjectId):
+                raise ValueError("Sync token tidak valid")
+            position = {"updated_at": payload.get("updated_at"), "_id": payload["_id"]}
+        return payload["since"], payload.get("until"), position
+
+    async def changes(self, user_id: str, token: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+        """Satu halaman perubahan untuk user
+
+        Tanpa token (sync awal) hanya daftar percakapan yang belum dihapus yang
+        dikirim; pesan dimuat lewat endpoint pesan. Dengan token: percakapan yang
+        dibuat/diubah/dihapus sejak token plus pesan barunya. has_more=True berarti
+        sync_token adalah lanjutan halaman, bukan token akhir. Percakapan dengan
+        pesan melebihi CHAT_SYNC_MAX_MESSAGES masuk message_gaps dengan cursor
+        `after` untuk endpoint pesan.
+        """
+        since, until, position = self._parse_token(token)
+        if until is None:
+            until = now_for_db() - self.overlap
+
+        query: Dict[str, Any] = {"user_id": user_id}
+        if since is None:
+            query["status"] = {"$ne": ConversationStatus.DELETED.value}
+        else:
+            query["updated_at"] = {"$gte": since}
+        if position is not None:
+            # Data lama bisa tanpa updated_at (null diurutkan paling awal)
+            keyset = keyset_filter(SYNC_SORT, position, nullable=["updated_at"])
+            if "updated_at" in query and "updated_at" in keyset:
+                query["$and"] = [{"updated_at": query.pop("updated_at")}, keyset]
+            else:
+                query.update(keyset)
+
+        docs = [doc async for doc in self.db.conversations.find(query).sort(SYNC_SORT).limit(limit + 1)]
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        # Posisi lanjutan dari nilai asli di database, sebelum from_mongo mengubah _id jadi string
+        last_position = {"updated_at": docs[-1].get("updated_at"), "_id": docs[-1]["_id"]} if docs else None
+
+        conversations: List[Conversation] = []
+        deleted_ids: List[str] = []
+        for doc in docs:
+            if doc.get("status") == ConversationStatus.DELETED.value:
+                deleted_ids.append(str(doc["_id"]))
+                continue
+            if "created_at" not in doc:
+                doc["created_at"] = doc.get("updated_at", now_for_db())
+            if "status" not in doc:
+                doc["status"] = ConversationStatus.ACTIVE.value
+            conversations.append(Conversation.from_mongo(doc))
+
+        messages: List[Message] = []
+        message_gaps: List[Dict[str, str]] = []
+        if since is not None and conversations:
+            messages, message_gaps = await self._messages_since([conv.id for conv in conversations], since)
+
+        if has_more:
+            sync_token = encode_cursor({"since": since, "until": until, **last_position})
+        else:
+            sync_token = encode_cursor({"since": until})
+
+        return {
+            "conversations": conversations,
+            "deleted_conversation_ids": deleted_ids,
+            "messages": messages,
+            "message_gaps": message_gaps,
+            "full_sync": since is None,
+            "has_more": has_more,
+            "sync_token": sync_token
+        }
+
+    async def _messages_since(self, conversation_ids: List[str], since: datetime) -> Tuple[List[Message], List[Dict[str, str]]]:
+        docs = [doc async for doc in self.db.messages.find(
+            {"conversation_id": {"$in": conversation_ids}, "timestamp": {"$gte": since}}
+        ).sort(MESSAGE_SORT).limit(self.max_messages + 1)]
+
+        gaps: List[Dict[str, str]] = []
+        if len(docs) > self.max_messages:
+            docs = docs[:self.max_messages]
+            last = docs[-1]
+            # Percakapan terakhir terpotong; percakapan setelahnya (urutan conversation_id) belum terbaca
+            gaps.append({
+                "conversation_id": last["conversation_id"],
+                "after_cursor": encode_cursor({"timestamp": last["timestamp"], "_id": last["_id"]})
+            })
+            unread_cursor = encode_cursor({"timestamp": since, "_id": MIN_OBJECT_ID})
+            gaps.extend(
+                {"conversation_id": conversation_id, "after_cursor": unread_cursor}
+                for conversation_id in sorted(conversation_ids) if conversation_id > last["conversation_id"]
+            )
+
+        return [Message.from_mongo(doc) for doc in docs], gaps
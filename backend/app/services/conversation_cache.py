@@ -0,0 +1,143 @@
+# app/services/conversation_cache.py - Cache halaman pertama daftar percakapan per user
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+from bson import ObjectId
+
+from ..utils.pagination import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# (limit, sort_by, sort_order, direction) dari PaginationRequest
+PageKey = Tuple[int, str, str, str]
+
+class ConversationListCache:
+    """LRU + TTL cache halaman pertama get_user_conversations_page, per worker
+
+    Write path di worker ini meng-invalidate atau mem-patch entry secara
+    langsung; TTL membatasi data basi dari write di worker lain. Ukuran 0
+    mematikan cache.
+    """
+
+    def __init__(self, max_users: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_users = max_users if max_users is not None else int(os.getenv("CHAT_CONVERSATION_CACHE_SIZE", "5000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("CHAT_CONVERSATION_CACHE_TTL_SECONDS", "60"))
+        self._entries: "OrderedDict[str, Tuple[float, Dict[PageKey, Dict[str, Any]]]]" = OrderedDict()
+        # Token read yang sedang berjalan; write membatalkannya agar hasil read lama tidak masuk cache
+        self._pending: Dict[str, object] = {}
+        self.metrics = {"hits": 0, "misses": 0, "invalidations": 0, "patches": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_users > 0
+
+    def get(self, user_id: str, key: PageKey) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[user_id]
+            entry = None
+        page = entry[1].get(key) if entry is not None else None
+        if page is None:
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["hits"] += 1
+        self._entries.move_to_end(user_id)
+        return {**page, "conversations": list(page["conversations"])}
+
+    def begin_fill(self, user_id: str) -> object:
+        """Dipanggil sebelum membaca database untuk miss; diteruskan ke put()"""
+        token = object()
+        self._pending[user_id] = token
+        return token
+
+    def put(self, user_id: str, key: PageKey, page: Dict[str, Any], token: object):
+        if self._pending.get(user_id) is not token:
+            # Ada write setelah read dimulai (atau read lain yang lebih baru)
+            return
+        del self._pending[user_id]
+        if not self.enabled:
+            return
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            entry = (time.monotonic() + self.ttl_seconds, {})
+            self._entries[user_id] = entry
+        entry[1][key] = {**page, "conversations": list(page["conversations"])}
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+            self.metrics["evictions"] += 1
+
+    def cancel_fill(self, user_id: str, token: object):
+        """Read gagal: lepaskan token tanpa mengisi cache"""
+        if self._pending.get(user_id) is token:
+            del self._pending[user_id]
+
+    def invalidate(self, user_id: str):
+        self._pending.pop(user_id, None)
+        if self._entries.pop(user_id, None) is not None:
+            self.metrics["invalidations"] += 1
+
+    def on_message(self, user_id: str, conversation_id: str, last_message: str, at: datetime, added: int):
+        """Patch percakapan di halaman yang di-cache setelah pesan baru
+
+        Urutan created_at/title tidak berubah, jadi field cukup di-patch. Untuk
+        urutan updated_at desc, percakapan yang sudah di posisi teratas di-patch;
+        selain itu halaman tersebut dibuang karena urutannya berubah.
+        """
+        self._pending.pop(user_id, None)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+
+        pages = entry[1]
+        for key in list(pages):
+            _, sort_by, sort_order, _direction = key
+            page = pages[key]
+            conversations = page["conversations"]
+            position = next((i for i, conv in enumerate(conversations) if conv.id == conversation_id), None)
+
+            if position is None:
+                # Percakapan di luar halaman: hanya urutan updated_at desc yang membawanya ke halaman pertama
+                if sort_by == "updated_at":
+                    del pages[key]
+                continue
+
+            current = conversations[position]
+            reorders = sort_by == "updated_at" and not (sort_order == "desc" and position == 0)
+            # Title dibuat dari pesan pertama; nilainya hanya diketahui database
+            if reorders or current.title is None:
+                del pages[key]
+                continue
+
+            conversations[position] = current.copy(update={
+                "last_message": last_message,
+                "last_message_at": at,
+                "updated_at": at,
+                "message_count": (current.message_count or 0) + added
+            })
+            if sort_by == "updated_at":
+                cursor = encode_cursor({"updated_at": at, "_id": ObjectId(conversation_id)})
+                if position == 0:
+                    page["prev_cursor"] = cursor
+                if position == len(conversations) - 1:
+                    page["next_cursor"] = cursor
+            self.metrics["patches"] += 1
+
+        if not pages:
+            self.invalidate(user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_rate": round(self.metrics["hits"] / lookups, 4) if lookups else 0,
+            "users": len(self._entries),
+            "max_users": self.max_users,
+            "ttl_seconds": self.ttl_seconds
+        }
@@ -0,0 +1,108 @@
+# app/services/conversation_sweeper.py - Background cleanup percakapan kosong
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class ConversationSweeper:
+    """Menjalankan ChatService.auto_delete_empty_conversations di luar request path
+
+    - Sweep global periodik (semua user) per batch, dengan jitter agar beberapa
+      worker tidak menyapu bersamaan.
+    - request_user_sweep() dipanggil dari endpoint percakapan; dijadwalkan
+      sebagai task background dan di-throttle per user.
+    """
+
+    def __init__(
+        self,
+        chat_service,
+        interval_seconds: Optional[float] = None,
+        min_age_minutes: Optional[int] = None,
+        user_throttle_seconds: Optional[float] = None,
+        batch_size: Optional[int] = None
+    ):
+        self.chat_service = chat_service
+        self.interval_seconds = interval_seconds or float(os.getenv("CHAT_CLEANUP_INTERVAL_SECONDS", "300"))
+        self.min_age_minutes = min_age_minutes if min_age_minutes is not None else int(
+            os.getenv("CHAT_EMPTY_CONVERSATION_MIN_AGE_MINUTES", "10")
+        )
+        self.user_throttle_seconds = user_throttle_seconds or float(os.getenv("CHAT_CLEANUP_USER_THROTTLE_SECONDS", "60"))
+        self.batch_size = batch_size or int(os.getenv("CHAT_CLEANUP_BATCH_SIZE", "500"))
+
+        self._task: Optional[asyncio.Task] = None
+        self._user_tasks: Set[asyncio.Task] = set()
+        self._last_user_sweep: Dict[str, float] = {}
+        self.total_deleted = 0
+
+    def start(self):
+        """Mulai loop sweep global (dipanggil dari startup event)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"🧹 Conversation sweeper started (interval {self.interval_seconds:.0f}s)")
+
+    async def stop(self):
+        tasks = [task for task in [self._task, *self._user_tasks] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._user_tasks.clear()
+
+    def request_user_sweep(self, user_id: str) -> bool:
+        """Jadwalkan sweep untuk satu user; False jika masih dalam jendela throttle"""
+        now = time.monotonic()
+        last = self._last_user_sweep.get(user_id)
+        if last is not None and now - last < self.user_throttle_seconds:
+            return False
+
+        self._last_user_sweep[user_id] = now
+        task = asyncio.get_running_loop().create_task(self._sweep_user(user_id))
+        self._user_tasks.add(task)
+        task.add_done_callback(self._user_tasks.discard)
+        return True
+
+    async def _sweep_user(self, user_id: str):
+        deleted = await self.chat_service.auto_delete_empty_conversations(
+            user_id, older_than_minutes=self.min_age_minutes, batch_size=self.batch_size
+        )
+        self.total_deleted += deleted
+        if deleted:
+            logger.info(f"🗑️ Swept {deleted} empty conversations for user {user_id}")
+
+    async def sweep_all(self) -> int:
+        """Satu putaran sweep global sampai batch terakhir tidak penuh"""
+        deleted = 0
+        while True:
+            batch = await self.chat_service.sweep_empty_conversations_batch(
+                older_than_minutes=self.min_age_minutes, batch_size=self.batch_size
+            )
+            deleted += batch["deleted"]
+            # Batch penuh berisi kandidat yang tidak bisa diproses (mis. write gagal): jangan berputar di tempat
+            if batch["scanned"] < self.batch_size or not (batch["deleted"] or batch["backfilled"]):
+                break
+
+        self.total_deleted += deleted
+        return deleted
+
+    def _prune_throttle(self):
+        cutoff = time.monotonic() - self.user_throttle_seconds
+        self._last_user_sweep = {
+            user_id: last for user_id, last in self._last_user_sweep.items() if last >= cutoff
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds * random.uniform(0.9, 1.1))
+            try:
+                deleted = await self.sweep_all()
+                if deleted:
+                    logger.info(f"🗑️ Conversation sweeper deleted {deleted} empty conversations")
+                self._prune_throttle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error in conversation sweeper: {e}")
@@ -0,0 +1,211 @@
+# app/services/message_buffer.py - Ring buffer pesan terbaru untuk percakapan yang sedang dibuka
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from bson import ObjectId
+
+from ..models.chat import Message
+
+logger = logging.getLogger(__name__)
+
+# Perkiraan overhead memori per Message (objek pydantic + field) di luar isi pesan
+MESSAGE_OVERHEAD_BYTES = 600
+
+MessageKey = Tuple[datetime, ObjectId]
+
+def message_key(message: Message) -> MessageKey:
+    return message.timestamp, ObjectId(message.id)
+
+class ConversationBuffer:
+    """N pesan terbaru satu percakapan, urut (timestamp, _id) dari yang terlama"""
+
+    __slots__ = ("owner_id", "keys", "messages", "complete", "size_bytes", "filled_at")
+
+    def __init__(self, owner_id: str, messages: List[Message], complete: bool):
+        self.owner_id = owner_id
+        self.messages = messages
+        self.keys = [message_key(message) for message in messages]
+        # True jika buffer berisi seluruh pesan percakapan (tidak ada yang lebih lama)
+        self.complete = complete
+        self.size_bytes = sum(MESSAGE_OVERHEAD_BYTES + len(message.content) for message in messages)
+        self.filled_at = time.monotonic()
+
+    def append(self, message: Message, capacity: int) -> int:
+        """Tambah pesan baru; mengembalikan perubahan ukuran (bytes)
+
+        Pesan yang sudah ada (dari send_message dan change stream) dilewati, begitu
+        juga pesan yang lebih lama dari isi buffer yang tidak lengkap (akan jadi celah).
+        """
+        key = message_key(message)
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return 0
+        if position == 0 and self.keys and not self.complete:
+            return 0
+        self.keys.insert(position, key)
+        self.messages.insert(position, message)
+        delta = MESSAGE_OVERHEAD_BYTES + len(message.content)
+
+        while len(self.messages) > capacity:
+            dropped = self.messages.pop(0)
+            self.keys.pop(0)
+            self.complete = False
+            delta -= MESSAGE_OVERHEAD_BYTES + len(dropped.content)
+
+        self.size_bytes += delta
+        return delta
+
+class RecentMessageBuffer:
+    """Ring buffer per percakapan untuk user yang terhubung lewat WebSocket
+
+    Buffer diisi saat halaman terbaru pertama kali dibaca dan ditambah oleh
+    send_message di worker ini serta oleh change stream (pesan dari worker lain
+    atau batch job). Buffer dibuang saat socket terakhir pemiliknya terputus,
+    saat percakapan dihapus, oleh LRU global jika total memori melewati batas,
+    atau setelah CHAT_MESSAGE_BUFFER_TTL_SECONDS sejak diisi (batas basi jika
+    change stream tidak tersedia).
+    """
+
+    def __init__(self, capacity: Optional[int] = None, max_bytes: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.capacity = capacity or int(os.getenv("CHAT_MESSAGE_BUFFER_SIZE", "100"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv("CHAT_MESSAGE_BUFFER_MAX_BYTES", str(32 * 1024 * 1024))
+        )
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.getenv("CHAT_MESSAGE_BUFFER_TTL_SECONDS", "30")
+        )
+        self._buffers: "OrderedDict[str, ConversationBuffer]" = OrderedDict()
+        self._by_owner: Dict[str, Set[str]] = {}
+        self._connections: Dict[str, int] = {}
+        self.size_bytes = 0
+        self.metrics = {"hits": 0, "misses": 0, "fills": 0, "appends": 0, "evictions": 0, "expired": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # ------------------------------------------------------------------
+    # Koneksi pemilik
+    # ------------------------------------------------------------------
+
+    def retain_user(self, user_id: str):
+        self._connections[user_id] = self._connections.get(user_id, 0) + 1
+
+    def release_user(self, user_id: str):
+        remaining = self._connections.get(user_id, 0) - 1
+        if remaining > 0:
+            self._connections[user_id] = remaining
+            return
+        self._connections.pop(user_id, None)
+        for conversation_id in list(self._by_owner.get(user_id, ())):
+            self.evict(conversation_id)
+
+    def is_connected(self, user_id: str) -> bool:
+        return user_id in self._connections
+
+    # ------------------------------------------------------------------
+    # Buffer
+    # ------------------------------------------------------------------
+
+    def fill(self, conversation_id: str, owner_id: str, newest: List[Message], complete: bool):
+        """Simpan pesan terbaru hasil query (urut terlama -> terbaru)"""
+        if not self.enabled or not self.is_connected(owner_id):
+            return
+        self.evict(conversation_id)
+        buffer = ConversationBuffer(owner_id, list(newest[-self.capacity:]), complete and len(newest) <= self.capacity)
+        self._buffers[conversation_id] = buffer
+        self._by_owner.setdefault(owner_id, set()).add(conversation_id)
+        self.size_bytes += buffer.size_bytes
+        self.metrics["fills"] += 1
+        self._enforce_memory_cap()
+
+    def append(self, conversation_id: str, messages: List[Message]):
+        """Tambahkan pesan baru hanya jika percakapan sudah di-buffer"""
+        buffer = self._buffers.get(conversation_id)
+        if buffer is None:
+            return
+        for message in messages:
+            self.size_bytes += buffer.append(message, self.capacity)
+        self.metrics["appends"] += len(messages)
+        self._buffers.move_to_end(conversation_id)
+        self._enforce_memory_cap()
+
+    def evict(self, conversation_id: str):
+        buffer = self._buffers.pop(conversation_id, None)
+        if buffer is None:
+            return
+        self.size_bytes -= buffer.size_bytes
+        owned = self._by_owner.get(buffer.owner_id)
+        if owned is not None:
+            owned.discard(conversation_id)
+            if not owned:
+                del self._by_owner[buffer.owner_id]
+
+    def _enforce_memory_cap(self):
+        while self.size_bytes > self.max_bytes and self._buffers:
+            self.evict(next(iter(self._buffers)))
+            self.metrics["evictions"] += 1
+
+    def read(
+        self,
+        conversation_id: str,
+        limit: int,
+        before: Optional[MessageKey] = None,
+        after: Optional[MessageKey] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Halaman pesan dari buffer, atau None jika jendela yang diminta tidak muat
+
+        Hasil: {messages (terlama -> terbaru), has_more}.
+        """
+        buffer = self._buffers.get(conversation_id)
+        if buffer is not None and self.ttl_seconds > 0 and time.monotonic() - buffer.filled_at > self.ttl_seconds:
+            self.evict(conversation_id)
+            self.metrics["expired"] += 1
+            buffer = None
+        if buffer is None:
+            self.metrics["misses"] += 1
+            return None
+
+        oldest = buffer.keys[0] if buffer.keys else None
+        if after is not None:
+            # Semua pesan yang lebih baru ada di buffer selama cursor tidak lebih lama dari isi buffer
+            if not buffer.complete and (oldest is None or after < oldest):
+                self.metrics["misses"] += 1
+                return None
+            start = bisect_right(buffer.keys, after)
+            messages = buffer.messages[start:start + limit]
+            has_more = start + limit < len(buffer.messages)
+        else:
+            end = len(buffer.keys) if before is None else bisect_left(buffer.keys, before)
+            if before is not None and not buffer.complete and (oldest is None or before <= oldest):
+                self.metrics["misses"] += 1
+                return None
+            start = max(0, end - limit)
+            if start == 0 and end - start < limit and not buffer.complete:
+                # Sebagian jendela berada sebelum isi buffer
+                self.metrics["misses"] += 1
+                return None
+            messages = buffer.messages[start:end]
+            has_more = start > 0 or not buffer.complete
+
+        self.metrics["hits"] += 1
+        self._buffers.move_to_end(conversation_id)
+        return {"messages": list(messages), "has_more": has_more}
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_rate": round(self.metrics["hits"] / lookups, 4) if lookups else 0,
+            "conversations": len(self._buffers),
+            "connected_users": len(self._connections),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "capacity": self.capacity,
+            "ttl_seconds": self.ttl_seconds
+        }
@@ -0,0 +1,318 @@
+# app/services/message_write_queue.py - Group commit (write-behind) untuk pesan chat
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+class MessageWriteError(PyMongoError):
+    """Pesan satu pengirim gagal ditulis (write error dari insert_many batch)"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+class PendingMessageWrite:
+    """Satu send_message yang menunggu di-commit bersama pengirim lain"""
+
+    __slots__ = ("user_id", "conversation_id", "content", "messages", "timestamp", "future", "stored")
+
+    def __init__(self, user_id: str, conversation_id: str, content: str,
+                 messages: List[Dict[str, Any]], timestamp: datetime, future: asyncio.Future,
+                 stored: bool = False):
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.content = content
+        self.messages = messages
+        self.timestamp = timestamp
+        self.future = future
+        # True: pesan sudah di-insert pemanggil, batch hanya menjalankan update turunan
+        self.stored = stored
+
+class MessageWriteQueue:
+    """Mengumpulkan pesan dari semua pengirim lalu menulisnya per batch
+
+    Satu flush = insert_many pesan, satu bulk_write conversations (update
+    digabung per conversation_id), satu bulk_write chat_stats (per user), satu
+    bulk_write search_index dan satu find untuk title yang baru terbentuk.
+    Batch di-flush setiap `flush_interval_ms` atau saat berisi `max_batch`
+    pesan; future setiap pengirim selesai setelah batch-nya ter-commit.
+
+    Insert berjalan unordered: dokumen yang gagal hanya menggagalkan
+    pengirimnya, dan update turunan hanya dijalankan untuk pesan yang
+    tersimpan. Pesan yang sudah tersimpan selalu dilaporkan sukses walau
+    update turunan gagal (di-log), agar pengirim tidak retry dan menggandakan.
+    Write path langsung (tanpa CHAT_WRITE_BEHIND) meng-insert pesannya sendiri
+    lalu mengantrekan item `stored`: item itu melewati insert dan hanya ikut
+    update turunan batch. Setiap future pasti selesai: error tak terduga di flush menggagalkan
+    batch itu saja, dan jika flusher mati antreannya digagalkan lalu submit
+    berikutnya menjalankan flusher baru.
+    """
+
+    def __init__(self, chat_service, flush_interval_ms: Optional[float] = None, max_batch: Optional[int] = None):
+        self.chat_service = chat_service
+        self.flush_interval = (flush_interval_ms or float(os.getenv("CHAT_WRITE_BEHIND_FLUSH_MS", "5"))) / 1000
+        self.max_batch = max_batch or int(os.getenv("CHAT_WRITE_BEHIND_MAX_BATCH", "200"))
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.stats = {
+            "batches": 0, "writes": 0, "failed_batches": 0, "failed_writes": 0,
+            "side_effect_errors": 0, "max_batch_seen": 0
+        }
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            queue = self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            self._task.add_done_callback(lambda task: self._on_flusher_done(task, queue))
+            logger.info(f"📦 Message write-behind queue started ({self.flush_interval * 1000:.0f} ms / {self.max_batch} items)")
+
+    def _on_flusher_done(self, task: asyncio.Task, queue: asyncio.Queue):
+        """Flusher berhenti: gagalkan pengirim yang masih antre agar tidak menunggu selamanya"""
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            self.stats["failed_batches"] += 1
+            logger.error(f"❌ Message write-behind flusher died: {error}")
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None and not item.future.done():
+                item.future.set_exception(error or RuntimeError("Message write queue stopped"))
+
+    async def submit(self, user_id: str, conversation_id: str, content: str,
+                     messages: List[Dict[str, Any]], timestamp: datetime, stored: bool = False):
+        """Antrikan pesan (sudah punya _id) dan tunggu sampai batch-nya ter-commit
+
+        stored=True: pesan sudah tersimpan; tunggu sampai update turunannya diterapkan.
+        """
+        # Id tidak valid ditolak di sini: setelah insert batch tidak boleh ada error per pengirim
+        if not ObjectId.is_valid(conversation_id):
+            raise ValueError(f"conversation_id tidak valid: {conversation_id}")
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(PendingMessageWrite(user_id, conversation_id, content, messages, timestamp, future, stored))
+        await future
+
+    async def stop(self):
+        """Flush sisa antrian lalu hentikan flusher"""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def _collect(self, batch: List[PendingMessageWrite], item: Optional[PendingMessageWrite]) -> bool:
+        """Tambahkan item ke batch; False jika item adalah sinyal stop (None)"""
+        if item is None:
+            self._closing = True
+            return False
+        batch.append(item)
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        self._closing = False
+        batch: List[PendingMessageWrite] = []
+        try:
+            while not self._closing:
+                batch = []
+                if not self._collect(batch, await self._queue.get()):
+                    break
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.max_batch and not self._closing:
+                    if not self._queue.empty():
+                        self._collect(batch, self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        self._collect(batch, await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._flush_safe(batch)
+
+            # Pengirim yang masuk antrian bersamaan dengan sinyal stop tetap di-commit
+            batch = []
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+            if batch:
+                await self._flush_safe(batch)
+        finally:
+            # Flusher dibatalkan/mati di tengah batch: pengirimnya tidak boleh menunggu selamanya
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError("Message write queue stopped"))
+
+    async def _flush_safe(self, batch: List[PendingMessageWrite]):
+        """_flush yang tidak pernah mematikan flusher; future yang belum selesai digagalkan"""
+        try:
+            await self._flush(batch)
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            logger.error(f"❌ Unexpected error flushing message batch ({len(batch)} items): {e}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+
+    async def _flush(self, batch: List[PendingMessageWrite]):
+        pending = [item for item in batch if not item.stored]
+        try:
+            inserted, failed = await self._insert(pending) if pending else ([], [])
+        except Exception as e:
+            # Error di luar BulkWriteError (mis. koneksi): status tiap dokumen tidak diketahui
+            logger.error(f"❌ Error flushing message batch ({len(pending)} items): {e}")
+            self.stats["failed_batches"] += 1
+            for item in pending:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            inserted, failed = [], []
+
+        # Urutan batch dipertahankan: pesan terakhir per percakapan menjadi last_message
+        inserted_ids = {id(item) for item in inserted}
+        saved = [item for item in batch if item.stored or id(item) in inserted_ids]
+
+        for item, error in failed:
+            if not item.future.done():
+                item.future.set_exception(error)
+        if failed:
+            self.stats["failed_writes"] += len(failed)
+
+        if saved:
+            # Pesan sudah tersimpan: kegagalan update turunan hanya di-log, pengirim tidak boleh retry
+            try:
+                await self._apply_side_effects(saved)
+            except Exception as e:
+                self.stats["side_effect_errors"] += 1
+                logger.error(f"❌ Error applying side effects after message batch ({len(saved)} items): {e}")
+            for item in saved:
+                if not item.future.done():
+                    item.future.set_result(None)
+
+        self.stats["batches"] += 1
+        self.stats["writes"] += len(saved)
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+
+    async def _insert(self, batch: List[PendingMessageWrite]) -> Tuple[List[PendingMessageWrite], List[Tuple[PendingMessageWrite, Exception]]]:
+        """insert_many unordered; (item tersimpan, (item gagal, error)) per pengirim
+
+        Dokumen yang gagal tidak menggagalkan pengirim lain. Pengirim yang hanya
+        sebagian pesannya tersimpan di-rollback agar retry tidak menggandakan pesan.
+        """
+        docs, owners = [], []
+        for item in batch:
+            for doc in item.messages:
+                docs.append(doc)
+                owners.append(item)
+
+        try:
+            await self.chat_service.db.messages.insert_many(docs, ordered=False)
+            return list(batch), []
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+
+        # id(item) -> write error pertama dan _id dokumen yang gagal
+        errors: Dict[int, Dict[str, Any]] = {}
+        failed_ids = set()
+        for write_error in write_errors:
+            errors.setdefault(id(owners[write_error["index"]]), write_error)
+            failed_ids.add(docs[write_error["index"]]["_id"])
+
+        saved, failed = [], []
+        rollback: List[ObjectId] = []
+        for item in batch:
+            write_error = errors.get(id(item))
+            if write_error is None:
+                saved.append(item)
+                continue
+            failed.append((item, MessageWriteError(write_error.get("errmsg", "write failed"), write_error.get("code"))))
+            rollback.extend(doc["_id"] for doc in item.messages if doc["_id"] not in failed_ids)
+
+        if rollback:
+            try:
+                await self.chat_service.db.messages.delete_many({"_id": {"$in": rollback}})
+            except Exception as rollback_error:
+                logger.error(f"❌ Error rolling back {len(rollback)} partially written messages: {rollback_error}")
+        logger.warning(f"⚠️ {len(failed)} of {len(batch)} message writes failed in batch")
+        return saved, failed
+
+    async def _apply_side_effects(self, batch: List[PendingMessageWrite]):
+        """Update conversations, chat_stats, search_index dan title untuk pesan yang tersimpan"""
+        service = self.chat_service
+        merged: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        per_user: Dict[str, Tuple[int, datetime]] = {}
+        postings = []
+        for item in batch:
+            entry = merged.setdefault(item.conversation_id, {
+                "user_id": item.user_id,
+                "count": 0,
+                # Title hanya dipakai jika percakapan belum punya pesan: pesan pertama di batch
+                "title": service._generate_title(item.content) or None
+            })
+            entry["count"] += len(item.messages)
+            entry["last_message"] = item.content
+            entry["update_time"] = max(entry.get("update_time") or item.timestamp, item.timestamp)
+
+            count, at = per_user.get(item.user_id, (0, item.timestamp))
+            per_user[item.user_id] = (count + len(item.messages), max(at, item.timestamp))
+            postings.append((item.user_id, item.conversation_id, str(item.messages[0]["_id"]),
+                             item.content, item.timestamp))
+
+        conversation_ops = [
+            UpdateOne(
+                {"_id": ObjectId(conversation_id)},
+                service._conversation_update(entry["last_message"], entry["title"], entry["update_time"], entry["count"])
+            )
+            for conversation_id, entry in merged.items()
+        ]
+        results = await asyncio.gather(
+            service.db.conversations.bulk_write(conversation_ops, ordered=False),
+            service.stats.record_messages_bulk(per_user),
+            service.search.index_messages(postings),
+            return_exceptions=True
+        )
+        for name, result in zip(("conversations", "chat_stats", "search_index"), results):
+            if isinstance(result, Exception):
+                self.stats["side_effect_errors"] += 1
+                logger.error(f"❌ Error updating {name} after message batch ({len(batch)} items): {result}")
+
+        try:
+            await self._apply_titles(merged)
+        except Exception as e:
+            self.stats["side_effect_errors"] += 1
+            logger.error(f"❌ Error applying titles after message batch: {e}")
+
+    async def _apply_titles(self, merged: "OrderedDict[str, Dict[str, Any]]"):
+        """Terapkan title/recency ke autocomplete dan search untuk percakapan di batch"""
+        service = self.chat_service
+        cursor = service.db.conversations.find(
+            {"_id": {"$in": [ObjectId(conversation_id) for conversation_id in merged]}},
+            {"title": 1, "message_count": 1}
+        )
+        async for doc in cursor:
+            conversation_id = str(doc["_id"])
+            entry = merged[conversation_id]
+            service.titles.on_title_changed(entry["user_id"], conversation_id, doc.get("title"), entry["update_time"])
+            if doc.get("title") and doc.get("message_count") == entry["count"]:
+                # Percakapan kosong sebelum batch ini: title baru saja dibuat
+                await service.search.index_title(entry["user_id"], conversation_id, doc["title"], entry["update_time"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "avg_batch_size": round(self.stats["writes"] / batches, 2) if batches else 0,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "max_batch": self.max_batch
+        }
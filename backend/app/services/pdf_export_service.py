@@ -0,0 +1,304 @@
+# app/services/pdf_export_service.py - Job export PDF percakapan di process pool
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Set
+
+from ..utils.conversation_export import SENDER_LABELS
+from ..utils.pdf_render import PdfFileWriter, layout_batch
+from ..utils.timezone_utils import IndonesiaDatetime, now_for_db
+
+logger = logging.getLogger(__name__)
+
+EXPORT_JOBS_COLLECTION = "export_jobs"
+
+class PdfExportJob:
+    """Status satu export; waktu disimpan sebagai UTC naive (format database)"""
+
+    __slots__ = (
+        "id", "user_id", "conversation_id", "title", "status", "messages", "pages",
+        "path", "size_bytes", "error", "created_at", "finished_at", "expires_at"
+    )
+
+    def __init__(self, user_id: str, conversation_id: str, title: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.title = title
+        self.status = "queued"
+        self.messages = 0
+        self.pages = 0
+        self.path: Optional[str] = None
+        self.size_bytes = 0
+        self.error: Optional[str] = None
+        self.created_at = now_for_db()
+        self.finished_at: Optional[datetime] = None
+        self.expires_at: Optional[datetime] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_doc(self) -> Dict[str, Any]:
+        doc = {slot: getattr(self, slot) for slot in self.__slots__ if slot != "id"}
+        doc["_id"] = self.id
+        return doc
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "PdfExportJob":
+        job = cls.__new__(cls)
+        job.id = doc["_id"]
+        for slot in cls.__slots__[1:]:
+            setattr(job, slot, doc.get(slot))
+        job.messages = job.messages or 0
+        job.pages = job.pages or 0
+        job.size_bytes = job.size_bytes or 0
+        return job
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "conversation_id": self.conversation_id,
+            "status": self.status,
+            "progress": {"messages": self.messages, "pages": self.pages},
+            "size_bytes": self.size_bytes,
+            "error": self.error,
+            "created_at": IndonesiaDatetime.format(self.created_at),
+            "finished_at": IndonesiaDatetime.format(self.finished_at) if self.finished_at else None,
+            "timezone": "WIB"
+        }
+
+class PdfExportManager:
+    """Export PDF di background: layout dan kompresi halaman di ProcessPoolExecutor
+
+    Job membaca pesan per batch dari cursor Mongo, mengirim setiap batch ke
+    proses worker (layout_batch) dan menulis halaman yang sudah jadi ke file
+    sementara. Event loop hanya menunggu future, jadi export besar tidak
+    menambah latensi chat. Jumlah export yang dirender bersamaan dibatasi
+    semaphore, dan antrean dibatasi CHAT_PDF_EXPORT_MAX_PENDING.
+
+    Status job disimpan di collection `export_jobs` (TTL index pada
+    expires_at), jadi GET status/download bisa dilayani worker mana pun.
+    Rendering tetap berjalan di worker yang menerima job, dan batas antrean
+    dihitung per worker. File PDF ditulis ke CHAT_EXPORT_DIR: worker di satu
+    host berbagi direktori default, deployment multi-host harus mengarahkannya
+    ke storage bersama agar download tidak 410. File dihapus setelah TTL oleh
+    worker yang membuatnya.
+    """
+
+    def __init__(
+        self,
+        chat_service,
+        workers: Optional[int] = None,
+        max_concurrent: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        export_dir: Optional[str] = None
+    ):
+        self.chat_service = chat_service
+        self.collection = chat_service.db[EXPORT_JOBS_COLLECTION]
+        self.workers = workers or int(os.getenv("CHAT_PDF_EXPORT_WORKERS", "2"))
+        self.max_concurrent = max_concurrent or int(os.getenv("CHAT_PDF_EXPORT_MAX_CONCURRENT", str(self.workers)))
+        self.max_pending = max_pending or int(os.getenv("CHAT_PDF_EXPORT_MAX_PENDING", "20"))
+        self.batch_size = batch_size or int(os.getenv("CHAT_PDF_EXPORT_BATCH_SIZE", "500"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("CHAT_PDF_EXPORT_TTL_SECONDS", "3600"))
+        self.export_dir = export_dir or os.getenv("CHAT_EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "lunance_exports")
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[str, PdfExportJob] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.metrics = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # spawn: worker tidak mewarisi event loop, socket Mongo, atau thread dari proses utama
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _reset_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def submit(self, user_id: str, conversation) -> Optional[PdfExportJob]:
+        """Antrekan export; None jika antrean worker ini penuh"""
+        self._prune()
+        if sum(1 for job in self._jobs.values() if job.active) >= self.max_pending:
+            self.metrics["rejected"] += 1
+            return None
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        job = PdfExportJob(user_id, conversation.id, conversation.title or "Chat Baru")
+        # Job yang worker-nya mati tanpa stop() tetap hilang lewat TTL
+        job.expires_at = job.created_at + timedelta(seconds=self.ttl_seconds)
+        await self.collection.insert_one(job.to_doc())
+        self._jobs[job.id] = job
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.metrics["submitted"] += 1
+        return job
+
+    async def get_job(self, job_id: str, user_id: str) -> Optional[PdfExportJob]:
+        """Job milik user; registry lokal dulu (progress terbaru), lalu MongoDB"""
+        self._prune()
+        job = self._jobs.get(job_id)
+        if job is None:
+            doc = await self.collection.find_one({"_id": job_id, "user_id": user_id})
+            if doc is None:
+                return None
+            job = PdfExportJob.from_doc(doc)
+        if job.user_id != user_id:
+            return None
+        if job.expires_at is not None and job.expires_at < now_for_db():
+            # TTL monitor MongoDB berjalan per menit; job kedaluwarsa dianggap sudah hilang
+            return None
+        return job
+
+    def file_available(self, job: PdfExportJob) -> bool:
+        """False jika file ada di host lain (CHAT_EXPORT_DIR tidak dibagi) atau sudah dihapus"""
+        return bool(job.path) and os.path.exists(job.path)
+
+    async def _save(self, job: PdfExportJob, *fields: str):
+        """Persist field job; kegagalan hanya di-log agar rendering tetap berjalan"""
+        try:
+            await self.collection.update_one(
+                {"_id": job.id}, {"$set": {field: getattr(job, field) for field in fields}}
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Could not persist PDF export job {job.id}: {e}")
+
+    @staticmethod
+    def _row(doc: Dict[str, Any]):
+        sender = SENDER_LABELS.get(doc.get("sender_type"), doc.get("sender_type") or "-")
+        timestamp = IndonesiaDatetime.format(doc["timestamp"]) if doc.get("timestamp") else "-"
+        return timestamp, sender, doc.get("content", "")
+
+    async def _render(self, job: PdfExportJob, handle):
+        loop = asyncio.get_running_loop()
+        writer = PdfFileWriter(handle, job.title)
+        carry: List[str] = [
+            job.title,
+            f"Diekspor: {IndonesiaDatetime.format(IndonesiaDatetime.now())} (Asia/Jakarta, WIB/GMT+7)",
+            "=" * 60,
+            ""
+        ]
+        rows = []
+
+        async def render_batch(final: bool):
+            nonlocal carry, rows
+            pages, carry = await loop.run_in_executor(self._get_pool(), layout_batch, rows, carry, final)
+            writer.add_pages(pages)
+            job.messages += len(rows)
+            job.pages += len(pages)
+            rows = []
+            # Progress juga memperpanjang TTL agar export panjang tidak kedaluwarsa saat berjalan
+            job.expires_at = now_for_db() + timedelta(seconds=self.ttl_seconds)
+            await self._save(job, "messages", "pages", "expires_at")
+
+        async for doc in self.chat_service.iter_conversation_messages(job.conversation_id, batch_size=self.batch_size):
+            rows.append(self._row(doc))
+            if len(rows) >= self.batch_size:
+                await render_batch(final=False)
+        await render_batch(final=True)
+        writer.close()
+
+    async def _run(self, job: PdfExportJob):
+        async with self._semaphore:
+            job.status = "running"
+            await self._save(job, "status")
+            os.makedirs(self.export_dir, exist_ok=True)
+            path = os.path.join(self.export_dir, f"{job.id}.pdf")
+            started = time.perf_counter()
+            try:
+                with open(path + ".partial", "wb") as handle:
+                    await self._render(job, handle)
+                os.replace(path + ".partial", path)
+                job.path = path
+                job.size_bytes = os.path.getsize(path)
+                job.status = "completed"
+                self.metrics["completed"] += 1
+                logger.info(
+                    f"📄 PDF export {job.id} completed: {job.messages} messages, {job.pages} pages "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+            except asyncio.CancelledError:
+                self._remove_file(path + ".partial")
+                raise
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._reset_pool()
+                self._remove_file(path + ".partial")
+                job.status = "failed"
+                job.error = "Gagal membuat PDF"
+                self.metrics["failed"] += 1
+                logger.error(f"❌ PDF export {job.id} failed: {e}")
+            finally:
+                job.finished_at = now_for_db()
+                job.expires_at = job.finished_at + timedelta(seconds=self.ttl_seconds)
+                if not job.active:
+                    await self._save(
+                        job, "status", "messages", "pages", "path", "size_bytes",
+                        "error", "finished_at", "expires_at"
+                    )
+
+    @staticmethod
+    def _remove_file(path: Optional[str]):
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"⚠️ Could not remove export file {path}: {e}")
+
+    def _prune(self):
+        now = now_for_db()
+        for job_id, job in list(self._jobs.items()):
+            if job.expires_at is not None and job.expires_at < now:
+                self._remove_file(job.path)
+                del self._jobs[job_id]
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._reset_pool()
+        active = [job.id for job in self._jobs.values() if job.active]
+        if active:
+            # Job yang terputus shutdown tidak akan pernah selesai di worker lain
+            try:
+                await self.collection.update_many(
+                    {"_id": {"$in": active}},
+                    {"$set": {"status": "failed", "error": "Export dihentikan saat server restart", "finished_at": now_for_db()}}
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Could not mark {len(active)} PDF export jobs as failed: {e}")
+        for job in self._jobs.values():
+            self._remove_file(job.path)
+        self._jobs.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "active": sum(1 for job in self._jobs.values() if job.active),
+            "jobs": len(self._jobs),
+            "workers": self.workers,
+            "max_concurrent": self.max_concurrent,
+            "max_pending": self.max_pending
+        }
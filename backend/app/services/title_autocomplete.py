@@ -0,0 +1,181 @@
+# app/services/title_autocomplete.py - Autocomplete title percakapan per user (in-memory prefix index)
+import asyncio
+import heapq
+import logging
+import os
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..config.database import get_async_database
+from ..config.db_monitoring import instrument_db_calls
+from ..models.chat import ConversationStatus
+from ..utils.indonesian_text import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Range prefix yang lebih lebar dari (limit x faktor ini) dijawab dengan menelusuri title terbaru dulu
+DENSE_RANGE_FACTOR = 32
+
+def normalize_title(text: str) -> str:
+    """Lowercase, tanpa diakritik dan tanda baca, spasi tunggal"""
+    return " ".join(word for word, _, _ in tokenize(text))
+
+class TitlePrefixIndex:
+    """Prefix index title milik satu user
+
+    Setiap title disimpan sebagai beberapa key, satu per posisi kata ("uang kos
+    bulan", "kos bulan", "bulan"), dalam list terurut; prefix lookup adalah satu
+    bisect untuk batas range, lalu top-k berdasarkan updated_at di dalam range.
+    `titles` berurutan dari yang paling lama diupdate, sehingga prefix yang
+    sangat umum dijawab dengan menelusuri title terbaru sampai dapat k hasil.
+    """
+
+    __slots__ = ("keys", "titles", "built_at")
+
+    def __init__(self):
+        self.keys: List[Tuple[str, str]] = []
+        self.titles: "OrderedDict[str, Tuple[str, datetime, List[str]]]" = OrderedDict()
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _word_keys(title: str) -> List[str]:
+        words = normalize_title(title).split(" ")
+        return sorted({" ".join(words[i:]) for i in range(len(words)) if words[i]})
+
+    def upsert(self, conversation_id: str, title: str, updated_at: datetime):
+        current = self.titles.get(conversation_id)
+        if current and current[0] == title:
+            # Title sama: cukup perbarui recency
+            self.titles[conversation_id] = (title, updated_at, current[2])
+            self.titles.move_to_end(conversation_id)
+            return
+        self.remove(conversation_id)
+        word_keys = self._word_keys(title)
+        for key in word_keys:
+            insort(self.keys, (key, conversation_id))
+        self.titles[conversation_id] = (title, updated_at, word_keys)
+
+    def remove(self, conversation_id: str):
+        current = self.titles.pop(conversation_id, None)
+        if not current:
+            return
+        for key in current[2]:
+            position = bisect_left(self.keys, (key, conversation_id))
+            if position < len(self.keys) and self.keys[position] == (key, conversation_id):
+                del self.keys[position]
+
+    def search(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return []
+
+        # Semua key berawalan `prefix` berada di [lo, hi) karena list terurut
+        lo = bisect_left(self.keys, (prefix, ""))
+        hi = bisect_left(self.keys, (prefix + "\uffff", ""), lo)
+        if hi - lo > limit * DENSE_RANGE_FACTOR:
+            top = []
+            for conversation_id in reversed(self.titles):
+                if any(key.startswith(prefix) for key in self.titles[conversation_id][2]):
+                    top.append(conversation_id)
+                    if len(top) == limit:
+                        break
+        else:
+            matches = {conversation_id for _, conversation_id in self.keys[lo:hi]}
+            top = heapq.nlargest(limit, matches, key=lambda conversation_id: self.titles[conversation_id][1])
+        return [
+            {"id": conversation_id, "title": self.titles[conversation_id][0], "updated_at": self.titles[conversation_id][1]}
+            for conversation_id in top
+        ]
+
+@instrument_db_calls
+class TitleAutocompleteService:
+    """LRU prefix index per user, dibangun lazily dari Mongo
+
+    Index user yang terhubung lewat WebSocket tetap hangat; evict() dipanggil
+    saat disconnect. Perubahan title dari write path di worker ini diterapkan
+    langsung; perubahan dari worker lain terlihat setelah TTL habis.
+    """
+
+    def __init__(self, db=None, max_users: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.db = db if db is not None else get_async_database()
+        self.max_users = max_users or int(os.getenv("CHAT_AUTOCOMPLETE_MAX_USERS", "1000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("CHAT_AUTOCOMPLETE_TTL_SECONDS", "300"))
+        self._indexes: "OrderedDict[str, TitlePrefixIndex]" = OrderedDict()
+        self._build_locks: Dict[str, asyncio.Lock] = {}
+
+    def _loaded(self, user_id: str) -> Optional[TitlePrefixIndex]:
+        title_index = self._indexes.get(user_id)
+        if title_index is None:
+            return None
+        if time.monotonic() - title_index.built_at > self.ttl_seconds:
+            del self._indexes[user_id]
+            return None
+        self._indexes.move_to_end(user_id)
+        return title_index
+
+    async def _get_index(self, user_id: str) -> TitlePrefixIndex:
+        title_index = self._loaded(user_id)
+        if title_index is not None:
+            return title_index
+
+        lock = self._build_locks.setdefault(user_id, asyncio.Lock())
+        try:
+            async with lock:
+                title_index = self._loaded(user_id)
+                if title_index is None:
+                    title_index = await self._build(user_id)
+                    self._indexes[user_id] = title_index
+                    while len(self._indexes) > self.max_users:
+                        self._indexes.popitem(last=False)
+                return title_index
+        finally:
+            if not lock.locked():
+                self._build_locks.pop(user_id, None)
+
+    async def _build(self, user_id: str) -> TitlePrefixIndex:
+        title_index = TitlePrefixIndex()
+        cursor = self.db.conversations.find(
+            {
+                "user_id": user_id,
+                "status": {"$in": [ConversationStatus.ACTIVE.value, None]},
+                "title": {"$nin": [None, ""]}
+            },
+            {"title": 1, "updated_at": 1},
+            sort=[("updated_at", 1)]
+        )
+        async for doc in cursor:
+            title_index.upsert(str(doc["_id"]), doc["title"], doc.get("updated_at") or datetime.min)
+        return title_index
+
+    async def complete(self, user_id: str, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Top-k title percakapan aktif yang punya kata berawalan `prefix`, terbaru dulu"""
+        title_index = await self._get_index(user_id)
+        return title_index.search(prefix, limit)
+
+    def on_title_changed(self, user_id: str, conversation_id: str, title: Optional[str], updated_at: datetime):
+        """Dipanggil write path; hanya berlaku jika index user sedang dimuat"""
+        title_index = self._indexes.get(user_id)
+        if title_index is None:
+            return
+        if title:
+            title_index.upsert(conversation_id, title, updated_at)
+        else:
+            title_index.remove(conversation_id)
+
+    def on_conversation_removed(self, user_id: str, conversation_id: str):
+        title_index = self._indexes.get(user_id)
+        if title_index is not None:
+            title_index.remove(conversation_id)
+
+    def evict(self, user_id: str):
+        self._indexes.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._indexes),
+            "max_users": self.max_users,
+            "titles": sum(len(title_index.titles) for title_index in self._indexes.values())
+        }
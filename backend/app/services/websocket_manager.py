@@ -1,173 +1,429 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Optional
-import json
+from collections import deque
+from typing import Callable, Dict, List, Optional, Union
 import asyncio
+import logging
+import os
+import time
 from datetime import datetime
 
-from ..models.chat import WSMessage, WSMessageType
+from ..models.chat import WSMessageType
+from .ws_backplane import ALL_USERS, Backplane, Envelope
+from .ws_frames import Frame, MSGPACK_SUBPROTOCOL, decode_json, decode_msgpack, negotiate_subprotocol
+
+logger = logging.getLogger(__name__)
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce_typing", "disconnect")
+# Frame siap kirim atau dict event (di-encode saat masuk antrean)
+Outgoing = Union[Frame, dict]
+
+class Connection:
+    """Satu socket (satu device) milik user
+
+    queue dan writer dibuat saat ada frame yang dikirim dan dilepas lagi saat
+    antrean kosong, jadi socket yang idle tidak memegang task.
+    """
+
+    __slots__ = (
+        "websocket", "user_id", "connected_at", "last_activity", "is_typing",
+        "queue", "writer", "over_high_water_since", "dropped", "binary"
+    )
+
+    def __init__(self, websocket: WebSocket, user_id: str, binary: bool = False):
+        now = datetime.utcnow()
+        self.websocket = websocket
+        self.user_id = user_id
+        self.connected_at = now
+        self.last_activity = now
+        self.is_typing = False
+        self.queue: Optional["deque[Frame]"] = None
+        self.writer: Optional[asyncio.Task] = None
+        self.over_high_water_since: Optional[float] = None
+        self.dropped = 0
+        # True jika client memilih subprotocol MessagePack
+        self.binary = binary
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue) if self.queue else 0
 
 class WebSocketManager:
-    """Manager untuk mengelola WebSocket connections"""
-    
+    """Registry WebSocket: user_id -> Connection semua device user
+
+    Koneksi per user disimpan dalam list kecil (jumlah device sedikit; list
+    satu elemen jauh lebih hemat memori dibanding set).
+
+    Pesan ke user dikirim ke setiap device-nya. Setiap socket punya antrean
+    keluar terbatas yang dikosongkan oleh satu writer task, sehingga client
+    lambat tidak menahan pengiriman ke socket lain. Saat antrean penuh frame
+    terlama dibuang; CHAT_WS_SLOW_CONSUMER_POLICY menambah perilaku:
+    - drop_oldest: hanya itu.
+    - coalesce_typing: frame typing dari pengirim yang sama menggantikan frame
+      typing yang masih antre (hanya status terakhir yang relevan).
+    - disconnect: socket ditutup jika antrean berada di atas high-water mark
+      lebih lama dari CHAT_WS_SLOW_DISCONNECT_SECONDS.
+    Event di-encode sekali menjadi Frame lalu objek yang sama diantrekan ke
+    semua socket penerima (broadcast tidak membayar json.dumps per socket).
+    Client yang menawarkan subprotocol lunance.msgpack.v1 menerima frame biner
+    [kode tipe, data, epoch ms] (lihat ws_frames); JSON tetap default.
+    Socket yang gagal dikirimi hanya melepas koneksi itu sendiri. Listener on_connect/on_disconnect
+    dipanggil sekali per socket, jadi state per user yang memakai refcount
+    (mis. ChatService.on_user_connected) tetap seimbang di semua jalur putus.
+
+    Dengan backplane (beberapa worker), deliver() mengirim ke socket lokal dan
+    mem-publish satu envelope untuk semua target: device user bisa tersebar di
+    worker lain. Worker penerima hanya mengirim ke socket miliknya sendiri.
+    send_to_user() selalu lokal saja (dipakai change stream yang sudah berjalan
+    di setiap worker).
+    """
+
     def __init__(self):
-        # Active connections: user_id -> WebSocket
-        self.active_connections: Dict[str, WebSocket] = {}
-        # User typing status: user_id -> is_typing
-        self.typing_status: Dict[str, bool] = {}
-        # Connection metadata: user_id -> connection_info
-        self.connection_info: Dict[str, dict] = {}
-    
-    async def connect(self, websocket: WebSocket, user_id: str):
-        """Accept new WebSocket connection"""
-        await websocket.accept()
-        
-        # Store connection
-        self.active_connections[user_id] = websocket
-        self.typing_status[user_id] = False
-        self.connection_info[user_id] = {
-            "connected_at": datetime.utcnow(),
-            "last_activity": datetime.utcnow()
-        }
-        
-        # Send connection success message
-        await self.send_personal_message(
-            user_id=user_id,
-            message_type=WSMessageType.SUCCESS,
-            data={"message": "Connected to Luna chat successfully"}
-        )
-        
-        print(f"📱 User {user_id} connected to WebSocket")
-    
-    def disconnect(self, user_id: str):
-        """Remove user connection"""
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-        
-        if user_id in self.typing_status:
-            del self.typing_status[user_id]
-            
-        if user_id in self.connection_info:
-            del self.connection_info[user_id]
-        
-        print(f"📱 User {user_id} disconnected from WebSocket")
-    
-    async def send_personal_message(
-        self, 
-        user_id: str, 
-        message_type: WSMessageType, 
-        data: dict
+        self.connections: Dict[str, List[Connection]] = {}
+        self._connect_listeners: List[Callable[[str], None]] = []
+        self._disconnect_listeners: List[Callable[[str], None]] = []
+        self.backplane: Optional[Backplane] = None
+
+        self.queue_size = int(os.getenv("CHAT_WS_SEND_QUEUE_SIZE", "256"))
+        self.high_water = int(os.getenv("CHAT_WS_SEND_QUEUE_HIGH_WATER", str(self.queue_size * 3 // 4)))
+        self.slow_disconnect_seconds = float(os.getenv("CHAT_WS_SLOW_DISCONNECT_SECONDS", "10"))
+        self.policy = os.getenv("CHAT_WS_SLOW_CONSUMER_POLICY", "coalesce_typing")
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            logger.warning(f"⚠️ Unknown CHAT_WS_SLOW_CONSUMER_POLICY '{self.policy}', using drop_oldest")
+            self.policy = "drop_oldest"
+        self.metrics = {"queued": 0, "sent": 0, "dropped": 0, "coalesced": 0, "slow_disconnects": 0, "send_errors": 0}
+
+    def add_listener(
+        self,
+        on_connect: Optional[Callable[[str], None]] = None,
+        on_disconnect: Optional[Callable[[str], None]] = None
     ):
-        """Send message to specific user"""
-        if user_id not in self.active_connections:
-            return False
-        
-        websocket = self.active_connections[user_id]
-        
-        message = {
+        """Daftarkan hook per socket (dipanggil dengan user_id)"""
+        if on_connect:
+            self._connect_listeners.append(on_connect)
+        if on_disconnect:
+            self._disconnect_listeners.append(on_disconnect)
+
+    @staticmethod
+    def build_message(message_type: WSMessageType, data: dict) -> dict:
+        return {
             "type": message_type.value,
             "data": data,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
-        
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> Connection:
+        """Accept new WebSocket connection; device lain milik user tetap terhubung"""
+        subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols") or [])
+        await websocket.accept(subprotocol=subprotocol)
+
+        connection = Connection(websocket, user_id, binary=subprotocol == MSGPACK_SUBPROTOCOL)
+        self.connections.setdefault(user_id, []).append(connection)
+        for listener in self._connect_listeners:
+            listener(user_id)
+
+        await self.send(connection, self.build_message(
+            WSMessageType.SUCCESS,
+            {"message": "Connected to Luna chat successfully", "protocol": "msgpack" if connection.binary else "json"}
+        ))
+
+        logger.info(
+            f"📱 User {user_id} connected to WebSocket "
+            f"({len(self.connections.get(user_id, ()))} devices, {'msgpack' if connection.binary else 'json'})"
+        )
+        return connection
+
+    def disconnect(self, connection: Connection) -> bool:
+        """Lepas satu socket; aman dipanggil berulang. True jika socket terakhir user"""
+        user_connections = self.connections.get(connection.user_id)
+        if not user_connections or connection not in user_connections:
+            return False
+
+        user_connections.remove(connection)
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        connection.writer = None
+        connection.queue = None
+        last = not user_connections
+        if last:
+            del self.connections[connection.user_id]
+        for listener in self._disconnect_listeners:
+            listener(connection.user_id)
+
+        logger.info(f"📱 User {connection.user_id} disconnected from WebSocket")
+        return last
+
+    async def close(self, connection: Connection, code: int = 1000, reason: str = "", drain_timeout: float = 1.0):
+        """Tutup satu socket setelah frame yang masih antre (mis. error terakhir) terkirim
+
+        disconnect() membatalkan writer, jadi tanpa menunggu writer dulu frame
+        terakhir hilang. Writer ditunggu paling lama drain_timeout detik.
+        """
+        writer = connection.writer
+        if writer is not None and writer is not asyncio.current_task():
+            await asyncio.wait([writer], timeout=drain_timeout)
+        try:
+            await connection.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+        self.disconnect(connection)
+
+    async def receive(self, connection: Connection) -> dict:
+        """Pesan berikutnya dari client sebagai dict {type, data}; WebSocketDisconnect saat socket ditutup"""
+        message = await connection.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("bytes") is not None:
+            payload = message["bytes"]
+            return decode_msgpack(payload) if connection.binary else decode_json(payload)
+        return decode_json(message["text"])
+
+    async def send(self, connection: Connection, message: Outgoing) -> bool:
+        """Antrekan frame untuk satu device; False jika socket sudah dilepas"""
+        return self._enqueue(connection, Frame.of(message))
+
+    def _enqueue(self, connection: Connection, frame: Frame) -> bool:
+        user_connections = self.connections.get(connection.user_id)
+        if not user_connections or connection not in user_connections:
+            return False
+
+        if connection.queue is None:
+            connection.queue = deque()
+        queue = connection.queue
+
+        if self.policy == "coalesce_typing" and frame.typing_sender is not None:
+            for index, queued in enumerate(queue):
+                if queued.typing_sender == frame.typing_sender:
+                    queue[index] = frame
+                    self.metrics["coalesced"] += 1
+                    return True
+
+        if len(queue) >= self.queue_size:
+            queue.popleft()
+            connection.dropped += 1
+            self.metrics["dropped"] += 1
+        queue.append(frame)
+        self.metrics["queued"] += 1
+
+        if len(queue) >= self.high_water:
+            now = time.monotonic()
+            if connection.over_high_water_since is None:
+                connection.over_high_water_since = now
+            elif self.policy == "disconnect" and now - connection.over_high_water_since > self.slow_disconnect_seconds:
+                self._drop_slow_consumer(connection)
+                return False
+
+        if connection.writer is None:
+            connection.writer = asyncio.get_running_loop().create_task(self._write(connection))
+        return True
+
+    async def _write(self, connection: Connection):
+        """Writer per socket: kirim frame berurutan sampai antrean kosong"""
         try:
-            await websocket.send_text(json.dumps(message))
-            
-            # Update last activity
-            if user_id in self.connection_info:
-                self.connection_info[user_id]["last_activity"] = datetime.utcnow()
-            
-            return True
+            while connection.queue:
+                frame = connection.queue.popleft()
+                if connection.binary:
+                    await connection.websocket.send_bytes(frame.binary)
+                else:
+                    await connection.websocket.send_text(frame.text)
+                self.metrics["sent"] += 1
+                connection.last_activity = datetime.utcnow()
+                if connection.over_high_water_since is not None and connection.depth < self.high_water:
+                    connection.over_high_water_since = None
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"❌ Error sending message to {user_id}: {e}")
-            # Remove broken connection
-            self.disconnect(user_id)
+            self.metrics["send_errors"] += 1
+            logger.warning(f"⚠️ Error sending message to {connection.user_id}: {e}")
+            self.disconnect(connection)
+        finally:
+            if connection.writer is asyncio.current_task():
+                connection.writer = None
+                if not connection.queue:
+                    connection.queue = None
+
+    def _drop_slow_consumer(self, connection: Connection):
+        self.metrics["slow_disconnects"] += 1
+        logger.warning(
+            f"🐢 Closing slow WebSocket for {connection.user_id} "
+            f"({connection.depth} frames queued for > {self.slow_disconnect_seconds:g}s)"
+        )
+        self.disconnect(connection)
+
+        async def close():
+            try:
+                # 1013: try again later
+                await connection.websocket.close(code=1013, reason="Slow consumer")
+            except Exception:
+                pass
+        asyncio.get_running_loop().create_task(close())
+
+    async def drain(self, timeout: float = 2.0):
+        """Tunggu writer semua socket selesai (mis. sebelum shutdown)"""
+        writers = [
+            connection.writer
+            for user_connections in self.connections.values()
+            for connection in user_connections
+            if connection.writer is not None
+        ]
+        if writers:
+            await asyncio.wait(writers, timeout=timeout)
+
+    async def start_backplane(self, backplane: Backplane):
+        try:
+            await backplane.start(self._deliver_remote)
+        except Exception:
+            await backplane.stop()
+            raise
+        self.backplane = backplane
+
+    async def stop_backplane(self):
+        if self.backplane is not None:
+            await self.backplane.stop()
+            self.backplane = None
+
+    async def _deliver_remote(self, batch: List[Envelope]):
+        """Batch envelope dari worker lain: antrekan ke socket lokal saja
+
+        Tidak ada await per socket: _enqueue hanya menaruh frame di antrean
+        dan writer per socket yang mengirim, jadi satu batch selesai dalam
+        satu putaran tanpa gather.
+        """
+        for envelope in batch:
+            frame = Frame.from_text(envelope["t"], envelope.get("k"))
+            targets = self.connections if envelope["u"] == ALL_USERS else envelope["u"]
+            for user_id in list(targets):
+                for connection in list(self.connections.get(user_id, ())):
+                    self._enqueue(connection, frame)
+
+    async def deliver(self, user_ids: List[str], message: Outgoing) -> bool:
+        """Kirim ke semua device user_ids di semua worker; True jika terkirim lokal atau di-publish"""
+        frame = Frame.of(message)
+        if self.backplane is not None:
+            self.backplane.publish(list(user_ids), frame)
+
+        sent = False
+        for user_id in user_ids:
+            if user_id in self.connections:
+                sent = await self.send_to_user(user_id, frame) or sent
+        return sent or self.backplane is not None
+
+    async def send_to_user(self, user_id: str, message: Outgoing) -> bool:
+        """Kirim frame yang sudah jadi ke semua device user di worker ini; True jika minimal satu berhasil"""
+        user_connections = self.connections.get(user_id)
+        if not user_connections:
             return False
-    
+
+        frame = Frame.of(message)
+        sent = False
+        for connection in list(user_connections):
+            sent = self._enqueue(connection, frame) or sent
+        return sent
+
+    async def send_personal_message(
+        self,
+        user_id: str,
+        message_type: WSMessageType,
+        data: dict
+    ) -> bool:
+        """Send message to specific user (semua device, semua worker)"""
+        return await self.deliver([user_id], self.build_message(message_type, data))
+
     async def broadcast_to_users(
-        self, 
-        user_ids: List[str], 
-        message_type: WSMessageType, 
+        self,
+        user_ids: List[str],
+        message_type: WSMessageType,
         data: dict
     ):
         """Broadcast message to multiple users"""
-        tasks = []
-        for user_id in user_ids:
-            task = self.send_personal_message(user_id, message_type, data)
-            tasks.append(task)
-        
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
-    
+        await self.deliver(user_ids, self.build_message(message_type, data))
+
     async def broadcast_to_all(self, message_type: WSMessageType, data: dict):
-        """Broadcast message to all connected users"""
-        if not self.active_connections:
-            return
-        
-        user_ids = list(self.active_connections.keys())
-        await self.broadcast_to_users(user_ids, message_type, data)
-    
+        """Broadcast message to all connected users (semua worker)"""
+        frame = Frame(self.build_message(message_type, data))
+        if self.backplane is not None:
+            self.backplane.publish(ALL_USERS, frame)
+        for user_connections in list(self.connections.values()):
+            for connection in list(user_connections):
+                self._enqueue(connection, frame)
+
     def is_connected(self, user_id: str) -> bool:
-        """Check if user is connected"""
-        return user_id in self.active_connections
-    
+        """Check if user is connected (device mana pun)"""
+        return user_id in self.connections
+
     def get_connected_users(self) -> List[str]:
         """Get list of connected user IDs"""
-        return list(self.active_connections.keys())
-    
+        return list(self.connections.keys())
+
     def get_connection_count(self) -> int:
-        """Get total number of active connections"""
-        return len(self.active_connections)
-    
-    async def set_typing_status(self, user_id: str, is_typing: bool):
-        """Set typing status for user"""
-        if user_id in self.typing_status:
-            self.typing_status[user_id] = is_typing
-    
+        """Get total number of active sockets"""
+        return sum(len(user_connections) for user_connections in self.connections.values())
+
+    def set_typing_status(self, connection: Connection, is_typing: bool):
+        """Set typing status untuk satu device"""
+        connection.is_typing = is_typing
+
     def get_typing_status(self, user_id: str) -> bool:
-        """Get typing status for user"""
-        return self.typing_status.get(user_id, False)
-    
-    async def handle_ping(self, user_id: str):
+        """True jika user sedang mengetik di salah satu device"""
+        return any(connection.is_typing for connection in self.connections.get(user_id, ()))
+
+    async def handle_ping(self, connection: Connection):
         """Handle ping message to keep connection alive"""
-        await self.send_personal_message(
-            user_id=user_id,
-            message_type=WSMessageType.SUCCESS,
-            data={"message": "pong", "type": "pong"}
-        )
-    
+        await self.send(connection, self.build_message(
+            WSMessageType.SUCCESS, {"message": "pong", "type": "pong"}
+        ))
+
     async def cleanup_inactive_connections(self, timeout_minutes: int = 30):
         """Remove connections that have been inactive for too long"""
         current_time = datetime.utcnow()
-        inactive_users = []
-        
-        for user_id, info in self.connection_info.items():
-            last_activity = info.get("last_activity", current_time)
-            if (current_time - last_activity).total_seconds() > (timeout_minutes * 60):
-                inactive_users.append(user_id)
-        
-        for user_id in inactive_users:
-            print(f"🧹 Cleaning up inactive connection for user {user_id}")
-            if user_id in self.active_connections:
-                try:
-                    await self.active_connections[user_id].close()
-                except:
-                    pass
-            self.disconnect(user_id)
-    
+        inactive = [
+            connection
+            for user_connections in self.connections.values()
+            for connection in user_connections
+            if (current_time - connection.last_activity).total_seconds() > timeout_minutes * 60
+        ]
+
+        for connection in inactive:
+            logger.info(f"🧹 Cleaning up inactive connection for user {connection.user_id}")
+            try:
+                await connection.websocket.close()
+            except Exception:
+                pass
+            self.disconnect(connection)
+
     def get_connection_stats(self) -> dict:
         """Get connection statistics"""
         return {
             "total_connections": self.get_connection_count(),
-            "connected_users": self.get_connected_users(),
+            "connected_users": len(self.connections),
             "typing_users": [
-                user_id for user_id, is_typing in self.typing_status.items() 
-                if is_typing
-            ]
+                user_id for user_id in self.connections if self.get_typing_status(user_id)
+            ],
+            "msgpack_connections": sum(
+                1 for user_connections in self.connections.values() for connection in user_connections if connection.binary
+            ),
+            "send_queues": self.get_queue_stats()
         }
-    
+
+    def get_queue_stats(self) -> dict:
+        """Kedalaman antrean keluar dan jumlah frame yang dibuang"""
+        depths = [
+            connection.depth
+            for user_connections in self.connections.values()
+            for connection in user_connections
+        ]
+        return {
+            **self.metrics,
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "high_water": self.high_water,
+            "queued_frames": sum(depths),
+            "max_depth": max(depths, default=0),
+            "backlogged_connections": sum(1 for depth in depths if depth >= self.high_water)
+        }
+
     async def send_chat_message_to_user(
-        self, 
-        user_id: str, 
+        self,
+        user_id: str,
         message_data: dict
     ):
         """Send chat message to specific user"""
@@ -176,11 +432,11 @@ class WebSocketManager:
             message_type=WSMessageType.CHAT_MESSAGE,
             data={"message": message_data}
         )
-    
+
     async def send_typing_indicator(
-        self, 
-        user_id: str, 
-        sender: str, 
+        self,
+        user_id: str,
+        sender: str,
         is_typing: bool
     ):
         """Send typing indicator to user"""
@@ -190,7 +446,11 @@ class WebSocketManager:
             message_type=message_type,
             data={"sender": sender}
         )
-    
+
+    async def send_error(self, connection: Connection, error_message: str):
+        """Send error message ke device pengirim"""
+        return await self.send(connection, self.build_message(WSMessageType.ERROR, {"message": error_message}))
+
     async def send_error_to_user(self, user_id: str, error_message: str):
         """Send error message to user"""
         return await self.send_personal_message(
@@ -198,7 +458,7 @@ class WebSocketManager:
             message_type=WSMessageType.ERROR,
             data={"message": error_message}
         )
-    
+
     async def send_success_to_user(self, user_id: str, success_message: str):
         """Send success message to user"""
         return await self.send_personal_message(
@@ -206,48 +466,50 @@ class WebSocketManager:
             message_type=WSMessageType.SUCCESS,
             data={"message": success_message}
         )
-    
-    async def handle_message_received(self, user_id: str, message_data: dict):
-        """Handle incoming message from user"""
+
+    async def handle_message_received(self, connection: Connection, message_data: dict):
+        """Handle incoming message from user (ping / status mengetik per device)"""
         message_type = message_data.get("type")
         data = message_data.get("data", {})
-        
-        # Update last activity
-        if user_id in self.connection_info:
-            self.connection_info[user_id]["last_activity"] = datetime.utcnow()
-        
+
+        connection.last_activity = datetime.utcnow()
+
         if message_type == "ping":
-            await self.handle_ping(user_id)
-        elif message_type == "typing_start":
-            await self.set_typing_status(user_id, True)
-        elif message_type == "typing_stop":
-            await self.set_typing_status(user_id, False)
-        
+            await self.handle_ping(connection)
+        elif message_type == WSMessageType.TYPING_START:
+            self.set_typing_status(connection, True)
+        elif message_type == WSMessageType.TYPING_STOP:
+            self.set_typing_status(connection, False)
+
         return {
             "type": message_type,
             "data": data,
-            "user_id": user_id
+            "user_id": connection.user_id
         }
-    
+
     async def graceful_shutdown(self):
         """Gracefully close all connections"""
-        print("🔄 Shutting down WebSocket connections...")
-        
-        # Send shutdown notice to all users
-        await self.broadcast_to_all(
+        logger.info("🔄 Shutting down WebSocket connections...")
+
+        # Send shutdown notice ke socket worker ini saja (worker lain tetap berjalan)
+        notice = Frame(self.build_message(
             WSMessageType.SUCCESS,
             {"message": "Server is shutting down. Please reconnect in a moment."}
-        )
-        
+        ))
+        for user_id in list(self.connections):
+            await self.send_to_user(user_id, notice)
+        await self.drain()
+
         # Close all connections
-        for user_id, websocket in list(self.active_connections.items()):
-            try:
-                await websocket.close(code=1000, reason="Server shutdown")
-            except:
-                pass
-            self.disconnect(user_id)
-        
-        print("✅ All WebSocket connections closed")
+        for user_connections in list(self.connections.values()):
+            for connection in list(user_connections):
+                try:
+                    await connection.websocket.close(code=1000, reason="Server shutdown")
+                except Exception:
+                    pass
+                self.disconnect(connection)
+
+        logger.info("✅ All WebSocket connections closed")
 
 # Global instance
-websocket_manager = WebSocketManager()
\ No newline at end of file
+websocket_manager = WebSocketManager()
@@ -0,0 +1,189 @@
+# app/services/ws_backplane.py - Pub/sub backplane untuk fan-out WebSocket lintas worker
+import abc
+import asyncio
+import logging
+import os
+import random
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .ws_frames import Frame, decode_json, encode_json
+
+logger = logging.getLogger(__name__)
+
+# Envelope: {"o": worker asal, "u": [user_id] atau "*" (semua), "t": teks JSON frame,
+# "k": kunci coalesce typing atau null}. Teks dikirim apa adanya: tidak ada encode ulang frame.
+Envelope = Dict[str, Any]
+BatchHandler = Callable[[List[Envelope]], Awaitable[None]]
+
+ALL_USERS = "*"
+
+class Backplane(abc.ABC):
+    """Antarmuka backplane: publish envelope, terima batch envelope dari worker lain
+
+    publish() hanya mengantrekan; envelope dikumpulkan selama flush_ms (atau
+    sampai max_batch) lalu dikirim sebagai satu pesan pub/sub. Envelope milik
+    worker sendiri diabaikan saat diterima karena sudah dikirim lokal.
+    """
+
+    def __init__(self, flush_ms: Optional[float] = None, max_batch: Optional[int] = None):
+        self.worker_id = uuid.uuid4().hex
+        self.flush_seconds = (flush_ms if flush_ms is not None else float(os.getenv("CHAT_BACKPLANE_FLUSH_MS", "2"))) / 1000
+        self.max_batch = max_batch or int(os.getenv("CHAT_BACKPLANE_MAX_BATCH", "500"))
+        self._handler: Optional[BatchHandler] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.metrics = {"published": 0, "publish_batches": 0, "received": 0, "receive_batches": 0, "errors": 0}
+
+    async def start(self, handler: BatchHandler):
+        self._handler = handler
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        self._tasks.append(loop.create_task(self._publish_loop()))
+        await self._subscribe()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._queue = None
+
+    def publish(self, user_ids, frame: Frame):
+        """Antrekan frame untuk user_ids (list atau ALL_USERS) di worker lain"""
+        if self._queue is None:
+            return
+        self._queue.put_nowait({"o": self.worker_id, "u": user_ids, "t": frame.text, "k": frame.typing_sender})
+
+    async def _publish_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_seconds
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._send(encode_json(batch))
+                self.metrics["published"] += len(batch)
+                self.metrics["publish_batches"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.error(f"❌ Backplane publish failed ({len(batch)} events dropped): {e}")
+
+    async def _dispatch(self, payload):
+        try:
+            batch = [envelope for envelope in decode_json(payload) if envelope.get("o") != self.worker_id]
+        except (ValueError, TypeError, AttributeError) as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"⚠️ Invalid backplane payload: {e}")
+            return
+        if not batch:
+            return
+        self.metrics["received"] += len(batch)
+        self.metrics["receive_batches"] += 1
+        try:
+            await self._handler(batch)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.error(f"❌ Backplane delivery failed: {e}")
+
+    @abc.abstractmethod
+    async def _subscribe(self):
+        """Mulai menerima pesan channel dan teruskan setiap payload ke _dispatch()"""
+
+    @abc.abstractmethod
+    async def _send(self, payload: str):
+        """Publish satu payload (batch envelope) ke channel"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "backend": type(self).__name__,
+            "pending": self._queue.qsize() if self._queue is not None else 0
+        }
+
+class InProcessBackplane(Backplane):
+    """Backplane di memori: beberapa manager dalam satu proses saling terhubung per channel (untuk test/dev)"""
+
+    _channels: Dict[str, List["InProcessBackplane"]] = {}
+
+    def __init__(self, channel: str = "lunance:ws", **kwargs):
+        super().__init__(**kwargs)
+        self.channel = channel
+
+    async def _subscribe(self):
+        self._channels.setdefault(self.channel, []).append(self)
+
+    async def stop(self):
+        members = self._channels.get(self.channel, [])
+        if self in members:
+            members.remove(self)
+        await super().stop()
+
+    async def _send(self, payload: str):
+        await asyncio.gather(*(member._dispatch(payload) for member in list(self._channels.get(self.channel, ()))))
+
+class RedisBackplane(Backplane):
+    """Redis pub/sub: satu channel untuk semua worker, subscriber reconnect dengan backoff"""
+
+    def __init__(self, url: Optional[str] = None, channel: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.channel = channel or os.getenv("CHAT_BACKPLANE_CHANNEL", "lunance:ws")
+        self._redis = None
+
+    async def _subscribe(self):
+        import redis.asyncio as aioredis
+
+        self._redis = aioredis.from_url(self.url)
+        self._tasks.append(asyncio.get_running_loop().create_task(self._listen()))
+        logger.info(f"📡 Redis backplane subscribed to {self.channel}")
+
+    async def _listen(self):
+        backoff = 1.0
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        await self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.error(f"❌ Redis backplane subscription lost: {e}")
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+            backoff = min(backoff * 2, 30.0)
+
+    async def _send(self, payload: str):
+        await self._redis.publish(self.channel, payload)
+
+    async def stop(self):
+        await super().stop()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+def create_backplane_from_env() -> Optional[Backplane]:
+    """CHAT_BACKPLANE: none (default, satu worker) | redis | memory"""
+    backend = os.getenv("CHAT_BACKPLANE", "none").lower()
+    if backend == "redis":
+        return RedisBackplane()
+    if backend == "memory":
+        return InProcessBackplane()
+    return None
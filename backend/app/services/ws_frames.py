@@ -0,0 +1,141 @@
+# app/services/ws_frames.py - Frame WebSocket yang diserialisasi sekali untuk semua penerima
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Union
+
+import orjson
+
+from ..models.chat import WSMessageType
+
+try:
+    import msgpack
+except ImportError:  # tanpa msgpack subprotocol biner tidak ditawarkan, JSON tetap jalan
+    msgpack = None
+
+TYPING_TYPES = (WSMessageType.TYPING_START.value, WSMessageType.TYPING_STOP.value)
+
+MSGPACK_SUBPROTOCOL = "lunance.msgpack.v1"
+
+# Kode tipe untuk subprotocol MessagePack; nilai yang sudah ada tidak boleh diubah
+WS_TYPE_CODES: Dict[str, int] = {
+    WSMessageType.CHAT_MESSAGE.value: 1,
+    WSMessageType.TYPING_START.value: 2,
+    WSMessageType.TYPING_STOP.value: 3,
+    WSMessageType.USER_JOINED.value: 4,
+    WSMessageType.USER_LEFT.value: 5,
+    WSMessageType.CONVERSATION_UPDATED.value: 6,
+    WSMessageType.ERROR.value: 7,
+    WSMessageType.SUCCESS.value: 8,
+    "ping": 9,
+}
+WS_TYPE_NAMES: Dict[int, str] = {code: name for name, code in WS_TYPE_CODES.items()}
+
+def encode_json(value: Any) -> str:
+    """JSON ringkas via orjson: datetime/enum native (format sama dengan isoformat()), tipe lain lewat str()"""
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def decode_json(payload: Union[str, bytes]) -> Any:
+    return orjson.loads(payload)
+
+def negotiate_subprotocol(offered: List[str]) -> Optional[str]:
+    """Subprotocol yang dipilih dari header Sec-WebSocket-Protocol client; None = JSON (default)"""
+    if msgpack is not None and MSGPACK_SUBPROTOCOL in offered:
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+def epoch_ms(value: datetime) -> int:
+    """Milidetik sejak epoch; datetime naive dianggap UTC (format penyimpanan database)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+def _is_time_key(key: Any) -> bool:
+    return key == "timestamp" or (isinstance(key, str) and key.endswith("_at"))
+
+def _compact(value: Any, key: Any = None) -> Any:
+    """Bentuk biner: datetime -> epoch ms, field timezone dibuang (epoch tidak berzona)"""
+    if isinstance(value, dict):
+        return {k: _compact(v, k) for k, v in value.items() if k != "timezone"}
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in value]
+    if isinstance(value, datetime):
+        return epoch_ms(value)
+    if isinstance(value, str) and _is_time_key(key):
+        # Frame dari worker lain (backplane) membawa waktu sebagai string ISO
+        try:
+            return epoch_ms(datetime.fromisoformat(value))
+        except ValueError:
+            return value
+    return value
+
+def encode_msgpack(message: Dict[str, Any]) -> bytes:
+    """Frame biner: [kode tipe, data, timestamp epoch ms]; tipe tanpa kode dikirim sebagai string"""
+    message_type = message.get("type")
+    message_type = getattr(message_type, "value", message_type)
+    return msgpack.packb(
+        [
+            WS_TYPE_CODES.get(message_type, message_type),
+            _compact(message.get("data") or {}),
+            _compact(message.get("timestamp"), "timestamp"),
+        ],
+        default=str,
+        use_bin_type=True
+    )
+
+def decode_msgpack(payload: bytes) -> Dict[str, Any]:
+    """Pesan client biner [kode tipe, data] -> bentuk dict yang sama dengan JSON"""
+    try:
+        decoded = msgpack.unpackb(payload, raw=False)
+    except Exception as e:
+        raise ValueError(f"Invalid MessagePack frame: {e}") from e
+    if not isinstance(decoded, (list, tuple)) or not decoded:
+        raise ValueError("MessagePack frame must be [type, data]")
+    data = decoded[1] if len(decoded) > 1 and isinstance(decoded[1], dict) else {}
+    return {"type": WS_TYPE_NAMES.get(decoded[0], decoded[0]), "data": data}
+
+class Frame:
+    """Satu event WebSocket: dict asli plus teks JSON yang di-encode sekali
+
+    Objek yang sama diantrekan ke setiap socket penerima, jadi broadcast ke
+    ribuan koneksi hanya membayar satu serialisasi per format. Bentuk biner
+    (MessagePack) dibuat saat pertama kali dibutuhkan socket biner lalu
+    disimpan. Frame dari worker lain (from_text) hanya membawa teks; dict-nya
+    di-decode saat pertama kali dibutuhkan. `message` tidak boleh diubah
+    setelah frame dibuat.
+    """
+
+    __slots__ = ("_message", "text", "typing_sender", "_binary")
+
+    def __init__(self, message: Dict[str, Any]):
+        self._message = message
+        self.text = encode_json(message)
+        self._binary: Optional[bytes] = None
+        # Kunci coalesce untuk frame typing (hanya status terakhir per pengirim yang relevan)
+        self.typing_sender: Optional[str] = None
+        if message.get("type") in TYPING_TYPES:
+            self.typing_sender = f"typing:{(message.get('data') or {}).get('sender')}"
+
+    @property
+    def message(self) -> Dict[str, Any]:
+        if self._message is None:
+            self._message = decode_json(self.text)
+        return self._message
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = encode_msgpack(self.message)
+        return self._binary
+
+    @classmethod
+    def of(cls, message: Union["Frame", Dict[str, Any]]) -> "Frame":
+        return message if isinstance(message, Frame) else cls(message)
+
+    @classmethod
+    def from_text(cls, text: str, typing_sender: Optional[str] = None) -> "Frame":
+        """Frame dari teks JSON yang sudah jadi (envelope backplane), tanpa encode ulang"""
+        frame = cls.__new__(cls)
+        frame._message = None
+        frame.text = text
+        frame._binary = None
+        frame.typing_sender = typing_sender
+        return frame
@@ -0,0 +1,107 @@
+# app/utils/conversation_export.py - Serializer streaming untuk export percakapan
+import json
+from typing import Any, AsyncIterator, Dict
+
+from .timezone_utils import IndonesiaDatetime
+
+# Ukuran chunk yang dikirim ke client; bytes dikumpulkan sampai batas ini
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "txt": "text/plain; charset=utf-8",
+}
+
+SENDER_LABELS = {"user": "Anda", "system": "Lunance", "luna": "Lunance"}
+
+def _export_time(value) -> Any:
+    return IndonesiaDatetime.from_utc(value).isoformat() if value else None
+
+def conversation_header(conversation) -> Dict[str, Any]:
+    return {
+        "id": conversation.id,
+        "title": conversation.title or "Chat Baru",
+        "message_count": conversation.message_count,
+        "created_at": _export_time(conversation.created_at),
+        "updated_at": _export_time(conversation.updated_at),
+        "exported_at": IndonesiaDatetime.now().isoformat(),
+        "timezone": "Asia/Jakarta (WIB/GMT+7)",
+    }
+
+def message_record(doc: Dict[str, Any]) -> Dict[str, Any]:
+    record = {
+        "id": str(doc["_id"]),
+        "sender_type": doc.get("sender_type"),
+        "content": doc.get("content", ""),
+        "message_type": doc.get("message_type"),
+        "status": doc.get("status"),
+        "timestamp": _export_time(doc.get("timestamp")),
+    }
+    if doc.get("metadata"):
+        record["metadata"] = doc["metadata"]
+    return record
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+def _render_json(header: Dict[str, Any]):
+    first = True
+
+    def start() -> str:
+        return '{"conversation":' + _dumps(header) + ',"messages":['
+
+    def item(doc: Dict[str, Any]) -> str:
+        nonlocal first
+        separator = "" if first else ","
+        first = False
+        return separator + _dumps(message_record(doc))
+
+    return start, item, lambda: "]}"
+
+def _render_ndjson(header: Dict[str, Any]):
+    # Baris pertama metadata percakapan, setiap baris berikutnya satu pesan
+    return (
+        lambda: _dumps({"type": "conversation", **header}) + "\n",
+        lambda doc: _dumps({"type": "message", **message_record(doc)}) + "\n",
+        lambda: "",
+    )
+
+def _render_txt(header: Dict[str, Any]):
+    def start() -> str:
+        return (
+            f"{header['title']}\n"
+            f"Diekspor: {header['exported_at']} ({header['timezone']})\n"
+            f"{'=' * 60}\n\n"
+        )
+
+    def item(doc: Dict[str, Any]) -> str:
+        sender = SENDER_LABELS.get(doc.get("sender_type"), doc.get("sender_type") or "-")
+        timestamp = IndonesiaDatetime.format(doc["timestamp"]) if doc.get("timestamp") else "-"
+        return f"[{timestamp}] {sender}: {doc.get('content', '')}\n"
+
+    return start, item, lambda: ""
+
+RENDERERS = {"json": _render_json, "ndjson": _render_ndjson, "txt": _render_txt}
+
+async def stream_export(conversation, messages: AsyncIterator[Dict[str, Any]], export_format: str) -> AsyncIterator[bytes]:
+    """Serialisasi pesan satu per satu ke chunk bytes; tidak pernah menampung seluruh percakapan
+
+    Header dikirim segera agar client langsung menerima bytes, lalu pesan
+    dikumpulkan per CHUNK_SIZE.
+    """
+    start, item, end = RENDERERS[export_format](conversation_header(conversation))
+    yield start().encode("utf-8")
+
+    buffer = []
+    buffered = 0
+    async for doc in messages:
+        piece = item(doc).encode("utf-8")
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+
+    buffer.append(end().encode("utf-8"))
+    yield b"".join(buffer)
@@ -0,0 +1,146 @@
+# app/utils/indonesian_text.py - Tokenisasi dan stemming ringan Bahasa Indonesia untuk search
+"""
+Stemmer berbasis aturan imbuhan (mengikuti urutan Nazief-Adriani: partikel,
+kata ganti kepunyaan, akhiran, lalu awalan) tanpa kamus kata dasar. Karena
+tanpa kamus, peluluhan awalan yang ambigu (me-/pe- + vokal) menghasilkan
+beberapa kandidat akar; indexing dan query memakai himpunan bentuk yang sama
+sehingga "menabung", "tabungan" dan "tabung" saling cocok.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Set, Tuple
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+VOWELS = set("aeiou")
+MIN_ROOT_LENGTH = 3
+
+STOPWORDS = {
+    "ada", "adalah", "agar", "aja", "aku", "akan", "atau", "bagi", "bahwa", "bisa", "dan", "dari",
+    "dengan", "di", "dia", "gak", "ini", "itu", "jadi", "juga", "kalau", "kami", "kamu", "kan",
+    "karena", "ke", "kita", "lagi", "mau", "nya", "oleh", "pada", "saja", "saya", "sih", "sudah",
+    "tapi", "tidak", "untuk", "yang", "ya",
+}
+
+PARTICLES = ("lah", "kah", "tah", "pun")
+POSSESSIVES = ("nya", "ku", "mu")
+SUFFIXES = ("kan", "an", "i")
+
+def normalize(text: str) -> str:
+    """Lowercase dan buang diakritik"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Token (kata ternormalisasi, start, end) dengan offset pada teks asli; stopword ikut dikembalikan"""
+    text = text or ""
+    lowered = text.lower()
+    # Offset harus tetap valid untuk teks asli (lower() bisa mengubah panjang pada huruf tertentu)
+    source = lowered if len(lowered) == len(text) else text
+    return [(normalize(match.group()), match.start(), match.end()) for match in WORD_PATTERN.finditer(source)]
+
+def _strip_suffixes(word: str) -> List[str]:
+    """Bentuk kata setelah partikel, kepunyaan dan akhiran dilepas bertahap"""
+    forms = [word]
+    for group in (PARTICLES, POSSESSIVES, SUFFIXES):
+        current = forms[-1]
+        for suffix in group:
+            if current.endswith(suffix) and len(current) - len(suffix) > MIN_ROOT_LENGTH:
+                forms.append(current[:-len(suffix)])
+                break
+    return forms
+
+def _strip_prefix(word: str) -> List[str]:
+    """Kandidat akar setelah satu awalan dilepas (kosong jika tidak ada awalan)"""
+    def rest(prefix: str) -> str:
+        return word[len(prefix):]
+
+    for prefix in ("meng", "peng"):
+        if word.startswith(prefix):
+            remainder = rest(prefix)
+            # meng- + vokal bisa meluluhkan k (mengirim -> kirim)
+            return [remainder, "k" + remainder] if remainder[:1] in VOWELS else [remainder]
+    for prefix in ("meny", "peny"):
+        if word.startswith(prefix) and rest(prefix)[:1] in VOWELS:
+            return ["s" + rest(prefix)]
+    for prefix in ("mem", "pem"):
+        if word.startswith(prefix):
+            remainder = rest(prefix)
+            # mem- + vokal meluluhkan p (memakai -> pakai) atau akar berawalan m (memasak -> masak)
+            return ["p" + remainder, word[2:]] if remainder[:1] in VOWELS else [remainder]
+    for prefix in ("men", "pen"):
+        if word.startswith(prefix):
+            remainder = rest(prefix)
+            # men- + vokal meluluhkan t (menabung -> tabung) atau akar berawalan n (menilai -> nilai)
+            return ["t" + remainder, word[2:]] if remainder[:1] in VOWELS else [remainder]
+    for prefix in ("ber", "ter", "per"):
+        if word.startswith(prefix):
+            return [rest(prefix)]
+    if word.startswith("bel") and word[3:].startswith("ajar"):
+        return [word[3:]]
+    for prefix in ("me", "pe", "be", "te", "di", "ke", "se"):
+        if word.startswith(prefix):
+            return [rest(prefix)]
+    return []
+
+def word_forms(word: str) -> Set[str]:
+    """Kata asli beserta semua kandidat akarnya"""
+    forms = set()
+    for stripped in _strip_suffixes(word):
+        forms.add(stripped)
+        frontier = [stripped]
+        # Maksimal dua awalan (diper-, memper-, ...)
+        for _ in range(2):
+            next_frontier = []
+            for candidate in frontier:
+                for root in _strip_prefix(candidate):
+                    if len(root) >= MIN_ROOT_LENGTH:
+                        forms.add(root)
+                        next_frontier.append(root)
+            frontier = next_frontier
+    return forms
+
+def analyze(text: str) -> List[str]:
+    """Term unik untuk disimpan di index"""
+    terms: Set[str] = set()
+    for word, _, _ in tokenize(text):
+        if word not in STOPWORDS and len(word) >= 2:
+            terms |= word_forms(word)
+    return sorted(terms)
+
+def query_groups(query: str) -> List[List[str]]:
+    """Satu grup bentuk kata per kata query; dokumen cocok dengan kata jika salah satu bentuknya ada"""
+    groups: Dict[str, List[str]] = {}
+    for word, _, _ in tokenize(query):
+        if word not in STOPWORDS and len(word) >= 2 and word not in groups:
+            groups[word] = sorted(word_forms(word))
+    return list(groups.values())
+
+def build_snippet(text: str, groups: List[List[str]], width: int = 140) -> Dict[str, object]:
+    """Potongan teks di sekitar kata pertama yang cocok, beserta offset highlight [start, end)"""
+    query_forms = set().union(*groups) if groups else set()
+    matches = [(start, end) for word, start, end in tokenize(text) if word_forms(word) & query_forms]
+
+    if not matches:
+        snippet = text[:width]
+        return {"text": snippet + ("…" if len(text) > width else ""), "highlights": []}
+
+    first_start = matches[0][0]
+    window_start = max(0, first_start - width // 3)
+    if window_start > 0:
+        # Jangan memotong di tengah kata
+        space = text.find(" ", window_start)
+        window_start = space + 1 if 0 <= space < first_start else window_start
+    window_end = min(len(text), window_start + width)
+    if window_end < len(text):
+        space = text.rfind(" ", window_start, window_end)
+        window_end = space if space > matches[0][1] else window_end
+
+    prefix = "…" if window_start > 0 else ""
+    suffix = "…" if window_end < len(text) else ""
+    offset = len(prefix) - window_start
+    highlights = [
+        [start + offset, end + offset]
+        for start, end in matches
+        if start >= window_start and end <= window_end
+    ]
+    return {"text": prefix + text[window_start:window_end] + suffix, "highlights": highlights}
@@ -0,0 +1,87 @@
+# app/utils/pagination.py - Opaque cursor untuk keyset pagination
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$d": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$o": str(value)}
+    return value
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "$d" in value:
+            return datetime.fromisoformat(value["$d"])
+        if "$o" in value:
+            return ObjectId(value["$o"])
+    return value
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Encode posisi keyset (mis. timestamp + _id) menjadi token base64url yang opaque"""
+    payload = json.dumps({key: _encode_value(value) for key, value in values.items()}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    """Decode token dari encode_cursor; ValueError jika token tidak valid"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, dict):
+            raise ValueError("cursor payload bukan object")
+        return {key: _decode_value(value) for key, value in payload.items()}
+    except (ValueError, TypeError, InvalidId, UnicodeError) as e:
+        raise ValueError(f"Cursor tidak valid: {e}")
+
+def _compare(operator: str, value: Any, nullable: bool) -> Optional[Dict[str, Any]]:
+    """Kondisi $gt/$lt/$gte/$lte dalam urutan BSON, di mana null adalah nilai terkecil
+
+    Operator perbandingan MongoDB tidak mencocokkan null dengan string, jadi untuk
+    field nullable "lebih kecil dari v" ditulis sebagai $not "lebih besar/sama dengan v".
+    """
+    if value is None:
+        # null adalah nilai terkecil: $gte null tidak membatasi apa pun ($lt null tidak pernah dipakai)
+        return {"$gt": {"$ne": None}, "$gte": None, "$lte": {"$in": [None]}}[operator]
+    if nullable and operator in ("$lt", "$lte"):
+        return {"$not": {"$gte" if operator == "$lt" else "$gt": value}}
+    return {operator: value}
+
+def keyset_filter(
+    sort_fields: List[Tuple[str, int]],
+    position: Dict[str, Any],
+    forward: bool = True,
+    nullable: Iterable[str] = ()
+) -> Dict[str, Any]:
+    """Filter untuk dokumen setelah `position` dalam urutan `sort_fields`
+
+    sort_fields berisi (field, arah) dengan tie-breaker unik di posisi terakhir
+    (biasanya _id). forward=False memberi dokumen sebelum `position`. Field
+    pertama diberi batas range ($lte/$gte) agar index tetap dipakai sebagai
+    bound, sisanya menjadi cabang $or. Field di `nullable` boleh bernilai None
+    (mis. title yang belum dibuat) dan diurutkan paling awal seperti urutan BSON.
+    """
+    nullable = set(nullable)
+    branches = []
+    for i, (field, direction) in enumerate(sort_fields):
+        ascending = (direction == 1) == forward
+        if not ascending and position[field] is None:
+            # Tidak ada nilai yang lebih kecil dari null
+            continue
+        branch = {prefix: position[prefix] for prefix, _ in sort_fields[:i]}
+        branch[field] = _compare("$gt" if ascending else "$lt", position[field], field in nullable)
+        branches.append(branch)
+
+    first_field, first_direction = sort_fields[0]
+    first_ascending = (first_direction == 1) == forward
+    keyset: Dict[str, Any] = {}
+    bound = _compare("$gte" if first_ascending else "$lte", position[first_field], first_field in nullable)
+    if bound is not None:
+        keyset[first_field] = bound
+    # Tanpa cabang berarti tidak ada dokumen setelah posisi ini
+    keyset["$or"] = branches or [{"_id": {"$in": []}}]
+    return keyset
@@ -0,0 +1,112 @@
+# app/utils/pdf_render.py - Renderer PDF teks minimal (stdlib saja) untuk export percakapan
+"""
+Dipakai dari worker ProcessPoolExecutor, jadi modul ini hanya memakai stdlib
+agar proses worker (spawn) cepat diimport.
+
+layout_batch() adalah bagian CPU-bound: word wrap, escape dan kompresi
+content stream per halaman. PdfFileWriter di proses utama hanya menulis
+objek halaman yang sudah jadi ke file dan menutupnya dengan xref.
+"""
+import textwrap
+import zlib
+from typing import BinaryIO, List, Optional, Sequence, Tuple
+
+# A4 dalam point, font Helvetica 10pt
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+FONT_SIZE = 10
+LEADING = 14
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+# Perkiraan lebar karakter rata-rata Helvetica 10pt (~5pt)
+CHARS_PER_LINE = (PAGE_WIDTH - 2 * MARGIN) // 5
+
+# (timestamp, pengirim, isi)
+MessageRow = Tuple[str, str, str]
+
+def _escape(line: str) -> bytes:
+    # Font standar PDF hanya mendukung WinAnsi; karakter di luar latin-1 diganti "?"
+    encoded = line.encode("latin-1", errors="replace")
+    return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+def _page_stream(lines: Sequence[str]) -> bytes:
+    parts = [b"BT /F1 %d Tf %d TL %d %d Td" % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN)]
+    for line in lines:
+        parts.append(b"(" + _escape(line) + b") Tj T*")
+    parts.append(b"ET")
+    return zlib.compress(b"\n".join(parts))
+
+def message_lines(row: MessageRow) -> List[str]:
+    timestamp, sender, content = row
+    lines = [f"[{timestamp}] {sender}:"]
+    for paragraph in (content or "").splitlines() or [""]:
+        lines.extend(textwrap.wrap(paragraph, CHARS_PER_LINE - 4) or [""])
+    lines = [lines[0]] + ["    " + line for line in lines[1:]]
+    lines.append("")
+    return lines
+
+def layout_batch(rows: List[MessageRow], carry: List[str], final: bool = False) -> Tuple[List[bytes], List[str]]:
+    """Ubah satu batch pesan menjadi content stream halaman yang sudah penuh
+
+    `carry` berisi baris yang belum cukup untuk satu halaman dari batch
+    sebelumnya; sisa baris dikembalikan untuk batch berikutnya, kecuali
+    `final` yang menutup halaman terakhir.
+    """
+    lines = list(carry)
+    for row in rows:
+        lines.extend(message_lines(row))
+
+    pages = []
+    while len(lines) >= LINES_PER_PAGE:
+        pages.append(_page_stream(lines[:LINES_PER_PAGE]))
+        lines = lines[LINES_PER_PAGE:]
+    if final and (lines or not pages):
+        pages.append(_page_stream(lines))
+        lines = []
+    return pages, lines
+
+class PdfFileWriter:
+    """Menulis PDF secara inkremental: halaman ditulis begitu tersedia, xref di akhir"""
+
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self, handle: BinaryIO, title: str):
+        self.handle = handle
+        self.offsets = {}
+        self.page_ids: List[int] = []
+        self.next_id = 5
+        self.handle.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(self.CATALOG, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._object(self.FONT, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self._object(4, b"<< /Title (" + _escape(title) + b") /Producer (Lunance) >>")
+
+    def _object(self, object_id: int, body: bytes, stream: Optional[bytes] = None):
+        self.offsets[object_id] = self.handle.tell()
+        self.handle.write(b"%d 0 obj\n" % object_id + body)
+        if stream is not None:
+            self.handle.write(b"\nstream\n" + stream + b"\nendstream")
+        self.handle.write(b"\nendobj\n")
+
+    def add_pages(self, streams: List[bytes]):
+        for stream in streams:
+            content_id, page_id = self.next_id, self.next_id + 1
+            self.next_id += 2
+            self._object(content_id, b"<< /Length %d /Filter /FlateDecode >>" % len(stream), stream)
+            self._object(
+                page_id,
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                b"/Resources << /Font << /F1 3 0 R >> >> >>" % (PAGE_WIDTH, PAGE_HEIGHT, content_id)
+            )
+            self.page_ids.append(page_id)
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        self._object(self.PAGES, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(self.page_ids))
+
+        xref_offset = self.handle.tell()
+        self.handle.write(b"xref\n0 %d\n0000000000 65535 f \n" % self.next_id)
+        for object_id in range(1, self.next_id):
+            self.handle.write(b"%010d 00000 n \n" % self.offsets[object_id])
+        self.handle.write(
+            b"trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (self.next_id, xref_offset)
+        )
@@ -129,4 +129,13 @@ def now_indonesia() -> datetime:
 
 def now_for_db() -> datetime:
     """Shorthand for database-ready timestamp"""
-    return IndonesiaDatetime.now_for_db()
\ No newline at end of file
+    return IndonesiaDatetime.now_for_db()
+
+def now_for_db_ms() -> datetime:
+    """now_for_db() dibulatkan ke milidetik (resolusi BSON datetime)
+
+    Dipakai jika nilai yang sama juga disimpan di memori (buffer, cursor) dan
+    harus sama persis dengan nilai yang dibaca kembali dari MongoDB.
+    """
+    now = now_for_db()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
@@ -0,0 +1,131 @@
+# scripts/benchmark_async_driver.py - p99 latency: pymongo (blocking) vs Motor (async)
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+from scratch_database import unsafe_database_reason
+
+# Configuration
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+BENCH_DATABASE = os.getenv("BENCH_DATABASE_NAME", "lunance_benchmark")
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "500"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "5"))
+SEED_USERS = 1000
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Ambil persentil dari daftar sampel (ms)"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def print_report(label: str, samples: List[float], loop_lag: List[float]):
+    """Print ringkasan latency"""
+    print(f"📊 {label}")
+    print(f"   requests : {len(samples)}")
+    print(f"   p50      : {percentile(samples, 50):.2f} ms")
+    print(f"   p95      : {percentile(samples, 95):.2f} ms")
+    print(f"   p99      : {percentile(samples, 99):.2f} ms")
+    print(f"   mean     : {statistics.mean(samples):.2f} ms")
+    if loop_lag:
+        print(f"   max event loop lag : {max(loop_lag):.2f} ms")
+    print()
+
+def seed(sync_client: MongoClient) -> List[ObjectId]:
+    """Isi collection users dengan data sintetis (collection lama di-drop)"""
+    reason = unsafe_database_reason(BENCH_DATABASE)
+    if reason:
+        raise RuntimeError(f"Menolak drop collection users: {reason}")
+    users = sync_client[BENCH_DATABASE].users
+    users.drop()
+    result = users.insert_many([
+        {"username": f"bench_{i}", "email": f"bench_{i}@test.com", "is_active": True}
+        for i in range(SEED_USERS)
+    ])
+    return result.inserted_ids
+
+async def measure_loop_lag(stop: asyncio.Event, lag: List[float], interval: float = 0.005):
+    """Ukur seberapa lama event loop tertahan (simulasi WebSocket lain di worker yang sama)"""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lag.append(max(0.0, (time.perf_counter() - expected) * 1000))
+
+async def run_blocking(sync_client: MongoClient, user_ids: List[ObjectId]):
+    """Pola lama: pymongo dipanggil langsung dari coroutine"""
+    users = sync_client[BENCH_DATABASE].users
+    samples: List[float] = []
+
+    async def request(user_id: ObjectId, scheduled_at: float):
+        users.find_one({"_id": user_id})
+        samples.append((time.perf_counter() - scheduled_at) * 1000)
+
+    return await _run_rounds(request, user_ids, samples)
+
+async def run_async(async_client: AsyncIOMotorClient, user_ids: List[ObjectId]):
+    """Pola baru: Motor di-await dari event loop"""
+    users = async_client[BENCH_DATABASE].users
+    samples: List[float] = []
+
+    async def request(user_id: ObjectId, scheduled_at: float):
+        await users.find_one({"_id": user_id})
+        samples.append((time.perf_counter() - scheduled_at) * 1000)
+
+    return await _run_rounds(request, user_ids, samples)
+
+async def _run_rounds(request, user_ids: List[ObjectId], samples: List[float]):
+    """Jalankan ROUNDS gelombang berisi CONCURRENCY request bersamaan"""
+    stop = asyncio.Event()
+    lag: List[float] = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag))
+
+    for round_index in range(ROUNDS):
+        batch = [user_ids[(round_index * CONCURRENCY + i) % len(user_ids)] for i in range(CONCURRENCY)]
+        # Timer dimulai saat request dijadwalkan, sehingga antrian di event loop ikut terukur
+        scheduled_at = time.perf_counter()
+        await asyncio.gather(*(request(user_id, scheduled_at) for user_id in batch))
+
+    stop.set()
+    await lag_task
+    return samples, lag
+
+async def main():
+    print("🚀 Benchmark driver MongoDB")
+    print(f"📍 MongoDB: {MONGODB_URL} / {BENCH_DATABASE}")
+    print(f"🔁 Concurrency: {CONCURRENCY} x {ROUNDS} rounds")
+    print("=" * 60)
+
+    reason = unsafe_database_reason(BENCH_DATABASE)
+    if reason:
+        print(f"❌ BENCH_DATABASE_NAME tidak aman: {reason}; collection users di database ini akan di-drop")
+        sys.exit(1)
+
+    sync_client = MongoClient(MONGODB_URL)
+    async_client = AsyncIOMotorClient(MONGODB_URL)
+
+    try:
+        sync_client.admin.command("ping")
+    except Exception as e:
+        print(f"❌ MongoDB tidak bisa dihubungi: {e}")
+        sys.exit(1)
+
+    user_ids = seed(sync_client)
+
+    samples, lag = await run_blocking(sync_client, user_ids)
+    print_report("BEFORE - pymongo blocking di event loop", samples, lag)
+
+    samples, lag = await run_async(async_client, user_ids)
+    print_report("AFTER  - Motor async", samples, lag)
+
+    sync_client[BENCH_DATABASE].users.drop()
+    sync_client.close()
+    async_client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+# scripts/benchmark_send_message.py - Round trip dan ketepatan message_count pada send_message (langsung vs write-behind)
+import asyncio
+import os
+import sys
+import time
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from scratch_database import unsafe_database_reason
+
+# Benchmark memakai database terpisah yang di-drop di akhir; harus diset sebelum app diimport
+BENCH_DATABASE = os.getenv("BENCH_DATABASE_NAME", "lunance_benchmark")
+_reason = unsafe_database_reason(BENCH_DATABASE)
+if _reason:
+    print(f"❌ BENCH_DATABASE_NAME tidak aman: {_reason}; database ini akan di-drop")
+    sys.exit(1)
+os.environ["DATABASE_NAME"] = BENCH_DATABASE
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.database import db_manager, get_async_database  # noqa: E402
+from app.services.chat_service import ChatService  # noqa: E402
+from app.utils.timezone_utils import now_for_db  # noqa: E402
+
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "200"))
+USER_ID = "benchmark_user"
+
+async def legacy_send_message(db, conversation_id: str, content: str):
+    """Write path lama: 2x insert_one + find_one + update_one dengan count dihitung di Python"""
+    for sender_type in ("user", "system"):
+        await db.messages.insert_one({
+            "conversation_id": conversation_id,
+            "sender_type": sender_type,
+            "content": content,
+            "timestamp": now_for_db(),
+        })
+    current = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
+    await db.conversations.update_one(
+        {"_id": ObjectId(conversation_id)},
+        {"$set": {"message_count": current.get("message_count", 0) + 2, "last_message": content}}
+    )
+
+async def unbatched_send_message(chat_service: ChatService, conversation_id: str, content: str):
+    """Path lengkap tanpa batch: insert_many lalu conversation, chat_stats dan search_index per pesan"""
+    now = now_for_db()
+    result = await chat_service.db.messages.insert_many([
+        {"conversation_id": conversation_id, "sender_type": sender_type, "content": content, "timestamp": now}
+        for sender_type in ("user", "system")
+    ])
+    await asyncio.gather(
+        chat_service.db.conversations.find_one_and_update(
+            {"_id": ObjectId(conversation_id)},
+            chat_service._conversation_update(content, chat_service._generate_title(content), now, 2),
+            return_document=ReturnDocument.AFTER
+        ),
+        chat_service.stats.record_messages(USER_ID, 2, now),
+        chat_service.search.index_message(USER_ID, conversation_id, str(result.inserted_ids[0]), content, now)
+    )
+
+async def run(label: str, send) -> None:
+    db = get_async_database()
+    chat_service = ChatService()
+    conversation = await chat_service.create_conversation(USER_ID)
+
+    listener = db_manager._command_listener
+    if listener:
+        listener.reset()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(conversation.id, f"pesan benchmark {i}") for i in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+
+    # Round trip dihitung sebelum query verifikasi di bawah
+    per_collection = {}
+    if listener:
+        for collection, operations in listener.get_stats().items():
+            per_collection[collection] = sum(
+                stats["count"] for callers in operations.values() for stats in callers.values()
+            )
+
+    stored = await db.conversations.find_one({"_id": ObjectId(conversation.id)})
+    inserted = await db.messages.count_documents({"conversation_id": conversation.id})
+
+    expected = CONCURRENCY * 2
+    print(f"📊 {label}")
+    print(f"   sends           : {CONCURRENCY} bersamaan")
+    print(f"   throughput      : {CONCURRENCY / elapsed:.0f} msg/s ({elapsed * 1000:.0f} ms)")
+    if listener:
+        # Semua write: messages, conversations, chat_stats, search_index
+        print(f"   round trips/msg : {sum(per_collection.values()) / CONCURRENCY:.2f}")
+        for collection, count in sorted(per_collection.items()):
+            print(f"     {collection:<15}: {count / CONCURRENCY:.2f}")
+    print(f"   messages stored : {inserted} (expected {expected})")
+    status = "✅" if stored["message_count"] == expected else "❌ lost update"
+    print(f"   message_count   : {stored['message_count']} {status}")
+    print()
+
+async def main():
+    print("🚀 Benchmark send_message")
+    print(f"📍 Database: {BENCH_DATABASE}")
+    print("=" * 60)
+
+    db_manager.connect()
+    db = get_async_database()
+    chat_service = ChatService()
+
+    await run("BEFORE - insert_one x2 + find_one + update_one (tanpa stats/search)",
+              lambda cid, text: legacy_send_message(db, cid, text))
+    await run("UNBATCHED - insert_many + conversation/stats/search per pesan",
+              lambda cid, text: unbatched_send_message(chat_service, cid, text))
+    await run("AFTER  - insert_many + update turunan di-batch (MessageWriteQueue)",
+              lambda cid, text: chat_service.send_message(USER_ID, cid, text))
+    print(f"   batches         : {chat_service.write_queue.get_stats()}")
+    await chat_service.write_queue.stop()
+    
+    write_behind_service = ChatService(write_behind=True)
+    await run("WRITE-BEHIND - group commit per batch",
+              lambda cid, text: write_behind_service.send_message(USER_ID, cid, text))
+    print(f"   batches         : {write_behind_service.write_queue.get_stats()}")
+    await write_behind_service.write_queue.stop()
+
+    db_manager.get_database().client.drop_database(BENCH_DATABASE)
+    db_manager.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
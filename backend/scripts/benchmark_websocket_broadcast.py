@@ -0,0 +1,132 @@
+# scripts/benchmark_websocket_broadcast.py - Throughput broadcast WebSocket: encode per penerima vs encode sekali
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.chat import WSMessageType  # noqa: E402
+from app.services.websocket_manager import WebSocketManager  # noqa: E402
+from app.services.ws_frames import Frame, decode_json, decode_msgpack, msgpack  # noqa: E402
+from app.utils.timezone_utils import IndonesiaDatetime  # noqa: E402
+
+CONNECTIONS = int(os.getenv("BENCH_CONNECTIONS", "10000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "20"))
+CODEC_ITERATIONS = int(os.getenv("BENCH_CODEC_ITERATIONS", "20000"))
+
+class FakeWebSocket:
+    """Pengganti WebSocket Starlette: hitung frame dan byte tanpa I/O"""
+
+    __slots__ = ("sent", "bytes")
+    scope: dict = {}
+
+    def __init__(self):
+        self.sent = 0
+        self.bytes = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent += 1
+        self.bytes += len(text)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+def chat_payload(round_no: int) -> dict:
+    """Payload broadcast seukuran pesan chat biasa"""
+    return {
+        "message": {
+            "id": f"{round_no:024x}",
+            "conversation_id": "6650f1c2a1b2c3d4e5f60718",
+            "sender_type": "system",
+            "content": "Pengumuman: pemeliharaan server dijadwalkan pukul 23.00 WIB malam ini. " * 2,
+            "timestamp": IndonesiaDatetime.now(),
+            "status": "delivered",
+            "timezone": "WIB",
+            "message_type": "text"
+        }
+    }
+
+async def legacy_broadcast(manager: WebSocketManager, round_no: int):
+    """Perilaku lama: dict baru dan json.dumps untuk setiap socket penerima"""
+    for user_connections in list(manager.connections.values()):
+        for connection in list(user_connections):
+            data = chat_payload(round_no)
+            data["message"]["timestamp"] = data["message"]["timestamp"].isoformat()
+            message = {
+                "type": WSMessageType.CHAT_MESSAGE.value,
+                "data": data,
+                "timestamp": IndonesiaDatetime.now().isoformat()
+            }
+            await connection.websocket.send_text(json.dumps(message))
+
+async def encode_once_broadcast(manager: WebSocketManager, round_no: int):
+    await manager.broadcast_to_all(WSMessageType.CHAT_MESSAGE, chat_payload(round_no))
+    await manager.drain(timeout=60)
+
+async def measure(label: str, broadcast, manager: WebSocketManager, sockets):
+    sent_before = sum(websocket.sent for websocket in sockets)
+    bytes_before = sum(websocket.bytes for websocket in sockets)
+    start = time.perf_counter()
+    for round_no in range(ROUNDS):
+        await broadcast(manager, round_no)
+    elapsed = time.perf_counter() - start
+    delivered = sum(websocket.sent for websocket in sockets) - sent_before
+    sent_bytes = sum(websocket.bytes for websocket in sockets) - bytes_before
+
+    print(f"📊 {label}")
+    print(f"   frame terkirim  : {delivered} ({ROUNDS} broadcast x {len(sockets)} socket)")
+    print(f"   waktu total     : {elapsed * 1000:.0f} ms ({elapsed * 1000 / ROUNDS:.1f} ms per broadcast)")
+    print(f"   throughput      : {delivered / elapsed:,.0f} frame/s, rata-rata {sent_bytes / max(delivered, 1):.0f} B/frame")
+    return elapsed
+
+def codec_comparison():
+    """Ukuran dan CPU encode/decode satu frame chat: JSON vs subprotocol MessagePack"""
+    message = WebSocketManager.build_message(WSMessageType.CHAT_MESSAGE, chat_payload(0))
+    text = Frame(message).text
+    binary = Frame(message).binary
+
+    results = {}
+    for label, encode, decode in (
+        ("json", lambda: Frame(message).text, lambda: decode_json(text)),
+        ("msgpack", lambda: Frame(message).binary, lambda: msgpack.unpackb(binary, raw=False)),
+    ):
+        start = time.perf_counter()
+        for _ in range(CODEC_ITERATIONS):
+            encode()
+        encode_us = (time.perf_counter() - start) / CODEC_ITERATIONS * 1e6
+        start = time.perf_counter()
+        for _ in range(CODEC_ITERATIONS):
+            decode()
+        decode_us = (time.perf_counter() - start) / CODEC_ITERATIONS * 1e6
+        results[label] = (encode_us, decode_us)
+
+    json_size, msgpack_size = len(text.encode()), len(binary)
+    print("📊 Codec frame chat (encode termasuk pembuatan Frame)")
+    print(f"   json            : {json_size} B, encode {results['json'][0]:.1f} µs, decode {results['json'][1]:.1f} µs")
+    print(f"   msgpack         : {msgpack_size} B, encode {results['msgpack'][0]:.1f} µs, decode {results['msgpack'][1]:.1f} µs")
+    print(f"   penghematan     : {(1 - msgpack_size / json_size) * 100:.0f}% byte per frame")
+    # Client biner mengirim [kode tipe, data]
+    assert decode_msgpack(msgpack.packb([1, {"message": "halo"}]))["type"] == WSMessageType.CHAT_MESSAGE.value
+
+async def main():
+    print(f"🔌 {CONNECTIONS} socket simulasi, {ROUNDS} broadcast")
+    sockets = [FakeWebSocket() for _ in range(CONNECTIONS)]
+    manager = WebSocketManager()
+    for i, websocket in enumerate(sockets):
+        await manager.connect(websocket, f"user_{i}")
+    await manager.drain(timeout=60)
+
+    legacy = await measure("Legacy: json.dumps per penerima", legacy_broadcast, manager, sockets)
+    encode_once = await measure("Frame: orjson sekali per broadcast + antrean per socket", encode_once_broadcast, manager, sockets)
+    print(f"⚡ Speedup: {legacy / encode_once:.1f}x")
+
+    if msgpack is not None:
+        codec_comparison()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+# scripts/benchmark_websocket_registry.py - Memori per koneksi registry WebSocket (tanpa jaringan)
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.chat import WSMessageType  # noqa: E402
+from app.services.websocket_manager import WebSocketManager  # noqa: E402
+
+CONNECTIONS = int(os.getenv("BENCH_CONNECTIONS", "50000"))
+DEVICES_PER_USER = int(os.getenv("BENCH_DEVICES_PER_USER", "2"))
+
+class FakeWebSocket:
+    """Pengganti WebSocket Starlette: accept/send tanpa I/O"""
+
+    __slots__ = ("sent",)
+    scope: dict = {}
+
+    def __init__(self):
+        self.sent = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent += 1
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+async def legacy_register(user_ids, sockets):
+    """Layout lama: tiga dict paralel per user_id (satu socket per user)"""
+    active_connections, typing_status, connection_info = {}, {}, {}
+    for user_id, websocket in zip(user_ids, sockets):
+        await websocket.accept()
+        active_connections[user_id] = websocket
+        typing_status[user_id] = False
+        connection_info[user_id] = {"connected_at": datetime.utcnow(), "last_activity": datetime.utcnow()}
+    return active_connections, typing_status, connection_info
+
+async def registry_register(user_ids, sockets):
+    manager = WebSocketManager()
+    for user_id, websocket in zip(user_ids, sockets):
+        await manager.connect(websocket, user_id)
+    # Frame sambutan selesai terkirim: writer dan antrean socket idle dilepas
+    await manager.drain(timeout=60)
+    return manager
+
+async def measure(label: str, register, user_ids, sockets):
+    # Socket dan user_id dialokasikan sebelum tracing: yang diukur hanya struktur registry
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    registry = await register(user_ids, sockets)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"📊 {label}")
+    print(f"   memori          : {current / 1024 / 1024:.1f} MiB ({current / len(sockets):.0f} B/koneksi, peak {peak / 1024 / 1024:.1f} MiB)")
+    print(f"   waktu register  : {elapsed * 1000:.0f} ms")
+    return registry
+
+async def main():
+    print(f"🔌 {CONNECTIONS} socket simulasi")
+    sockets = [FakeWebSocket() for _ in range(CONNECTIONS)]
+    single_users = [f"user_{i}" for i in range(CONNECTIONS)]
+    shared_users = [f"user_{i // DEVICES_PER_USER}" for i in range(CONNECTIONS)]
+
+    legacy = await measure("Legacy: 3 dict paralel (1 device per user)", legacy_register, single_users, sockets)
+    del legacy
+
+    manager = await measure("Registry: Connection __slots__ (1 device per user)", registry_register, single_users, sockets)
+    del manager
+
+    manager = await measure(
+        f"Registry: Connection __slots__ ({DEVICES_PER_USER} device per user)", registry_register, shared_users, sockets
+    )
+    print(f"   user / socket   : {len(manager.connections)} / {manager.get_connection_count()}")
+
+    sent_before = sum(websocket.sent for websocket in sockets)
+    start = time.perf_counter()
+    await manager.broadcast_to_all(WSMessageType.SUCCESS, {"message": "benchmark"})
+    # Frame masuk antrean per socket; tunggu writer selesai mengirim
+    await manager.drain(timeout=60)
+    elapsed = time.perf_counter() - start
+    delivered = sum(websocket.sent for websocket in sockets) - sent_before
+    print(f"   fan-out semua   : {delivered} frame ke {manager.get_connection_count()} socket dalam {elapsed * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
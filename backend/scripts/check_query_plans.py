@@ -0,0 +1,332 @@
+# scripts/check_query_plans.py - Query-plan regression check untuk ChatService dan AuthService
+"""
+Menjalankan setiap bentuk query yang dipakai ChatService dan AuthService lewat
+explain("executionStats") terhadap mongod lokal yang diisi data sintetis.
+
+Gagal (exit code 1) jika sebuah plan memakai COLLSCAN atau memeriksa jauh
+lebih banyak key/dokumen daripada yang dikembalikan, lalu menyarankan index
+compound/partial yang bisa dipakai di INDEX_SPECS.
+
+    cd backend
+    python scripts/check_query_plans.py
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.index_migrations import run_index_migrations  # noqa: E402
+from app.utils.indonesian_text import analyze  # noqa: E402
+from app.utils.pagination import keyset_filter  # noqa: E402
+from scratch_database import unsafe_database_reason  # noqa: E402
+
+# Configuration
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+PLAN_DATABASE = os.getenv("QUERY_PLAN_DATABASE_NAME", "lunance_query_plans")
+USERS = int(os.getenv("QUERY_PLAN_USERS", "20"))
+CONVERSATIONS_PER_USER = int(os.getenv("QUERY_PLAN_CONVERSATIONS", "200"))
+MESSAGES_PER_CONVERSATION = int(os.getenv("QUERY_PLAN_MESSAGES", "20"))
+# Rasio maksimum key/dokumen yang diperiksa per dokumen yang dikembalikan
+MAX_EXAMINED_RATIO = float(os.getenv("QUERY_PLAN_MAX_RATIO", "10"))
+
+RANGE_OPERATORS = {"$ne", "$nin", "$exists", "$gt", "$gte", "$lt", "$lte", "$regex", "$not"}
+
+def seed(db) -> Dict[str, Any]:
+    """Isi database dengan users, conversations dan messages sintetis"""
+    reason = unsafe_database_reason(db.name)
+    if reason:
+        raise RuntimeError(f"Menolak seed database: {reason}")
+    for name in ("users", "conversations", "messages", "search_index"):
+        db[name].drop()
+
+    now = datetime.utcnow()
+    statuses = ["active"] * 8 + ["deleted", "archived"]
+    users, conversations, messages, postings = [], [], [], []
+
+    for u in range(USERS):
+        user_id = ObjectId()
+        users.append({"_id": user_id, "email": f"plan_{u}@test.com", "username": f"plan_{u}", "created_at": now})
+
+        for c in range(CONVERSATIONS_PER_USER):
+            conversation_id = ObjectId()
+            created_at = now - timedelta(minutes=random.randint(0, 60 * 24 * 90))
+            message_count = 0 if c % 10 == 0 else MESSAGES_PER_CONVERSATION
+            conversations.append({
+                "_id": conversation_id,
+                "user_id": str(user_id),
+                "title": f"Chat {c} tentang uang kos",
+                "status": random.choice(statuses),
+                "last_message": "Pesan Anda telah diterima" if message_count else None,
+                "last_message_at": created_at if message_count else None,
+                "message_count": message_count,
+                "created_at": created_at,
+                "updated_at": created_at + timedelta(minutes=5),
+            })
+            postings.append({"_id": conversation_id, "user_id": str(user_id), "conversation_id": str(conversation_id),
+                             "kind": "title", "terms": analyze(conversations[-1]["title"]), "timestamp": created_at})
+            for m in range(message_count):
+                message_id = ObjectId()
+                content = f"pesan {m} beli makan siang"
+                if m % 2 == 0:
+                    postings.append({"_id": message_id, "user_id": str(user_id), "conversation_id": str(conversation_id),
+                                     "kind": "message", "terms": analyze(content),
+                                     "timestamp": created_at + timedelta(seconds=m)})
+                messages.append({
+                    "_id": message_id,
+                    "conversation_id": str(conversation_id),
+                    "sender_id": str(user_id) if m % 2 == 0 else None,
+                    "sender_type": "user" if m % 2 == 0 else "system",
+                    "content": content,
+                    "message_type": "text",
+                    "status": "sent",
+                    "timestamp": created_at + timedelta(seconds=m),
+                })
+
+    db.users.insert_many(users)
+    db.conversations.insert_many(conversations)
+    db.messages.insert_many(messages)
+    db.search_index.insert_many(postings)
+
+    sample_user = str(users[0]["_id"])
+    user_conversations = [c for c in conversations if c["user_id"] == sample_user]
+    sample_messages = [m for m in messages if m["conversation_id"] == str(user_conversations[1]["_id"])]
+    middle_message = sample_messages[len(sample_messages) // 2]
+    return {
+        "user_id": sample_user,
+        "user_object_id": users[0]["_id"],
+        "email": users[0]["email"],
+        "username": users[0]["username"],
+        "conversation_id": str(user_conversations[1]["_id"]),
+        "conversation_object_id": user_conversations[1]["_id"],
+        "conversation_position": {"created_at": user_conversations[5]["created_at"], "_id": user_conversations[5]["_id"]},
+        "message_position": {"timestamp": middle_message["timestamp"], "_id": middle_message["_id"]},
+        "conversation_ids": [str(c["_id"]) for c in user_conversations if c["status"] != "deleted"],
+    }
+
+def query_shapes(sample: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Bentuk query yang dipakai service; perbarui saat query service berubah"""
+    user_id = sample["user_id"]
+    not_deleted = {"user_id": user_id, "status": {"$ne": "deleted"}}
+    active_status = {"user_id": user_id, "status": {"$in": ["active", None]}}
+    empty = {"message_count": {"$in": [0, None]}, "status": {"$ne": "deleted"}}
+
+    return [
+        {"name": "ChatService.get_user_conversations_page (updated_at)", "collection": "conversations",
+         "filter": active_status, "sort": [("updated_at", -1), ("_id", -1)], "limit": 21},
+        {"name": "ChatService.get_user_conversations_page (created_at, cursor)", "collection": "conversations",
+         "filter": {**active_status, **keyset_filter([("created_at", -1), ("_id", -1)], sample["conversation_position"])},
+         "sort": [("created_at", -1), ("_id", -1)], "limit": 21},
+        {"name": "ChatService.get_user_conversations_page (title)", "collection": "conversations",
+         "filter": active_status, "sort": [("title", 1), ("_id", 1)], "limit": 21},
+        {"name": "ChatService.get_conversation_messages", "collection": "messages",
+         "filter": {"conversation_id": sample["conversation_id"]},
+         "sort": [("timestamp", -1), ("_id", -1)], "limit": 51},
+        {"name": "ChatService.get_conversation_messages (before cursor)", "collection": "messages",
+         "filter": {"conversation_id": sample["conversation_id"],
+                    **keyset_filter([("timestamp", -1), ("_id", -1)], sample["message_position"])},
+         "sort": [("timestamp", -1), ("_id", -1)], "limit": 51},
+        {"name": "ChatService.get_conversation_by_id", "collection": "conversations",
+         "filter": {"_id": sample["conversation_object_id"]}},
+        {"name": "ChatService.delete_conversation", "collection": "conversations",
+         "filter": {"_id": sample["conversation_object_id"], "user_id": user_id}},
+        {"name": "ChatService.auto_delete_empty_conversations (sweeper)", "collection": "conversations",
+         "filter": {**empty, "updated_at": {"$lt": datetime.utcnow() - timedelta(minutes=30)}}, "limit": 500},
+        {"name": "ChatService.auto_delete_empty_conversations (user)", "collection": "conversations",
+         "filter": {**empty, "user_id": user_id}, "limit": 500},
+        {"name": "ChatService.auto_delete_empty_conversations ($lookup anti-join)", "collection": "messages",
+         "filter": {"conversation_id": sample["conversation_id"]}, "limit": 1},
+        {"name": "ChatSyncService.changes (full sync)", "collection": "conversations",
+         "filter": not_deleted, "sort": [("updated_at", 1), ("_id", 1)], "limit": 101},
+        {"name": "ChatSyncService.changes (since token)", "collection": "conversations",
+         "filter": {"user_id": user_id, "updated_at": {"$gte": datetime.utcnow() - timedelta(days=1)}},
+         "sort": [("updated_at", 1), ("_id", 1)], "limit": 101},
+        {"name": "ChatSyncService._messages_since", "collection": "messages",
+         "filter": {"conversation_id": {"$in": sample["conversation_ids"]},
+                    "timestamp": {"$gte": datetime.utcnow() - timedelta(days=1)}},
+         "sort": [("conversation_id", 1), ("timestamp", 1), ("_id", 1)], "limit": 501},
+        {"name": "TitleAutocompleteService._build", "collection": "conversations",
+         "filter": {**active_status, "title": {"$nin": [None, ""]}}},
+        {"name": "ChatSearchService.search (hits)", "collection": "search_index",
+         "filter": {"user_id": user_id, "terms": {"$in": analyze("uang kos")}},
+         "sort": [("timestamp", -1)], "limit": 2000},
+        {"name": "ChatSearchService.rebuild (messages)", "collection": "messages",
+         "filter": {"conversation_id": {"$in": sample["conversation_ids"]}, "sender_type": "user"}, "count": True},
+        # get_chat_statistics membaca chat_stats by _id; query di bawah hanya untuk rebuild/backfill
+        {"name": "ChatStatsService.rebuild (conversations)", "collection": "conversations",
+         "filter": not_deleted, "count": True},
+        {"name": "ChatStatsService.rebuild (messages)", "collection": "messages",
+         "filter": {"conversation_id": {"$in": sample["conversation_ids"]}}, "count": True},
+        {"name": "ChatStatsService.rebuild (last activity)", "collection": "conversations",
+         "filter": not_deleted, "sort": [("updated_at", -1)], "limit": 1},
+        {"name": "AuthService.authenticate_user", "collection": "users",
+         "filter": {"email": sample["email"]}, "limit": 1},
+        {"name": "AuthService.register_user (username)", "collection": "users",
+         "filter": {"username": sample["username"]}, "limit": 1},
+        {"name": "AuthService.get_user_by_id", "collection": "users",
+         "filter": {"_id": sample["user_object_id"]}, "limit": 1},
+    ]
+
+def explain(db, shape: Dict[str, Any]) -> Dict[str, Any]:
+    """Jalankan explain executionStats untuk find atau count_documents"""
+    if shape.get("count"):
+        command = {
+            "aggregate": shape["collection"],
+            "pipeline": [{"$match": shape["filter"]}, {"$group": {"_id": 1, "n": {"$sum": 1}}}],
+            "cursor": {},
+        }
+    else:
+        command = {"find": shape["collection"], "filter": shape["filter"]}
+        if shape.get("sort"):
+            command["sort"] = dict(shape["sort"])
+        if shape.get("limit"):
+            command["limit"] = shape["limit"]
+    return db.command("explain", command, verbosity="executionStats")
+
+def _find_key(node: Any, key: str) -> Optional[Any]:
+    """Cari key pertama secara rekursif (bentuk explain aggregate berbeda antar versi server)"""
+    if isinstance(node, dict):
+        if key in node:
+            return node[key]
+        for value in node.values():
+            found = _find_key(value, key)
+            if found is not None:
+                return found
+    elif isinstance(node, list):
+        for item in node:
+            found = _find_key(item, key)
+            if found is not None:
+                return found
+    return None
+
+def _stages(node: Any) -> List[str]:
+    stages = []
+    if isinstance(node, dict):
+        if "stage" in node:
+            stages.append(node["stage"])
+        for value in node.values():
+            stages.extend(_stages(value))
+    elif isinstance(node, list):
+        for item in node:
+            stages.extend(_stages(item))
+    return stages
+
+def suggest_index(shape: Dict[str, Any]) -> str:
+    """Saran index mengikuti aturan Equality-Sort-Range"""
+    equality, ranges, partial = [], [], {}
+    query = shape["filter"]
+
+    def visit(condition: Dict[str, Any]):
+        for field, value in condition.items():
+            if field in ("$or", "$and"):
+                for branch in value:
+                    visit(branch)
+                continue
+            if field == "_id":
+                continue
+            if isinstance(value, dict) and any(op in RANGE_OPERATORS for op in value):
+                if field not in ranges:
+                    ranges.append(field)
+            elif field not in equality:
+                equality.append(field)
+                if isinstance(value, str) and field == "status":
+                    partial[field] = value
+
+    visit(query)
+    sort_fields = [(field, direction) for field, direction in shape.get("sort") or []]
+    keys = [(field, 1) for field in equality if field not in partial]
+    keys += [item for item in sort_fields if item[0] not in dict(keys)]
+    keys += [(field, 1) for field in ranges if field not in dict(keys) and field not in partial]
+
+    suggestion = f"index({keys})"
+    if partial:
+        suggestion = f"index({keys}, partialFilterExpression={partial})"
+    if "$or" in query and any("$exists" in str(branch) for branch in query["$or"]):
+        suggestion += "  # backfill field yang hilang agar cabang $exists di $or bisa dihapus"
+    if any("$regex" in str(value) for value in query.values()):
+        suggestion += "  # $regex tanpa anchor tidak bisa memakai index; pertimbangkan text index"
+    return suggestion
+
+def check_shape(db, shape: Dict[str, Any]) -> Dict[str, Any]:
+    plan = explain(db, shape)
+    stats = _find_key(plan, "executionStats") or {}
+    winning_plan = _find_key(plan, "winningPlan") or {}
+
+    returned = db[shape["collection"]].count_documents(shape["filter"])
+    if shape.get("limit"):
+        returned = min(returned, shape["limit"])
+    if shape.get("count"):
+        returned = max(returned, 1)
+
+    keys_examined = stats.get("totalKeysExamined", 0)
+    docs_examined = stats.get("totalDocsExamined", 0)
+    ratio = max(keys_examined, docs_examined) / max(returned, 1)
+    stages = _stages(winning_plan)
+
+    problems = []
+    if "COLLSCAN" in stages:
+        problems.append("COLLSCAN")
+    if ratio > MAX_EXAMINED_RATIO:
+        problems.append(f"examined/returned {ratio:.1f} > {MAX_EXAMINED_RATIO}")
+    if "SORT" in stages and shape.get("sort"):
+        problems.append("in-memory SORT")
+
+    return {
+        "name": shape["name"],
+        "stages": stages,
+        "keys_examined": keys_examined,
+        "docs_examined": docs_examined,
+        "returned": returned,
+        "problems": problems,
+        "suggestion": suggest_index(shape) if problems else None,
+    }
+
+def main() -> int:
+    print("🔍 Query-plan regression check")
+    print(f"📍 MongoDB: {MONGODB_URL} / {PLAN_DATABASE}")
+    print(f"🧪 Data: {USERS} users x {CONVERSATIONS_PER_USER} conversations x {MESSAGES_PER_CONVERSATION} messages")
+    print("=" * 80)
+
+    reason = unsafe_database_reason(PLAN_DATABASE)
+    if reason:
+        print(f"❌ QUERY_PLAN_DATABASE_NAME tidak aman: {reason}; collection di database ini akan di-drop")
+        return 1
+
+    client = MongoClient(MONGODB_URL)
+    db = client[PLAN_DATABASE]
+
+    try:
+        client.admin.command("ping")
+    except Exception as e:
+        print(f"❌ MongoDB tidak bisa dihubungi: {e}")
+        return 1
+
+    sample = seed(db)
+    run_index_migrations(db, force=True)
+
+    failures = 0
+    for shape in query_shapes(sample):
+        result = check_shape(db, shape)
+        status = "✅ PASS" if not result["problems"] else "❌ FAIL"
+        print(f"{status} | {result['name']}")
+        print(f"    plan: {' <- '.join(result['stages']) or '-'}")
+        print(f"    keys: {result['keys_examined']} | docs: {result['docs_examined']} | returned: {result['returned']}")
+        if result["problems"]:
+            failures += 1
+            print(f"    ⚠️ {', '.join(result['problems'])}")
+            print(f"    💡 {result['suggestion']}")
+
+    print("=" * 80)
+    print(f"{'✅' if not failures else '❌'} {failures} query bermasalah")
+
+    client.drop_database(PLAN_DATABASE)
+    client.close()
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+# scripts/scratch_database.py - Guard database sementara untuk script benchmark dan query-plan
+"""
+Script di folder ini men-drop collection atau database yang dipakainya.
+Nama database dari environment bisa saja menunjuk ke data sungguhan, jadi
+setiap script memanggil unsafe_database_reason() sebelum menyentuh data.
+"""
+import os
+from typing import Optional
+
+from dotenv import dotenv_values
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+# Dibaca saat import, sebelum script mengganti DATABASE_NAME untuk dirinya sendiri
+APP_DATABASE = os.getenv("DATABASE_NAME") or dotenv_values(ENV_FILE).get("DATABASE_NAME") or "lunance_db"
+# Hanya database dengan akhiran ini yang boleh di-drop/di-seed
+SCRATCH_DATABASE_SUFFIXES = ("_test", "_tests", "_plan", "_plans", "_bench", "_benchmark", "_scratch")
+
+def unsafe_database_reason(name: str) -> Optional[str]:
+    """Alasan database tidak boleh di-drop/di-seed, atau None jika aman"""
+    if name == APP_DATABASE:
+        return f"'{name}' sama dengan DATABASE_NAME aplikasi"
+    if not name.endswith(SCRATCH_DATABASE_SUFFIXES):
+        return f"'{name}' tidak berakhiran {', '.join(SCRATCH_DATABASE_SUFFIXES)}"
+    return None
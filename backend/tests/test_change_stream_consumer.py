@@ -0,0 +1,150 @@
+# tests/test_change_stream_consumer.py - Slot checkpoint dan resume token per worker
+import asyncio
+from datetime import timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.services.change_stream_consumer import RESUME_TOKENS_COLLECTION, ChangeStreamConsumer
+from app.utils.timezone_utils import now_for_db
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, option) for option in condition):
+                return False
+        elif isinstance(condition, dict):
+            if "$exists" in condition and (key in doc) != condition["$exists"]:
+                return False
+            if "$lt" in condition and not (key in doc and doc[key] < condition["$lt"]):
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+class UpdateResult:
+    def __init__(self, matched_count):
+        self.matched_count = matched_count
+
+class FakeTokens:
+    def __init__(self):
+        self.docs = {}
+
+    def _apply(self, doc, update):
+        doc.update(update.get("$set", {}))
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+
+    async def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc else None
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            doc = self.docs[query["_id"]] = {"_id": query["_id"]}
+        elif not matches(doc, query):
+            raise DuplicateKeyError("E11000 duplicate key")
+        self._apply(doc, update)
+        return dict(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.get(query["_id"])
+        if doc is None or not matches(doc, query):
+            if upsert and doc is None:
+                self.docs[query["_id"]] = doc = {"_id": query["_id"]}
+                self._apply(doc, update)
+            return UpdateResult(0)
+        self._apply(doc, update)
+        return UpdateResult(1)
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        self[name] = FakeTokens()
+        return self[name]
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.delenv("CHAT_WORKER_ID", raising=False)
+    return FakeDatabase()
+
+def consumer(db) -> ChangeStreamConsumer:
+    async def deliver(message, user_id):
+        pass
+    return ChangeStreamConsumer(deliver, lambda user_id: False, db=db)
+
+async def claim(worker: ChangeStreamConsumer):
+    worker.stream_id = await worker._claim_stream_id()
+    worker._resume_token = worker._saved_token = await worker._load_token()
+    return worker.stream_id
+
+def test_workers_on_one_host_claim_distinct_slots(db):
+    async def scenario():
+        return [await claim(consumer(db)) for _ in range(3)]
+
+    slots = asyncio.run(scenario())
+    assert len(set(slots)) == 3
+    assert [slot.rsplit(":", 1)[1] for slot in slots] == ["slot0", "slot1", "slot2"]
+
+def test_restarted_worker_resumes_from_released_slot(db):
+    async def scenario():
+        old, other = consumer(db), consumer(db)
+        await claim(old)
+        await claim(other)
+        old._resume_token = {"_data": "8263A1"}
+        await old.stop()
+
+        restarted = consumer(db)
+        slot = await claim(restarted)
+        return old.stream_id, slot, restarted._resume_token
+
+    old_slot, slot, token = asyncio.run(scenario())
+    assert slot == old_slot
+    assert token == {"_data": "8263A1"}
+
+def test_expired_lease_is_taken_over_and_old_holder_moves(db):
+    async def scenario():
+        crashed = consumer(db)
+        slot = await claim(crashed)
+        db[RESUME_TOKENS_COLLECTION].docs[slot]["lease_expires_at"] = now_for_db() - timedelta(seconds=1)
+
+        replacement = consumer(db)
+        assert await claim(replacement) == slot
+
+        # Worker lama hidup lagi: checkpoint mendeteksi lease hilang lalu pindah slot
+        crashed._resume_token = {"_data": "8263B2"}
+        await crashed._checkpoint()
+        return slot, crashed.stream_id, db[RESUME_TOKENS_COLLECTION].docs
+
+    slot, moved_to, docs = asyncio.run(scenario())
+    assert moved_to != slot
+    assert docs[moved_to]["token"] == {"_data": "8263B2"}
+    assert "token" not in docs[slot]
+
+def test_stale_token_is_not_resumed(db):
+    async def scenario():
+        worker = consumer(db)
+        slot = await claim(worker)
+        worker._resume_token = {"_data": "8263C3"}
+        await worker._checkpoint()
+        await worker.stop()
+        db[RESUME_TOKENS_COLLECTION].docs[slot]["updated_at"] -= timedelta(seconds=worker.max_resume_seconds + 1)
+
+        restarted = consumer(db)
+        await claim(restarted)
+        return restarted._resume_token
+
+    assert asyncio.run(scenario()) is None
+
+def test_configured_worker_id_skips_slot_lease(db, monkeypatch):
+    monkeypatch.setenv("CHAT_WORKER_ID", "pod-7")
+    worker = consumer(db)
+    assert worker.stream_id.endswith(":pod-7")
+
+    async def scenario():
+        worker._resume_token = {"_data": "8263D4"}
+        await worker._checkpoint()
+
+    asyncio.run(scenario())
+    assert db[RESUME_TOKENS_COLLECTION].docs[worker.stream_id]["token"] == {"_data": "8263D4"}
+    assert "lease_owner" not in db[RESUME_TOKENS_COLLECTION].docs[worker.stream_id]
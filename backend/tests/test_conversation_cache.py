@@ -0,0 +1,158 @@
+# tests/test_conversation_cache.py - Cache halaman pertama daftar percakapan
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.models.chat import Conversation
+from app.services.chat_service import ChatService
+from app.services.conversation_cache import ConversationListCache
+
+KEY = (20, "updated_at", "desc", "next")
+
+def make_conversation(conversation_id: str, title="Belanja bulanan", minutes: int = 0) -> Conversation:
+    at = datetime(2024, 1, 1) + timedelta(minutes=minutes)
+    return Conversation.from_mongo({
+        "_id": conversation_id, "user_id": "u1", "title": title, "message_count": 2,
+        "created_at": at, "updated_at": at, "last_message_at": at, "last_message": "halo"
+    })
+
+def make_page(*conversations: Conversation) -> dict:
+    return {"conversations": list(conversations), "has_next": False, "has_prev": False,
+            "next_cursor": None, "prev_cursor": None}
+
+def fill(cache: ConversationListCache, user_id: str, key, page: dict):
+    cache.put(user_id, key, page, cache.begin_fill(user_id))
+
+def test_get_returns_copy_of_cached_page():
+    cache = ConversationListCache(max_users=10, ttl_seconds=60)
+    fill(cache, "u1", KEY, make_page(make_conversation(str(ObjectId()))))
+
+    first = cache.get("u1", KEY)
+    first["conversations"].clear()
+    assert len(cache.get("u1", KEY)["conversations"]) == 1
+    assert cache.get("u1", (20, "updated_at", "desc", "prev")) is None
+
+def test_lru_evicts_least_recently_used_user():
+    cache = ConversationListCache(max_users=2, ttl_seconds=60)
+    for user_id in ("a", "b"):
+        fill(cache, user_id, KEY, make_page())
+    cache.get("a", KEY)
+    fill(cache, "c", KEY, make_page())
+
+    assert cache.get("b", KEY) is None
+    assert cache.get("a", KEY) is not None
+    assert cache.metrics["evictions"] == 1
+
+def test_ttl_expires_entry(monkeypatch):
+    import app.services.conversation_cache as module
+
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+    cache = ConversationListCache(max_users=10, ttl_seconds=30)
+    fill(cache, "u1", KEY, make_page())
+    assert cache.get("u1", KEY) is not None
+
+    now[0] += 31
+    assert cache.get("u1", KEY) is None
+
+def test_write_during_read_discards_fill():
+    cache = ConversationListCache(max_users=10, ttl_seconds=60)
+    token = cache.begin_fill("u1")
+    cache.invalidate("u1")
+    cache.put("u1", KEY, make_page(), token)
+    assert cache.get("u1", KEY) is None
+
+    # Read yang lebih baru menggantikan token read lama
+    old = cache.begin_fill("u1")
+    new = cache.begin_fill("u1")
+    cache.put("u1", KEY, make_page(), old)
+    assert cache.get("u1", KEY) is None
+    cache.put("u1", KEY, make_page(), new)
+    assert cache.get("u1", KEY) is not None
+
+def test_on_message_patches_top_conversation():
+    cache = ConversationListCache(max_users=10, ttl_seconds=60)
+    top, other = str(ObjectId()), str(ObjectId())
+    fill(cache, "u1", KEY, make_page(make_conversation(top, minutes=5), make_conversation(other)))
+    at = datetime(2024, 1, 2)
+
+    cache.on_message("u1", top, "pesan baru", at, 2)
+
+    page = cache.get("u1", KEY)
+    assert page["conversations"][0].last_message == "pesan baru"
+    assert page["conversations"][0].message_count == 4
+    assert page["conversations"][0].updated_at == at
+    assert page["prev_cursor"] is not None
+
+def test_on_message_evicts_page_that_reorders():
+    cache = ConversationListCache(max_users=10, ttl_seconds=60)
+    top, other = str(ObjectId()), str(ObjectId())
+    by_title = (20, "title", "asc", "next")
+    fill(cache, "u1", KEY, make_page(make_conversation(top, minutes=5), make_conversation(other)))
+    fill(cache, "u1", by_title, make_page(make_conversation(other), make_conversation(top)))
+
+    cache.on_message("u1", other, "pesan baru", datetime(2024, 1, 2), 2)
+
+    assert cache.get("u1", KEY) is None
+    assert cache.get("u1", by_title)["conversations"][0].last_message == "pesan baru"
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield dict(doc)
+        return iterate()
+
+class FakeConversations:
+    def __init__(self, docs):
+        self.docs = docs
+        self.finds = 0
+
+    def find(self, query, *args, **kwargs):
+        self.finds += 1
+        return FakeCursor(self.docs)
+
+class FakeDatabase:
+    def __init__(self, conversations):
+        self.conversations = conversations
+
+def test_send_message_updates_cached_first_page(monkeypatch):
+    """Regresi: kunci cache 4 field tidak boleh membuat send_message gagal"""
+    monkeypatch.setenv("CHAT_WRITE_BEHIND", "false")
+    conversation_id = str(ObjectId())
+    at = datetime(2024, 1, 1)
+    conversations = FakeConversations([{
+        "_id": ObjectId(conversation_id), "user_id": "u1", "title": "Belanja bulanan", "status": "active",
+        "message_count": 2, "last_message": "halo", "last_message_at": at, "created_at": at, "updated_at": at
+    }])
+    service = ChatService()
+    service.db = FakeDatabase(conversations)
+
+    async def write_message_pair(user_id, conversation_id, content, user_message_data, echo_message_data):
+        return [str(ObjectId()), str(ObjectId())]
+    monkeypatch.setattr(service, "_write_message_pair", write_message_pair)
+
+    async def scenario():
+        await service.get_user_conversations_page("u1")
+        result = await service.send_message("u1", conversation_id, "beli sayur")
+        page = await service.get_user_conversations_page("u1")
+        return result, page
+
+    result, page = asyncio.run(scenario())
+
+    assert result["user_message"].content == "beli sayur"
+    # Halaman di-patch dari cache, bukan dibaca ulang dari database
+    assert conversations.finds == 1
+    assert page["conversations"][0].last_message == "beli sayur"
+    assert page["conversations"][0].message_count == 4
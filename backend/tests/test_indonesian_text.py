@@ -0,0 +1,70 @@
+# tests/test_indonesian_text.py - Aturan imbuhan stemmer dan term search
+import pytest
+
+from app.utils.indonesian_text import analyze, build_snippet, query_groups, tokenize, word_forms
+
+@pytest.mark.parametrize("word, root", [
+    ("bukunya", "buku"),          # kata ganti kepunyaan
+    ("bukunyalah", "buku"),       # partikel lalu kepunyaan
+    ("makanan", "makan"),         # akhiran -an
+    ("kirimkan", "kirim"),        # akhiran -kan
+    ("berlari", "lari"),          # akhiran -i + awalan ber-
+])
+def test_suffixes_are_stripped_in_nazief_adriani_order(word, root):
+    assert root in word_forms(word)
+
+def test_short_words_keep_their_suffix():
+    # Sisa kata harus lebih dari MIN_ROOT_LENGTH: "apa" + "kah" tidak dipotong
+    assert word_forms("apakah") == {"apakah"}
+
+@pytest.mark.parametrize("word, root", [
+    ("menabung", "tabung"),       # men- + vokal -> t
+    ("menilai", "nilai"),         # men- + vokal -> akar berawalan n
+    ("mengirim", "kirim"),        # meng- + vokal -> k
+    ("mengambil", "ambil"),       # meng- + vokal tanpa peluluhan
+    ("menyapu", "sapu"),          # meny- -> s
+    ("memakai", "pakai"),         # mem- + vokal -> p
+    ("memasak", "masak"),         # mem- + vokal -> akar berawalan m
+    ("membeli", "beli"),          # mem- + konsonan
+    ("pengeluaran", "keluar"),    # peng- + vokal -> k, dengan akhiran -an
+    ("terbesar", "besar"),
+    ("belajar", "ajar"),
+    ("sebulan", "bulan"),
+    ("diperbaiki", "baik"),       # dua awalan di- + per-
+])
+def test_prefix_rules(word, root):
+    assert root in word_forms(word)
+
+def test_word_forms_keep_original_word():
+    assert "menabung" in word_forms("menabung")
+
+def test_derived_forms_share_a_root():
+    assert set(analyze("menabung")) & set(analyze("tabungan")) & set(analyze("tabung"))
+
+def test_analyze_skips_stopwords_and_single_letters():
+    terms = analyze("Saya mau menabung untuk liburan x")
+    assert "saya" not in terms and "untuk" not in terms and "x" not in terms
+    assert {"tabung", "libur"} <= set(terms)
+    assert terms == sorted(set(terms))
+
+def test_query_groups_one_group_per_distinct_word():
+    groups = query_groups("Tabungan tabungan di bank")
+    assert groups == [sorted(word_forms("tabungan")), ["bank"]]
+
+def test_tokenize_normalizes_diacritics_with_original_offsets():
+    text = "Café, naïve!"
+    tokens = tokenize(text)
+    assert [word for word, _, _ in tokens] == ["cafe", "naive"]
+    assert [text[start:end] for _, start, end in tokens] == ["Café", "naïve"]
+
+def test_snippet_highlights_inflected_match():
+    text = "Bulan ini saya menabung 500 ribu untuk liburan."
+    snippet = build_snippet(text, query_groups("tabungan"))
+    assert [snippet["text"][start:end] for start, end in snippet["highlights"]] == ["menabung"]
+
+def test_snippet_window_offsets_account_for_ellipsis():
+    text = " ".join(["kata"] * 60) + " menabung " + " ".join(["akhir"] * 60)
+    snippet = build_snippet(text, query_groups("tabung"), width=60)
+    assert snippet["text"].startswith("…") and snippet["text"].endswith("…")
+    start, end = snippet["highlights"][0]
+    assert snippet["text"][start:end] == "menabung"
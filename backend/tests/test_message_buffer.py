@@ -0,0 +1,131 @@
+# tests/test_message_buffer.py - Ring buffer pesan terbaru per percakapan
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import app.services.message_buffer as module
+from app.models.chat import Message
+from app.services.message_buffer import MESSAGE_OVERHEAD_BYTES, RecentMessageBuffer, message_key
+
+CONVERSATION = "c1"
+
+def make_message(seq: int, content: str = "halo") -> Message:
+    return Message(
+        _id=str(ObjectId(f"{seq:024x}")), conversation_id=CONVERSATION, sender_id="u1",
+        content=content, timestamp=datetime(2026, 1, 1) + timedelta(seconds=seq)
+    )
+
+def make_buffer(**kwargs) -> RecentMessageBuffer:
+    options = {"capacity": 3, "max_bytes": 10 ** 6, "ttl_seconds": 0, **kwargs}
+    buffer = RecentMessageBuffer(**options)
+    buffer.retain_user("u1")
+    return buffer
+
+def ids(page) -> list:
+    return [int(message.id, 16) for message in page["messages"]]
+
+def test_append_wraps_around_at_capacity():
+    buffer = make_buffer()
+    buffer.fill(CONVERSATION, "u1", [make_message(1), make_message(2)], complete=True)
+    buffer.append(CONVERSATION, [make_message(seq) for seq in (3, 4, 5)])
+
+    conversation = buffer._buffers[CONVERSATION]
+    assert [int(message.id, 16) for message in conversation.messages] == [3, 4, 5]
+    assert conversation.keys == [message_key(message) for message in conversation.messages]
+    assert conversation.complete is False
+    assert buffer.size_bytes == conversation.size_bytes == 3 * (MESSAGE_OVERHEAD_BYTES + len("halo"))
+
+    page = buffer.read(CONVERSATION, limit=3)
+    assert ids(page) == [3, 4, 5] and page["has_more"] is True
+    # Pesan yang sudah terdorong keluar ring tidak boleh dilayani dari buffer
+    assert buffer.read(CONVERSATION, limit=2, before=message_key(make_message(3))) is None
+
+def test_append_skips_duplicates_and_gaps():
+    buffer = make_buffer(capacity=5)
+    buffer.fill(CONVERSATION, "u1", [make_message(5), make_message(6)], complete=False)
+    size = buffer.size_bytes
+
+    buffer.append(CONVERSATION, [make_message(6), make_message(2)])
+    assert buffer.size_bytes == size
+    assert ids(buffer.read(CONVERSATION, limit=2)) == [5, 6]
+
+    # Buffer lengkap menerima pesan yang datang terlambat di posisi urutnya
+    buffer.fill(CONVERSATION, "u1", [make_message(5), make_message(6)], complete=True)
+    buffer.append(CONVERSATION, [make_message(2), make_message(7)])
+    assert ids(buffer.read(CONVERSATION, limit=5)) == [2, 5, 6, 7]
+
+def test_fill_keeps_newest_capacity_messages():
+    buffer = make_buffer()
+    buffer.fill(CONVERSATION, "u1", [make_message(seq) for seq in range(1, 6)], complete=True)
+    conversation = buffer._buffers[CONVERSATION]
+    assert [int(message.id, 16) for message in conversation.messages] == [3, 4, 5]
+    assert conversation.complete is False
+
+    buffer.fill(CONVERSATION, "u1", [make_message(1), make_message(2)], complete=True)
+    assert buffer._buffers[CONVERSATION].complete is True
+    assert buffer.size_bytes == buffer._buffers[CONVERSATION].size_bytes
+
+def test_fill_requires_connected_owner_and_release_evicts():
+    buffer = make_buffer()
+    buffer.fill("c2", "u2", [make_message(1)], complete=True)
+    assert buffer.read("c2", limit=1) is None
+
+    buffer.retain_user("u1")
+    buffer.fill(CONVERSATION, "u1", [make_message(1)], complete=True)
+    buffer.release_user("u1")
+    assert buffer.read(CONVERSATION, limit=1) is not None
+    buffer.release_user("u1")
+    assert buffer.read(CONVERSATION, limit=1) is None
+    assert buffer.size_bytes == 0
+
+def test_fill_is_disabled_without_memory_budget():
+    buffer = make_buffer(max_bytes=0)
+    buffer.fill(CONVERSATION, "u1", [make_message(1)], complete=True)
+    assert buffer.read(CONVERSATION, limit=1) is None
+
+def test_read_windows_before_and_after_cursor():
+    buffer = make_buffer(capacity=10)
+    buffer.fill(CONVERSATION, "u1", [make_message(seq) for seq in range(1, 7)], complete=True)
+
+    before = buffer.read(CONVERSATION, limit=2, before=message_key(make_message(4)))
+    assert ids(before) == [2, 3] and before["has_more"] is True
+    oldest = buffer.read(CONVERSATION, limit=5, before=message_key(make_message(3)))
+    assert ids(oldest) == [1, 2] and oldest["has_more"] is False
+
+    after = buffer.read(CONVERSATION, limit=2, after=message_key(make_message(3)))
+    assert ids(after) == [4, 5] and after["has_more"] is True
+
+def test_incomplete_buffer_misses_window_older_than_its_content():
+    buffer = make_buffer(capacity=10)
+    buffer.fill(CONVERSATION, "u1", [make_message(seq) for seq in (4, 5, 6)], complete=False)
+
+    assert buffer.read(CONVERSATION, limit=5) is None
+    assert buffer.read(CONVERSATION, limit=5, after=message_key(make_message(2))) is None
+    assert ids(buffer.read(CONVERSATION, limit=2)) == [5, 6]
+    assert buffer.metrics["misses"] == 2 and buffer.metrics["hits"] == 1
+
+def test_ttl_expires_buffer_on_read(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: clock[0])
+    buffer = make_buffer(ttl_seconds=30)
+    buffer.fill(CONVERSATION, "u1", [make_message(1)], complete=True)
+
+    clock[0] += 29
+    assert buffer.read(CONVERSATION, limit=1) is not None
+    clock[0] += 2
+    assert buffer.read(CONVERSATION, limit=1) is None
+    assert buffer.metrics["expired"] == 1
+    assert buffer.size_bytes == 0
+
+def test_memory_cap_evicts_least_recently_used_conversation():
+    per_message = MESSAGE_OVERHEAD_BYTES + len("halo")
+    buffer = make_buffer(max_bytes=2 * per_message)
+    buffer.fill("a", "u1", [make_message(1)], complete=True)
+    buffer.fill("b", "u1", [make_message(2)], complete=True)
+    buffer.read("a", limit=1)
+    buffer.fill("c", "u1", [make_message(3)], complete=True)
+
+    assert set(buffer._buffers) == {"a", "c"}
+    assert buffer.metrics["evictions"] == 1
+    assert buffer.size_bytes == 2 * per_message
@@ -0,0 +1,265 @@
+# tests/test_message_write_queue.py - Group commit pesan (MessageWriteQueue)
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.services.chat_service import ChatService
+from app.services.message_write_queue import MessageWriteError, MessageWriteQueue
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+class FakeInsertResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+class FakeMessages:
+    def __init__(self):
+        self.docs = {}
+        self.fail_ids = set()
+        self.insert_calls = 0
+
+    async def insert_many(self, docs, ordered=True):
+        self.insert_calls += 1
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc["_id"] in self.fail_ids:
+                errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+            else:
+                self.docs[doc["_id"]] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(docs) - len(errors)})
+        return FakeInsertResult([doc["_id"] for doc in docs])
+
+    async def delete_many(self, query):
+        for _id in query["_id"]["$in"]:
+            self.docs.pop(_id, None)
+
+class FakeConversations:
+    def __init__(self):
+        self.bulk_writes = 0
+        self.fail = False
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise RuntimeError("conversations down")
+        self.bulk_writes += 1
+
+    def find(self, query, projection=None):
+        return FakeCursor([])
+
+class FakeDatabase:
+    def __init__(self):
+        self.messages = FakeMessages()
+        self.conversations = FakeConversations()
+
+class FakeStats:
+    def __init__(self):
+        self.calls = []
+
+    async def record_messages_bulk(self, per_user):
+        self.calls.append(per_user)
+
+class FakeSearch:
+    def __init__(self):
+        self.postings = []
+
+    async def index_messages(self, postings):
+        self.postings.extend(postings)
+
+    async def index_title(self, *args):
+        pass
+
+class FakeChatService:
+    """Bagian ChatService yang dipakai MessageWriteQueue"""
+
+    _generate_title = staticmethod(ChatService._generate_title)
+    _conversation_update = staticmethod(ChatService._conversation_update)
+
+    def __init__(self):
+        self.db = FakeDatabase()
+        self.stats = FakeStats()
+        self.search = FakeSearch()
+        self.titles = None
+
+def message_pair():
+    at = datetime(2024, 1, 1)
+    return [{"_id": ObjectId(), "content": "halo", "timestamp": at},
+            {"_id": ObjectId(), "content": "Pesan Anda telah diterima", "timestamp": at}]
+
+def submit(queue, user_id="u1", conversation_id=None, messages=None, stored=False):
+    return queue.submit(user_id, conversation_id or str(ObjectId()), "halo",
+                        messages or message_pair(), datetime(2024, 1, 1), stored=stored)
+
+def run(coroutine, timeout=2):
+    async def bounded():
+        return await asyncio.wait_for(coroutine, timeout)
+    return asyncio.run(bounded())
+
+def test_batch_is_committed_once_for_all_senders():
+    service = FakeChatService()
+    queue = MessageWriteQueue(service, flush_interval_ms=5, max_batch=100)
+
+    async def scenario():
+        await asyncio.gather(*(submit(queue, user_id=f"u{i}") for i in range(5)))
+        await queue.stop()
+
+    run(scenario())
+    assert len(service.db.messages.docs) == 10
+    assert service.db.conversations.bulk_writes == 1
+    assert len(service.stats.calls) == 1 and len(service.stats.calls[0]) == 5
+    assert queue.stats["batches"] == 1 and queue.stats["writes"] == 5
+
+def test_invalid_conversation_id_is_rejected_before_queueing():
+    service = FakeChatService()
+    queue = MessageWriteQueue(service, flush_interval_ms=5)
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await submit(queue, conversation_id="bukan-object-id")
+        await submit(queue)
+        await queue.stop()
+
+    run(scenario())
+    assert len(service.db.messages.docs) == 2
+
+def test_failed_write_only_fails_its_sender_and_rolls_back_partial_pair():
+    service = FakeChatService()
+    queue = MessageWriteQueue(service, flush_interval_ms=5)
+    failing = message_pair()
+    service.db.messages.fail_ids.add(failing[1]["_id"])
+
+    async def scenario():
+        results = await asyncio.gather(submit(queue, "u1"), submit(queue, "u2", messages=failing),
+                                       return_exceptions=True)
+        await queue.stop()
+        return results
+
+    ok, failed = run(scenario())
+    assert ok is None
+    assert isinstance(failed, MessageWriteError) and failed.code == 11000
+    # Pesan pertama pengirim yang gagal di-rollback agar retry tidak menggandakan
+    assert failing[0]["_id"] not in service.db.messages.docs
+    assert len(service.db.messages.docs) == 2
+    assert queue.stats["failed_writes"] == 1
+    assert [posting[0] for posting in service.search.postings] == ["u1"]
+
+def test_side_effect_failure_still_reports_saved_messages():
+    service = FakeChatService()
+    service.db.conversations.fail = True
+    queue = MessageWriteQueue(service, flush_interval_ms=5)
+
+    async def scenario():
+        await submit(queue)
+        await queue.stop()
+
+    run(scenario())
+    assert len(service.db.messages.docs) == 2
+    assert queue.stats["side_effect_errors"] == 1
+
+def test_unexpected_flush_error_fails_batch_and_keeps_flusher_running(monkeypatch):
+    service = FakeChatService()
+    queue = MessageWriteQueue(service, flush_interval_ms=5)
+    original = queue._flush
+
+    async def broken(batch):
+        raise RuntimeError("bug")
+
+    async def scenario():
+        monkeypatch.setattr(queue, "_flush", broken)
+        with pytest.raises(RuntimeError):
+            await submit(queue)
+        monkeypatch.setattr(queue, "_flush", original)
+        await submit(queue)
+        await queue.stop()
+
+    run(scenario())
+    assert len(service.db.messages.docs) == 2
+
+def test_dead_flusher_fails_waiting_senders_and_restarts(monkeypatch):
+    service = FakeChatService()
+    queue = MessageWriteQueue(service, flush_interval_ms=5)
+    original = queue._flush_safe
+
+    async def crash(batch):
+        raise RuntimeError("flusher crashed")
+
+    async def scenario():
+        monkeypatch.setattr(queue, "_flush_safe", crash)
+        with pytest.raises(RuntimeError):
+            await submit(queue)
+        await asyncio.sleep(0)
+        assert queue._task.done()
+        monkeypatch.setattr(queue, "_flush_safe", original)
+        # Submit berikutnya menjalankan flusher baru
+        await submit(queue)
+        await queue.stop()
+
+    run(scenario())
+    assert len(service.db.messages.docs) == 2
+
+def test_stored_items_skip_insert_but_share_side_effect_batch():
+    service = FakeChatService()
+    queue = MessageWriteQueue(service, flush_interval_ms=5)
+
+    async def scenario():
+        await asyncio.gather(submit(queue, "u1", stored=True), submit(queue, "u2"), submit(queue, "u3", stored=True))
+        await queue.stop()
+
+    run(scenario())
+    # Hanya pesan u2 yang di-insert oleh queue; update turunan satu batch untuk ketiganya
+    assert service.db.messages.insert_calls == 1 and len(service.db.messages.docs) == 2
+    assert service.db.conversations.bulk_writes == 1
+    assert sorted(service.stats.calls[0]) == ["u1", "u2", "u3"]
+
+class FakeTitles:
+    def on_title_changed(self, *args):
+        pass
+
+def direct_chat_service(monkeypatch) -> ChatService:
+    monkeypatch.setenv("CHAT_WRITE_BEHIND", "false")
+    chat_service = ChatService()
+    fake = FakeChatService()
+    chat_service.db, chat_service.stats, chat_service.search = fake.db, fake.stats, fake.search
+    chat_service.titles = FakeTitles()
+    chat_service.write_queue = MessageWriteQueue(chat_service, flush_interval_ms=5)
+    return chat_service
+
+def test_direct_send_batches_side_effects_across_senders(monkeypatch):
+    chat_service = direct_chat_service(monkeypatch)
+    conversation_id = str(ObjectId())
+
+    async def scenario():
+        results = await asyncio.gather(*(
+            chat_service.send_message(f"u{i}", conversation_id, f"pesan {i}") for i in range(10)
+        ))
+        await chat_service.write_queue.stop()
+        return results
+
+    results = run(scenario())
+    messages = chat_service.db.messages
+    # Pesan di-insert langsung (satu insert_many per send); update turunan digabung
+    assert messages.insert_calls == 10 and len(messages.docs) == 20
+    assert chat_service.db.conversations.bulk_writes == 1
+    assert len(chat_service.stats.calls) == 1
+    assert len(chat_service.search.postings) == 10
+    assert all(result["user_message"].id in {str(_id) for _id in messages.docs} for result in results)
+
+def test_send_message_rejects_invalid_conversation_id(monkeypatch):
+    chat_service = direct_chat_service(monkeypatch)
+
+    with pytest.raises(ValueError):
+        run(chat_service.send_message("u1", "bukan-object-id", "halo"))
+    assert chat_service.db.messages.insert_calls == 0
@@ -0,0 +1,138 @@
+# tests/test_pagination.py - Cursor opaque dan keyset_filter (termasuk field nullable)
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_filter
+
+MISSING = object()
+
+def field_matches(value, condition):
+    """Subset semantik query MongoDB: null terkecil, $gt/$lt hanya antar tipe yang sama"""
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        return (value is MISSING or value is None) if condition is None else value == condition
+    for operator, operand in condition.items():
+        if operator == "$not":
+            matched = not field_matches(value, operand)
+        elif operator == "$ne":
+            matched = not field_matches(value, operand)
+        elif operator == "$in":
+            matched = any(field_matches(value, option) for option in operand)
+        elif operand is None:
+            matched = operator in ("$gte", "$lte") and value in (None, MISSING)
+        elif value is MISSING or value is None or type(value) is not type(operand):
+            matched = False
+        else:
+            matched = {
+                "$gt": value > operand,
+                "$gte": value >= operand,
+                "$lt": value < operand,
+                "$lte": value <= operand,
+            }[operator]
+        if not matched:
+            return False
+    return True
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+        elif not field_matches(doc.get(key, MISSING), condition):
+            return False
+    return True
+
+def sort_docs(docs, sort_fields):
+    ordered = list(docs)
+    for field, direction in reversed(sort_fields):
+        ordered.sort(key=lambda doc: (doc.get(field) is not None, doc.get(field) or ""), reverse=direction == -1)
+    return ordered
+
+def paginate(docs, sort_fields, page_size, nullable=()):
+    """Jalani semua halaman lewat cursor seperti list_conversations"""
+    seen, position = [], None
+    while True:
+        candidates = [doc for doc in docs if position is None or matches(doc, keyset_filter(sort_fields, position, nullable=nullable))]
+        page = sort_docs(candidates, sort_fields)[:page_size]
+        if not page:
+            return seen
+        seen.extend(page)
+        last = page[-1]
+        position = decode_cursor(encode_cursor({field: last.get(field) for field, _ in sort_fields}))
+
+def conversations():
+    base = datetime(2026, 1, 1, 8, 0)
+    titles = [None, "Anggaran", None, "Belanja", "anggaran", None, "Belanja", "Zakat"]
+    docs = []
+    for i, title in enumerate(titles):
+        doc = {"_id": ObjectId(f"{i + 1:024x}"), "updated_at": base + timedelta(minutes=i % 3)}
+        if title is not None:
+            doc["title"] = title
+        elif i % 2:
+            doc["title"] = None
+        docs.append(doc)
+    return docs
+
+def test_cursor_round_trip_keeps_datetime_and_object_id():
+    position = {"updated_at": datetime(2026, 1, 1, 8, 30, 15, 123000), "_id": ObjectId(), "title": None, "score": 1.5}
+    token = encode_cursor(position)
+    assert "=" not in token
+    assert decode_cursor(token) == position
+
+@pytest.mark.parametrize("token", [
+    "not base64 !",
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(b'{"_id": {"$o": "zzz"}}').decode(),
+    base64.urlsafe_b64encode(b'{"updated_at": {"$d": "kemarin"}}').decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_tampered_cursor_raises_value_error(token):
+    with pytest.raises(ValueError, match="Cursor tidak valid"):
+        decode_cursor(token)
+
+def test_edited_cursor_decodes_to_edited_position_only():
+    token = encode_cursor({"timestamp": datetime(2026, 1, 1), "_id": ObjectId("0" * 24)})
+    payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    payload["$where"] = "sleep(1000)"
+    tampered = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    # Kunci tambahan tidak ikut ke filter: keyset_filter hanya membaca field sort
+    query = keyset_filter([("timestamp", -1), ("_id", -1)], decode_cursor(tampered))
+    assert "$where" not in json.dumps(query, default=str)
+
+@pytest.mark.parametrize("direction", [1, -1])
+@pytest.mark.parametrize("page_size", [1, 2, 3])
+def test_nullable_title_pages_cover_every_document_once(direction, page_size):
+    docs = conversations()
+    sort_fields = [("title", direction), ("_id", direction)]
+    walked = paginate(docs, sort_fields, page_size, nullable=["title"])
+    assert [doc["_id"] for doc in walked] == [doc["_id"] for doc in sort_docs(docs, sort_fields)]
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_datetime_sort_with_ties_pages_in_order(direction):
+    docs = conversations()
+    sort_fields = [("updated_at", direction), ("_id", direction)]
+    walked = paginate(docs, sort_fields, 3)
+    assert [doc["_id"] for doc in walked] == [doc["_id"] for doc in sort_docs(docs, sort_fields)]
+
+def test_backward_filter_returns_documents_before_position():
+    docs = conversations()
+    sort_fields = [("title", 1), ("_id", 1)]
+    ordered = sort_docs(docs, sort_fields)
+    for index, pivot in enumerate(ordered):
+        position = {"title": pivot.get("title"), "_id": pivot["_id"]}
+        before = [doc for doc in docs if matches(doc, keyset_filter(sort_fields, position, forward=False, nullable=["title"]))]
+        assert {doc["_id"] for doc in before} == {doc["_id"] for doc in ordered[:index]}
+
+def test_nothing_sorts_below_null_in_descending_order():
+    last = {"title": None, "_id": ObjectId("0" * 24)}
+    query = keyset_filter([("title", -1), ("_id", -1)], last, nullable=["title"])
+    assert not any(matches(doc, query) for doc in conversations())
+
+def test_first_field_is_range_bound_for_index_use():
+    position = {"updated_at": datetime(2026, 1, 1), "_id": ObjectId()}
+    query = keyset_filter([("updated_at", -1), ("_id", -1)], position)
+    assert query["updated_at"] == {"$lte": position["updated_at"]}
+    assert len(query["$or"]) == 2
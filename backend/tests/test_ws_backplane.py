@@ -0,0 +1,52 @@
+# tests/test_ws_backplane.py - Kontrak backplane dan fan-out InProcessBackplane
+import asyncio
+
+import pytest
+
+from app.services.ws_backplane import ALL_USERS, Backplane, InProcessBackplane
+from app.services.ws_frames import Frame
+
+def test_backplane_without_send_or_subscribe_cannot_be_instantiated():
+    class NoSend(Backplane):
+        async def _subscribe(self):
+            pass
+
+    class NoSubscribe(Backplane):
+        async def _send(self, payload):
+            pass
+
+    for backend in (NoSend, NoSubscribe):
+        with pytest.raises(TypeError):
+            backend()
+
+def test_in_process_backplane_batches_and_skips_own_events():
+    async def scenario():
+        received = {"a": [], "b": []}
+
+        def collect(name):
+            async def handler(batch):
+                received[name].extend(batch)
+            return handler
+
+        a = InProcessBackplane(channel="test:fanout", flush_ms=1)
+        b = InProcessBackplane(channel="test:fanout", flush_ms=1)
+        await a.start(collect("a"))
+        await b.start(collect("b"))
+        try:
+            a.publish(["u1"], Frame({"type": "typing_start", "data": {"sender": "u1"}}))
+            a.publish(ALL_USERS, Frame({"type": "ping", "data": {}}))
+            for _ in range(100):
+                if len(received["b"]) == 2:
+                    break
+                await asyncio.sleep(0.005)
+        finally:
+            await a.stop()
+            await b.stop()
+        return received, a.get_stats(), b.get_stats()
+
+    received, a_stats, b_stats = asyncio.run(scenario())
+    assert received["a"] == []
+    assert [envelope["u"] for envelope in received["b"]] == [["u1"], ALL_USERS]
+    assert received["b"][0]["k"] == "typing:u1"
+    assert a_stats["published"] == 2 and a_stats["publish_batches"] == 1
+    assert b_stats["received"] == 2 and b_stats["receive_batches"] == 1
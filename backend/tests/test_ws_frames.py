@@ -0,0 +1,96 @@
+# tests/test_ws_frames.py - Round-trip frame JSON dan MessagePack
+import json
+from datetime import datetime, timedelta, timezone
+
+import msgpack
+import pytest
+from bson import ObjectId
+
+from app.models.chat import WSMessageType
+from app.services import ws_frames
+from app.services.ws_frames import (
+    MSGPACK_SUBPROTOCOL, WS_TYPE_CODES, Frame, decode_json, decode_msgpack, encode_json, encode_msgpack,
+    epoch_ms, negotiate_subprotocol
+)
+
+SENT_AT = datetime(2026, 1, 1, 8, 30, 0, 250000)
+
+def chat_message() -> dict:
+    return {
+        "type": WSMessageType.CHAT_MESSAGE,
+        "data": {
+            "message": {"_id": ObjectId("0" * 23 + "1"), "content": "Halo 👋", "timestamp": SENT_AT},
+            "conversation": {"updated_at": SENT_AT, "timezone": "Asia/Jakarta", "tags": ["a", "b"]},
+        },
+        "timestamp": SENT_AT,
+    }
+
+def test_json_text_matches_stdlib_encoding():
+    frame = Frame(chat_message())
+    decoded = decode_json(frame.text)
+    assert decoded["type"] == "chat_message"
+    assert decoded["timestamp"] == SENT_AT.isoformat()
+    assert decoded["data"]["message"]["_id"] == "0" * 23 + "1"
+    assert decoded["data"]["message"]["content"] == "Halo 👋"
+    assert json.loads(frame.text) == decoded
+
+def test_encode_json_accepts_non_string_keys():
+    assert decode_json(encode_json({1: "a"})) == {"1": "a"}
+
+def test_msgpack_frame_uses_type_code_and_epoch_ms():
+    frame = Frame(chat_message())
+    code, data, timestamp = msgpack.unpackb(frame.binary, raw=False)
+    assert code == WS_TYPE_CODES["chat_message"]
+    assert timestamp == epoch_ms(SENT_AT)
+    assert data["message"]["timestamp"] == epoch_ms(SENT_AT)
+    assert data["message"]["content"] == "Halo 👋"
+    assert "timezone" not in data["conversation"]
+    assert data["conversation"]["tags"] == ["a", "b"]
+    assert frame.binary is frame.binary
+
+def test_backplane_frame_round_trips_to_same_binary():
+    original = Frame(chat_message())
+    relayed = Frame.from_text(original.text)
+    assert relayed._message is None
+    # Waktu string ISO dari worker lain tetap menjadi epoch ms di bentuk biner
+    assert relayed.binary == original.binary
+    assert relayed.message["type"] == "chat_message"
+
+def test_unknown_type_is_sent_as_string():
+    code, data, timestamp = msgpack.unpackb(encode_msgpack({"type": "presence", "data": None}), raw=False)
+    assert (code, data, timestamp) == ("presence", {}, None)
+
+def test_epoch_ms_treats_naive_as_utc():
+    aware = SENT_AT.replace(tzinfo=timezone(timedelta(hours=7)))
+    assert epoch_ms(SENT_AT) - epoch_ms(aware) == 7 * 3600 * 1000
+
+@pytest.mark.parametrize("type_name", list(WS_TYPE_CODES))
+def test_client_msgpack_round_trip(type_name):
+    payload = msgpack.packb([WS_TYPE_CODES[type_name], {"conversation_id": "c1"}], use_bin_type=True)
+    assert decode_msgpack(payload) == {"type": type_name, "data": {"conversation_id": "c1"}}
+
+@pytest.mark.parametrize("payload", [b"\xc1", msgpack.packb({"type": 1}), msgpack.packb([])])
+def test_decode_msgpack_rejects_malformed_frames(payload):
+    with pytest.raises(ValueError):
+        decode_msgpack(payload)
+
+def test_decode_msgpack_defaults_missing_data():
+    assert decode_msgpack(msgpack.packb([9])) == {"type": "ping", "data": {}}
+    assert decode_msgpack(msgpack.packb([9, "x"])) == {"type": "ping", "data": {}}
+
+def test_typing_frames_carry_coalesce_key():
+    frame = Frame({"type": WSMessageType.TYPING_START.value, "data": {"sender": "u1"}})
+    assert frame.typing_sender == "typing:u1"
+    assert Frame(chat_message()).typing_sender is None
+    assert Frame.from_text(frame.text, frame.typing_sender).typing_sender == "typing:u1"
+
+def test_frame_of_reuses_existing_frame():
+    frame = Frame(chat_message())
+    assert Frame.of(frame) is frame
+    assert isinstance(Frame.of({"type": "ping"}), Frame)
+
+def test_negotiate_subprotocol(monkeypatch):
+    assert negotiate_subprotocol(["other", MSGPACK_SUBPROTOCOL]) == MSGPACK_SUBPROTOCOL
+    assert negotiate_subprotocol(["other"]) is None
+    monkeypatch.setattr(ws_frames, "msgpack", None)
+    assert negotiate_subprotocol([MSGPACK_SUBPROTOCOL]) is None